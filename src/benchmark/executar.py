@@ -0,0 +1,354 @@
+"""Benchmark das operações dos DAOs e dos fluxos principais da CLI.
+
+Uso (a partir de src/):
+    python -m benchmark.executar
+    python -m benchmark.executar --tamanhos 100 1000 10000 --repeticoes 100 --saida resultados.json
+    python -m benchmark.executar --bancos configurados
+
+Para cada tamanho N são semeados N clientes e N/10 concessionárias com
+CARROS_POR_CONCESSIONARIA carros cada (modelos de data/carros_padrao), e cada
+operação é executada várias vezes medindo latência (p50/p90/p99), vazão e
+idas e voltas a cada banco. Os caches são limpos antes de cada execução, então
+as medidas são do caminho até os bancos.
+
+Por padrão os bancos são os em memória de benchmark.memoria, que dispensam os
+servidores. Com --bancos configurados são usados o Neo4j e o MongoDB de
+config/config.py, que são APAGADOS antes de cada tamanho, como na CLI.
+As idas e voltas só são contadas com os bancos em memória.
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import math
+import platform
+import random
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import config.config as config
+from config.database import obter_database, definir_database, liberar_database, fechar_database
+from config.escrita_adiada import descarregar_escritas, habilitar_escrita_adiada
+from config.migracoes import aplicar_migracoes
+from config.schema import criar_indices_mongo
+from daos.cache import cache_habilitado, limpar_caches
+from daos.carro_dao import CarroDAO
+from daos.cliente_dao import ClienteDAO, Cliente
+from daos.concessionaria_dao import ConcessionariaDAO, Concessionaria, gerar_carro_aleatorio
+from daos.recomendacao_dao import RecomendacaoDAO
+from benchmark.memoria import DatabaseMemoria
+import cli
+
+TAMANHOS_PADRAO = [100, 1000]
+REPETICOES_PADRAO = 50
+REPETICOES_VARREDURA_PADRAO = 5
+# Carros criados um a um em cada sessão de cadastro medida
+CARROS_POR_SESSAO = 100
+
+class Cenario:
+    """Dados semeados e DAOs usados pelas operações de um tamanho"""
+    def __init__(self, database, semente: int):
+        self.database = database
+        self.aleatorio = random.Random(semente)
+        self.carro_dao = CarroDAO()
+        self.cliente_dao = ClienteDAO()
+        self.conc_dao = ConcessionariaDAO()
+        self.recomendacao_dao = RecomendacaoDAO(precalculadas=False)
+        self.recomendacao_precalculada_dao = RecomendacaoDAO(precalculadas=True)
+        self.clientes: List[Cliente] = []
+        self.concessionarias: List[Concessionaria] = []
+        self.carros: List[str] = []
+        # (cliente, concessionária, carro em estoque) ainda disponíveis para compra
+        self.compras: List[tuple] = []
+        self._proximo_cliente = 0
+        self._proxima_concessionaria = 0
+
+    def close(self):
+        self.carro_dao.close()
+        self.cliente_dao.close()
+        self.conc_dao.close()
+        self.recomendacao_dao.close()
+        self.recomendacao_precalculada_dao.close()
+
+    def novo_cliente(self) -> Cliente:
+        numero = self._proximo_cliente
+        self._proximo_cliente += 1
+        return Cliente(cpf=f"{numero:011d}", nome=f"Cliente {numero}", nacionalidade="Brasileira",
+                       data_nascimento=datetime(1970 + numero % 40, 1 + numero % 12, 1 + numero % 28))
+
+    def nova_concessionaria(self) -> Concessionaria:
+        numero = self._proxima_concessionaria
+        self._proxima_concessionaria += 1
+        return Concessionaria(nome=f"Concessionária {numero:06d}")
+
+    def semear(self, quantidade_clientes: int):
+        clientes = [self.novo_cliente() for _ in range(quantidade_clientes)]
+        for cliente, identificacao in zip(clientes, self.cliente_dao.criar_clientes_em_lote(clientes)):
+            cliente.identificacao = identificacao
+            self.clientes.append(cliente)
+        for _ in range(max(1, quantidade_clientes // 10)):
+            self.adicionar_concessionaria()
+
+    def adicionar_concessionaria(self, cliente: Optional[Cliente] = None):
+        """Cria uma concessionária com estoque e cadastra nela um cliente para cada carro"""
+        concessionaria = self.nova_concessionaria()
+        concessionaria.identificacao = self.conc_dao.criar_concessionaria(concessionaria)
+        self.concessionarias.append(concessionaria)
+        estoque = self.conc_dao.buscar_carros_da_concessionaria(concessionaria.identificacao)
+        cadastrados = set()
+        for carro_identificacao in estoque:
+            carro = self.carro_dao.buscar_carro(carro_identificacao)
+            comprador = cliente or self.aleatorio.choice(self.clientes)
+            if comprador.identificacao not in cadastrados:
+                self.cliente_dao.cadastrar_cliente_concessionaria(comprador.identificacao, concessionaria.identificacao)
+                cadastrados.add(comprador.identificacao)
+            self.carros.append(carro.identificacao)
+            self.compras.append((comprador, concessionaria, carro))
+        self.aleatorio.shuffle(self.compras)
+
+    def proxima_compra(self) -> tuple:
+        if not self.compras:
+            self.adicionar_concessionaria(self.aleatorio.choice(self.clientes))
+        return self.compras.pop()
+
+    def contar(self) -> Optional[dict]:
+        contador = getattr(self.database, "contador", None)
+        return contador.copia() if contador is not None else None
+
+class Operacao:
+    """Uma operação medida: preparar(cenario) roda fora da medição e devolve os argumentos de executar"""
+    def __init__(self, nome: str, executar: Callable, preparar: Optional[Callable] = None, varredura: bool = False):
+        self.nome = nome
+        self.executar = executar
+        self.preparar = preparar or (lambda cenario: ())
+        self.varredura = varredura
+
+def rodar_fluxo_cli(funcao: Callable, respostas: List[str]):
+    """Roda um fluxo da CLI respondendo os input() em ordem e descartando a saída"""
+    respostas = iter(respostas)
+    input_original, slow_print_original = builtins.input, cli.slow_print
+    builtins.input = lambda prompt="": next(respostas)
+    cli.slow_print = lambda text, delay=0: print(text)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            funcao()
+    finally:
+        builtins.input, cli.slow_print = input_original, slow_print_original
+
+def _carro_aleatorio(cenario: Cenario) -> tuple:
+    return (cenario.aleatorio.choice(cenario.carros),)
+
+def _cliente_aleatorio(cenario: Cenario) -> tuple:
+    return (cenario.aleatorio.choice(cenario.clientes),)
+
+def _concessionaria_aleatoria(cenario: Cenario) -> tuple:
+    return (cenario.aleatorio.choice(cenario.concessionarias),)
+
+def _carro_para_pesquisa(cenario: Cenario) -> tuple:
+    carro = cenario.carro_dao.buscar_carro(cenario.aleatorio.choice(cenario.carros))
+    return carro.modelo.split()[0][:3], carro.fabricante
+
+def _compra(cenario: Cenario) -> tuple:
+    return cenario.proxima_compra()
+
+def _novo_cadastro(cenario: Cenario) -> tuple:
+    cliente = cenario.novo_cliente()
+    cliente.identificacao = cenario.cliente_dao.criar_cliente(cliente)
+    cenario.clientes.append(cliente)
+    return cliente, cenario.aleatorio.choice(cenario.concessionarias)
+
+def _com_escrita_adiada(executar: Callable) -> Callable:
+    """Roda a operação com a escrita adiada ligada, gravando a fila antes de terminar a medição"""
+    def executar_adiada(cenario: Cenario, *argumentos):
+        habilitar_escrita_adiada()
+        try:
+            executar(cenario, *argumentos)
+            descarregar_escritas()
+        finally:
+            habilitar_escrita_adiada(False)
+    return executar_adiada
+
+def _sessao_de_cadastro(cenario: Cenario):
+    for _ in range(CARROS_POR_SESSAO):
+        cenario.carro_dao.criar_carro(gerar_carro_aleatorio())
+
+OPERACOES = [
+    Operacao("ConcessionariaDAO.criar_concessionaria",
+             lambda cenario: cenario.conc_dao.criar_concessionaria(cenario.nova_concessionaria())),
+    Operacao("CarroDAO.buscar_carro",
+             lambda cenario, carro: cenario.carro_dao.buscar_carro(carro), _carro_aleatorio),
+    Operacao("CarroDAO.buscar_concessionaria_do_carro",
+             lambda cenario, carro: cenario.carro_dao.buscar_concessionaria_do_carro(carro), _carro_aleatorio),
+    Operacao("ClienteDAO.buscar_cliente_por_cpf",
+             lambda cenario, cliente: cenario.cliente_dao.buscar_cliente_por_cpf(cliente.cpf), _cliente_aleatorio),
+    Operacao("ConcessionariaDAO.buscar_concessionaria_por_nome",
+             lambda cenario, conc: cenario.conc_dao.buscar_concessionaria_por_nome(conc.nome), _concessionaria_aleatoria),
+    Operacao("ConcessionariaDAO.buscar_carros_da_concessionaria",
+             lambda cenario, conc: cenario.conc_dao.buscar_carros_da_concessionaria(conc.identificacao),
+             _concessionaria_aleatoria),
+    Operacao("ConcessionariaDAO.buscar_estoque",
+             lambda cenario, conc: cenario.conc_dao.buscar_estoque(conc.identificacao), _concessionaria_aleatoria),
+    Operacao("CarroDAO.pesquisar_carros",
+             lambda cenario, prefixo, fabricante: cenario.carro_dao.pesquisar_carros(
+                 modelo=prefixo, fabricante=fabricante, disponibilidade="estoque"), _carro_para_pesquisa),
+    Operacao("ClienteDAO.comprar_carro",
+             lambda cenario, cliente, conc, carro: cenario.cliente_dao.comprar_carro(
+                 cliente.identificacao, conc.identificacao, carro.identificacao), _compra),
+    Operacao("CarroDAO.buscar_todos_carros",
+             lambda cenario: cenario.carro_dao.buscar_todos_carros(), varredura=True),
+    Operacao("CarroDAO.iterar_carros",
+             lambda cenario: list(cenario.carro_dao.iterar_carros()), varredura=True),
+    Operacao("ClienteDAO.buscar_clientes_com_carros",
+             lambda cenario: cenario.cliente_dao.buscar_clientes_com_carros(), varredura=True),
+    Operacao("cli.listar_carros",
+             lambda cenario: rodar_fluxo_cli(cli.listar_carros, []), varredura=True),
+    Operacao("cli.listar_clientes",
+             lambda cenario: rodar_fluxo_cli(cli.listar_clientes, []), varredura=True),
+    Operacao("cli.listar_concessionarias",
+             lambda cenario: rodar_fluxo_cli(cli.listar_concessionarias, []), varredura=True),
+    Operacao("cli.cadastrar_cliente_concessionaria",
+             lambda cenario, cliente, conc: rodar_fluxo_cli(cli.cadastrar_cliente_concessionaria, [cliente.cpf, conc.nome]),
+             _novo_cadastro),
+    Operacao("cli.comprar_carro_concessionaria",
+             lambda cenario, cliente, conc, carro: rodar_fluxo_cli(
+                 cli.comprar_carro_concessionaria, [cliente.cpf, conc.nome, carro.modelo, carro.fabricante]), _compra),
+    # Depois das compras acima, para haver clientes com carros
+    Operacao("RecomendacaoDAO.recomendar_carros",
+             lambda cenario, cliente: cenario.recomendacao_dao.recomendar_carros(cliente.identificacao), _cliente_aleatorio),
+    Operacao("RecomendacaoDAO.recalcular_recomendacoes",
+             lambda cenario: cenario.recomendacao_dao.recalcular_recomendacoes(), varredura=True),
+    Operacao("RecomendacaoDAO.recalcular_recomendacoes (adiada)",
+             _com_escrita_adiada(lambda cenario: cenario.recomendacao_dao.recalcular_recomendacoes()), varredura=True),
+    Operacao("RecomendacaoDAO.recomendar_carros (pré-calculadas)",
+             lambda cenario, cliente: cenario.recomendacao_precalculada_dao.recomendar_carros(cliente.identificacao),
+             _cliente_aleatorio),
+    Operacao(f"{CARROS_POR_SESSAO}x CarroDAO.criar_carro", _sessao_de_cadastro, varredura=True),
+    Operacao(f"{CARROS_POR_SESSAO}x CarroDAO.criar_carro (adiada)", _com_escrita_adiada(_sessao_de_cadastro),
+             varredura=True),
+]
+
+def percentil(amostras: List[float], p: float) -> float:
+    """Percentil pelo método do posto mais próximo"""
+    ordenadas = sorted(amostras)
+    return ordenadas[max(0, math.ceil(p / 100 * len(ordenadas)) - 1)]
+
+def medir(cenario: Cenario, operacao: Operacao, repeticoes: int) -> dict:
+    """Executa a operação repeticoes vezes e resume latência, vazão e idas e voltas"""
+    latencias = []
+    idas_e_voltas: Dict[str, int] = {}
+    for _ in range(repeticoes):
+        argumentos = operacao.preparar(cenario)
+        limpar_caches()
+        antes = cenario.contar()
+        inicio = time.perf_counter()
+        operacao.executar(cenario, *argumentos)
+        latencias.append(time.perf_counter() - inicio)
+        depois = cenario.contar()
+        if antes is not None:
+            for chave in depois:
+                idas_e_voltas[chave] = idas_e_voltas.get(chave, 0) + depois[chave] - antes[chave]
+    total = sum(latencias)
+    return {
+        "repeticoes": repeticoes,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p90_ms": percentil(latencias, 90) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "media_ms": statistics.mean(latencias) * 1000,
+        "max_ms": max(latencias) * 1000,
+        "ops_por_segundo": repeticoes / total if total else None,
+        "idas_e_voltas_por_op": {chave: valor / repeticoes for chave, valor in idas_e_voltas.items()} or None,
+    }
+
+def preparar_bancos(bancos: str):
+    """Instala um Database novo (em memória) ou limpa o configurado, e prepara o esquema"""
+    if bancos == "memoria":
+        definir_database(DatabaseMemoria())
+    database = obter_database()
+    database.drop_all()
+    limpar_caches()
+    aplicar_migracoes(database.driver)
+    criar_indices_mongo(database.mongo_db)
+    return database
+
+def executar_tamanho(tamanho: int, repeticoes: int, repeticoes_varredura: int, bancos: str, semente: int,
+                     filtro: Optional[List[str]] = None) -> dict:
+    database = preparar_bancos(bancos)
+    cenario = Cenario(database, semente)
+    try:
+        inicio = time.perf_counter()
+        cenario.semear(tamanho)
+        semeadura = time.perf_counter() - inicio
+        resultado = {
+            "tamanho": tamanho,
+            "clientes": len(cenario.clientes),
+            "concessionarias": len(cenario.concessionarias),
+            "carros": len(cenario.carros),
+            "semeadura_s": semeadura,
+            "operacoes": {},
+        }
+        for operacao in OPERACOES:
+            if filtro and not any(parte in operacao.nome for parte in filtro):
+                continue
+            vezes = repeticoes_varredura if operacao.varredura else repeticoes
+            resultado["operacoes"][operacao.nome] = medir(cenario, operacao, vezes)
+        return resultado
+    finally:
+        cenario.close()
+        liberar_database()
+
+def imprimir_tabela(resultado: dict):
+    print(f"\nN={resultado['tamanho']}: {resultado['clientes']} clientes, {resultado['concessionarias']} concessionárias, "
+          f"{resultado['carros']} carros (semeadura em {resultado['semeadura_s']:.2f}s)")
+    print(f"{'operação':<50} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'neo4j tx':>9} {'mongo':>8}")
+    for nome, medida in resultado["operacoes"].items():
+        idas = medida["idas_e_voltas_por_op"] or {}
+        neo4j = f"{idas['neo4j_transacoes']:.1f}" if idas else "-"
+        mongo = f"{idas['mongo_chamadas']:.1f}" if idas else "-"
+        print(f"{nome:<50} {medida['p50_ms']:>9.3f} {medida['p90_ms']:>9.3f} {medida['p99_ms']:>9.3f} "
+              f"{medida['ops_por_segundo']:>10.1f} {neo4j:>9} {mongo:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede as operações dos DAOs e os fluxos da CLI em vários tamanhos")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_PADRAO, help="quantidades de clientes semeados")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--repeticoes-varredura", type=int, default=REPETICOES_VARREDURA_PADRAO,
+                        help="repetições das operações que percorrem todos os registros")
+    parser.add_argument("--operacoes", nargs="+", help="mede só as operações cujo nome contém um destes textos")
+    parser.add_argument("--bancos", choices=["memoria", "configurados"], default="memoria")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    try:
+        for tamanho in args.tamanhos:
+            resultado = executar_tamanho(tamanho, args.repeticoes, args.repeticoes_varredura, args.bancos,
+                                         args.semente, args.operacoes)
+            imprimir_tabela(resultado)
+            resultados.append(resultado)
+    finally:
+        fechar_database()
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({
+                "gerado_em": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "bancos": args.bancos,
+                "semente": args.semente,
+                "configuracao": {
+                    "carros_por_concessionaria": config.CARROS_POR_CONCESSIONARIA,
+                    "paginacao_tamanho_pagina": config.PAGINACAO_TAMANHO_PAGINA,
+                    "mongo_tamanho_lote": config.MONGO_TAMANHO_LOTE,
+                    "leitura_paralela": config.LEITURA_PARALELA,
+                    "cache_habilitado": cache_habilitado(),
+                    "escrita_adiada_tamanho_lote": config.ESCRITA_ADIADA_TAMANHO_LOTE,
+                },
+                "resultados": resultados,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados salvos em {args.saida}")
+
+if __name__ == "__main__":
+    main()
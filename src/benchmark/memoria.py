@@ -0,0 +1,1147 @@
+"""Neo4j e MongoDB em memória para rodar os DAOs sem servidores.
+
+Não são implementações completas: o Neo4j em memória reconhece apenas as
+instruções Cypher usadas pelos DAOs (uma consulta nova precisa de um tratador
+em TRATADORES_CYPHER) e a coleção em memória entende os filtros e operações
+que os DAOs fazem. Ambos contam as idas e voltas a cada banco. Cada consulta
+Cypher roda inteira sob uma trava, como as travas de nó do Neo4j serializam
+escritas concorrentes nos mesmos nós.
+AsyncDatabaseMemoria oferece os mesmos bancos com a interface do driver
+assíncrono do Neo4j e do Motor, para os DAOs assíncronos.
+"""
+import copy
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from config.database import Database, _MonitorPoolMongo
+from config.escrita_adiada import MongoEscritaAdiada
+from config.instrumentacao import DriverInstrumentado, MongoInstrumentado
+
+class Contador:
+    """Idas e voltas feitas a cada banco"""
+    def __init__(self):
+        self.neo4j_transacoes = 0
+        self.neo4j_consultas = 0
+        self.mongo_chamadas = 0
+
+    def zerar(self):
+        self.neo4j_transacoes = 0
+        self.neo4j_consultas = 0
+        self.mongo_chamadas = 0
+
+    def copia(self) -> dict:
+        return {
+            "neo4j_transacoes": self.neo4j_transacoes,
+            "neo4j_consultas": self.neo4j_consultas,
+            "mongo_chamadas": self.mongo_chamadas,
+        }
+
+# ------------------------ NEO4J ------------------------
+
+class _Registro(dict):
+    def data(self):
+        return dict(self)
+
+class _Contadores:
+    def __init__(self):
+        self.nodes_created = 0
+        self.nodes_deleted = 0
+        self.relationships_created = 0
+        self.relationships_deleted = 0
+        self.properties_set = 0
+
+class _Resumo:
+    def __init__(self, counters: _Contadores):
+        self.counters = counters
+
+class _Resultado:
+    def __init__(self, registros: List[dict], counters: _Contadores):
+        self._registros = [_Registro(registro) for registro in registros]
+        self._counters = counters
+
+    def __iter__(self):
+        return iter(self._registros)
+
+    def single(self):
+        return self._registros[0] if self._registros else None
+
+    def data(self):
+        return [registro.data() for registro in self._registros]
+
+    def consume(self):
+        return _Resumo(self._counters)
+
+class Grafo:
+    """Nós por rótulo e relacionamentos por tipo"""
+    def __init__(self):
+        self.nos: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        self.saindo: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        self.chegando: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+
+    def criar_no(self, label: str, identificacao, propriedades: Optional[dict] = None):
+        # Como no Neo4j, propriedades nulas não são gravadas
+        propriedades = {chave: valor for chave, valor in (propriedades or {}).items() if valor is not None}
+        self.nos[label][identificacao] = dict(propriedades, identificacao=identificacao)
+
+    def existe(self, label: str, identificacao) -> bool:
+        return identificacao in self.nos[label]
+
+    def remover_no(self, label: str, identificacao) -> bool:
+        if self.nos[label].pop(identificacao, None) is None:
+            return False
+        for (tipo, origem), destinos in list(self.saindo.items()):
+            if origem == identificacao:
+                for destino in list(destinos):
+                    self.remover_relacionamento(tipo, origem, destino)
+        for (tipo, destino), origens in list(self.chegando.items()):
+            if destino == identificacao:
+                for origem in list(origens):
+                    self.remover_relacionamento(tipo, origem, destino)
+        return True
+
+    def criar_relacionamento(self, tipo: str, origem, destino):
+        self.saindo[(tipo, origem)].append(destino)
+        self.chegando[(tipo, destino)].append(origem)
+
+    def remover_relacionamento(self, tipo: str, origem, destino) -> bool:
+        if destino not in self.saindo[(tipo, origem)]:
+            return False
+        self.saindo[(tipo, origem)].remove(destino)
+        self.chegando[(tipo, destino)].remove(origem)
+        return True
+
+    def limpar(self, manter: Tuple[str, ...] = ()):
+        for label in list(self.nos):
+            if label not in manter:
+                del self.nos[label]
+        self.saindo.clear()
+        self.chegando.clear()
+
+def _normalizar(query: str) -> str:
+    return " ".join(query.split())
+
+# Cada tratador recebe (grafo, grupos da regex, parâmetros, contadores) e retorna os registros
+TRATADORES_CYPHER: List[Tuple[re.Pattern, Callable]] = []
+
+def _cypher(padrao: str):
+    def registrar(funcao):
+        TRATADORES_CYPHER.append((re.compile(padrao), funcao))
+        return funcao
+    return registrar
+
+@_cypher(r"^CREATE \(\w+:(\w+) \{identificacao: \$identificacao\}\)$")
+def _criar_no(grafo, grupos, parametros, counters):
+    grafo.criar_no(grupos[0], parametros["identificacao"])
+    counters.nodes_created += 1
+    return []
+
+@_cypher(r"^CREATE \(\w+:(\w+) \{identificacao: \$identificacao\}\) SET \w+ \+= \$propriedades$")
+def _criar_no_com_propriedades(grafo, grupos, parametros, counters):
+    grafo.criar_no(grupos[0], parametros["identificacao"], parametros["propriedades"])
+    counters.nodes_created += 1
+    return []
+
+@_cypher(r"^UNWIND \$nos AS no CREATE \(n:(\w+)\) SET n = no$")
+def _criar_nos(grafo, grupos, parametros, counters):
+    for no in parametros["nos"]:
+        grafo.criar_no(grupos[0], no["identificacao"], no)
+        counters.nodes_created += 1
+    return []
+
+@_cypher(r"^UNWIND \$carros AS carro MATCH \(c:Carro \{identificacao: carro\.identificacao\}\) SET c\.chave_modelo = carro\.chave_modelo$")
+def _gravar_chaves_modelo(grafo, grupos, parametros, counters):
+    for carro in parametros["carros"]:
+        if grafo.existe("Carro", carro["identificacao"]):
+            grafo.criar_no("Carro", carro["identificacao"], dict(grafo.nos["Carro"][carro["identificacao"]], **carro))
+            counters.properties_set += 1
+    return []
+
+@_cypher(r"^MATCH \(\w+:(\w+)\) WHERE \w+\.identificacao IN \$identificacoes DETACH DELETE \w+$")
+def _remover_nos(grafo, grupos, parametros, counters):
+    for identificacao in parametros["identificacoes"]:
+        counters.nodes_deleted += grafo.remover_no(grupos[0], identificacao)
+    return []
+
+@_cypher(r"^MATCH \(\w+:(\w+)\) WHERE \w+\.identificacao = \$identificacao RETURN \w+\.identificacao as identificacao$")
+def _buscar_no(grafo, grupos, parametros, counters):
+    identificacao = parametros["identificacao"]
+    return [{"identificacao": identificacao}] if grafo.existe(grupos[0], identificacao) else []
+
+@_cypher(r"^MATCH \(\w+:(\w+)\) RETURN \w+\.identificacao as identificacao$")
+def _buscar_todos(grafo, grupos, parametros, counters):
+    return [{"identificacao": identificacao} for identificacao in grafo.nos[grupos[0]]]
+
+@_cypher(r"^MATCH \(\w+:(\w+)\) WHERE \w+\.identificacao > \$cursor RETURN \w+\.identificacao as identificacao ORDER BY \w+\.identificacao LIMIT \$tamanho_pagina$")
+def _buscar_pagina(grafo, grupos, parametros, counters):
+    identificacoes = sorted(i for i in grafo.nos[grupos[0]] if i > parametros["cursor"])
+    return [{"identificacao": i} for i in identificacoes[:parametros["tamanho_pagina"]]]
+
+@_cypher(r"^MATCH \(\w+:(\w+)\) WHERE \w+\.identificacao = \$identificacao DETACH DELETE \w+$")
+def _remover_no(grafo, grupos, parametros, counters):
+    counters.nodes_deleted += grafo.remover_no(grupos[0], parametros["identificacao"])
+    return []
+
+@_cypher(r"^MATCH \(\w+:(\w+)\)-\[:(\w+)\]->\(\w+:(\w+)\) WHERE \w+\.identificacao = \$identificacao RETURN \w+\.identificacao as identificacao$")
+def _buscar_destinos(grafo, grupos, parametros, counters):
+    origem_label, tipo, destino_label = grupos
+    if not grafo.existe(origem_label, parametros["identificacao"]):
+        return []
+    return [{"identificacao": destino} for destino in grafo.saindo[(tipo, parametros["identificacao"])]
+            if grafo.existe(destino_label, destino)]
+
+@_cypher(r"^MATCH \(\w+:(\w+)\)<-\[:(\w+)\]-\(\w+:(\w+)\) WHERE \w+\.identificacao = \$identificacao RETURN \w+\.identificacao as identificacao$")
+def _buscar_origens(grafo, grupos, parametros, counters):
+    destino_label, tipo, origem_label = grupos
+    if not grafo.existe(destino_label, parametros["identificacao"]):
+        return []
+    return [{"identificacao": origem} for origem in grafo.chegando[(tipo, parametros["identificacao"])]
+            if grafo.existe(origem_label, origem)]
+
+@_cypher(r"^MATCH \(\w+:(\w+) \{identificacao: \$(\w+)\}\) MATCH \(\w+:(\w+) \{identificacao: \$(\w+)\}\) CREATE \(\w+\)-\[:(\w+)\]->\(\w+\)$")
+def _criar_relacionamento(grafo, grupos, parametros, counters):
+    origem_label, origem_param, destino_label, destino_param, tipo = grupos
+    origem, destino = parametros[origem_param], parametros[destino_param]
+    if grafo.existe(origem_label, origem) and grafo.existe(destino_label, destino):
+        grafo.criar_relacionamento(tipo, origem, destino)
+        counters.relationships_created += 1
+    return []
+
+@_cypher(r"^MATCH \(\w+:(\w+)\)-\[\w+:(\w+)\]->\(\w+:(\w+)\) WHERE \w+\.identificacao = \$(\w+) AND \w+\.identificacao = \$(\w+) DELETE \w+$")
+def _remover_relacionamento(grafo, grupos, parametros, counters):
+    _, tipo, _, origem_param, destino_param = grupos
+    counters.relationships_deleted += grafo.remover_relacionamento(tipo, parametros[origem_param], parametros[destino_param])
+    return []
+
+@_cypher(r"^MATCH \(\w+:(\w+)\)-\[:(\w+)\]->\(\w+:(\w+)\) WHERE \w+\.identificacao = \$(\w+) AND \w+\.identificacao = \$(\w+) RETURN count\(\*\) > 0 as existe$")
+def _verificar_relacionamento(grafo, grupos, parametros, counters):
+    _, tipo, _, origem_param, destino_param = grupos
+    return [{"existe": parametros[destino_param] in grafo.saindo[(tipo, parametros[origem_param])]}]
+
+@_cypher(r"^CREATE \(c:Concessionaria \{identificacao: \$identificacao\}\) WITH c UNWIND \$carros AS carro CREATE \(c\)-\[:OFERECE\]->\(:Carro \{identificacao: carro\.identificacao, chave_modelo: carro\.chave_modelo\}\)$")
+def _criar_concessionaria_com_carros(grafo, grupos, parametros, counters):
+    grafo.criar_no("Concessionaria", parametros["identificacao"])
+    counters.nodes_created += 1
+    for carro in parametros["carros"]:
+        grafo.criar_no("Carro", carro["identificacao"], carro)
+        grafo.criar_relacionamento("OFERECE", parametros["identificacao"], carro["identificacao"])
+        counters.nodes_created += 1
+        counters.relationships_created += 1
+    return []
+
+@_cypher(r"^MATCH \(cli:Cliente \{identificacao: \$identificacao\}\)-\[:POSSUI\]->\(meu:Carro\) WITH cli, collect\(DISTINCT meu\.chave_modelo\) as meus_modelos .* LIMIT \$limite$")
+def _recomendar_carros(grafo, grupos, parametros, counters):
+    cliente = parametros["identificacao"]
+    if not grafo.existe("Cliente", cliente):
+        return []
+    return _recomendacoes_do_cliente(grafo, cliente, parametros["limite"])
+
+@_cypher(r"^MATCH \(cli:Cliente\) CALL \{ WITH cli MATCH \(cli\)-\[:POSSUI\]->\(meu:Carro\) .* LIMIT \$limite RETURN collect\(.*\) as carros \} RETURN cli\.identificacao as identificacao, carros$")
+def _recomendar_para_todos(grafo, grupos, parametros, counters):
+    return [{"identificacao": cliente, "carros": _recomendacoes_do_cliente(grafo, cliente, parametros["limite"])}
+            for cliente in grafo.nos["Cliente"]]
+
+def _recomendacoes_do_cliente(grafo, cliente, limite):
+    def modelo(carro):
+        return grafo.nos["Carro"].get(carro, {}).get("chave_modelo")
+    meus_modelos = {modelo(carro) for carro in grafo.saindo[("POSSUI", cliente)]} - {None}
+    if not meus_modelos:
+        return []
+    compradores = defaultdict(set)
+    for outro in grafo.nos["Cliente"]:
+        possuidos = [modelo(carro) for carro in grafo.saindo[("POSSUI", outro)]]
+        if outro == cliente or not meus_modelos.intersection(possuidos):
+            continue
+        for chave in possuidos:
+            if chave is not None and chave not in meus_modelos:
+                compradores[chave].add(outro)
+    registros = []
+    for concessionaria in grafo.saindo[("CADASTRADO", cliente)]:
+        por_modelo = {}
+        for carro in grafo.saindo[("OFERECE", concessionaria)]:
+            chave = modelo(carro)
+            if chave in compradores:
+                por_modelo[chave] = min(por_modelo.get(chave, carro), carro)
+        registros.extend({"carro": carro, "concessionaria": concessionaria, "pontuacao": len(compradores[chave])}
+                         for chave, carro in por_modelo.items())
+    registros.sort(key=lambda registro: (-registro["pontuacao"], registro["carro"]))
+    return registros[:limite]
+
+@_cypher(r"^MATCH \(conc:Concessionaria\)-\[:OFERECE\]->\(c:Carro\) WHERE c\.identificacao IN \$identificacoes RETURN c\.identificacao as carro, conc\.identificacao as concessionaria$")
+def _concessionarias_dos_carros(grafo, grupos, parametros, counters):
+    return [{"carro": carro, "concessionaria": concessionaria} for carro in parametros["identificacoes"]
+            for concessionaria in grafo.chegando[("OFERECE", carro)] if grafo.existe("Concessionaria", concessionaria)]
+
+@_cypher(r"^MATCH \(c:Cliente\) OPTIONAL MATCH \(c\)-\[:POSSUI\]->\(car:Carro\) RETURN c\.identificacao as identificacao, collect\(car\.identificacao\) as carros$")
+def _clientes_com_carros(grafo, grupos, parametros, counters):
+    return [{"identificacao": cliente, "carros": list(grafo.saindo[("POSSUI", cliente)])} for cliente in grafo.nos["Cliente"]]
+
+@_cypher(r"^MATCH \(c:Concessionaria\) WHERE \$identificacoes IS NULL OR c\.identificacao IN \$identificacoes OPTIONAL MATCH \(c\)-\[:OFERECE\]->\(car:Carro\) RETURN c\.identificacao as identificacao, collect\(car\.identificacao\) as carros$")
+def _concessionarias_com_carros(grafo, grupos, parametros, counters):
+    identificacoes = parametros["identificacoes"]
+    concessionarias = grafo.nos["Concessionaria"] if identificacoes is None else [
+        concessionaria for concessionaria in identificacoes if grafo.existe("Concessionaria", concessionaria)]
+    return [{"identificacao": concessionaria, "carros": list(grafo.saindo[("OFERECE", concessionaria)])}
+            for concessionaria in concessionarias]
+
+@_cypher(r"^MATCH \(c:Concessionaria\) OPTIONAL MATCH \(c\)-\[:OFERECE\]->\(car:Carro\) WITH c, count\(car\) as carros OPTIONAL MATCH \(cli:Cliente\)-\[:CADASTRADO\]->\(c\) RETURN c\.identificacao as identificacao, carros, count\(cli\) as clientes$")
+def _contagens_concessionarias(grafo, grupos, parametros, counters):
+    return [{"identificacao": concessionaria, "carros": len(grafo.saindo[("OFERECE", concessionaria)]),
+             "clientes": len(grafo.chegando[("CADASTRADO", concessionaria)])} for concessionaria in grafo.nos["Concessionaria"]]
+
+@_cypher(r"^MATCH \(:Concessionaria\)-\[:OFERECE\]->\(car:Carro\) RETURN car\.identificacao as identificacao, \$estoque as situacao UNION MATCH \(:Cliente\)-\[:POSSUI\]->\(car:Carro\) RETURN car\.identificacao as identificacao, \$vendido as situacao$")
+def _situacoes_carros(grafo, grupos, parametros, counters):
+    registros = []
+    for tipo, label, situacao in (("OFERECE", "Concessionaria", parametros["estoque"]), ("POSSUI", "Cliente", parametros["vendido"])):
+        for origem in grafo.nos[label]:
+            registros.extend({"identificacao": carro, "situacao": situacao} for carro in grafo.saindo[(tipo, origem)])
+    return registros
+
+@_cypher(r"^MATCH \(car:Carro \{identificacao: \$carro_identificacao\}\) SET car\.identificacao = car\.identificacao .* RETURN cadastrado, disponivel$")
+def _comprar_carro(grafo, grupos, parametros, counters):
+    cliente, concessionaria, carro = (parametros["cliente_identificacao"], parametros["concessionaria_identificacao"],
+                                      parametros["carro_identificacao"])
+    if not (grafo.existe("Carro", carro) and grafo.existe("Cliente", cliente) and grafo.existe("Concessionaria", concessionaria)):
+        return []
+    cadastrado = concessionaria in grafo.saindo[("CADASTRADO", cliente)]
+    disponivel = carro in grafo.saindo[("OFERECE", concessionaria)]
+    if cadastrado and disponivel:
+        grafo.remover_relacionamento("OFERECE", concessionaria, carro)
+        grafo.criar_relacionamento("POSSUI", cliente, carro)
+        counters.relationships_deleted += 1
+        counters.relationships_created += 1
+    return [{"cadastrado": cadastrado, "disponivel": disponivel}]
+
+@_cypher(r"^MATCH \(n\) WHERE NOT n:Migracao CALL \{ WITH n DETACH DELETE n \} IN TRANSACTIONS OF \$tamanho_lote ROWS$")
+def _limpar(grafo, grupos, parametros, counters):
+    grafo.limpar(manter=("Migracao",))
+    return []
+
+@_cypher(r"^MATCH \(n\) WHERE NOT n:Migracao RETURN count\(n\) as nos$")
+def _contar_nos(grafo, grupos, parametros, counters):
+    return [{"nos": sum(len(nos) for label, nos in grafo.nos.items() if label != "Migracao")}]
+
+@_cypher(r"^MATCH \(\w+:(\w+)\) RETURN properties\(\w+\) as propriedades$")
+def _listar_propriedades(grafo, grupos, parametros, counters):
+    return [{"propriedades": dict(no)} for no in grafo.nos[grupos[0]].values()]
+
+@_cypher(r"^MATCH \(\w+:(\w+)\)-\[:(\w+)\]->\(\w+:(\w+)\) RETURN \w+\.identificacao as origem, \w+\.identificacao as destino$")
+def _listar_relacionamentos(grafo, grupos, parametros, counters):
+    origem_label, tipo, destino_label = grupos
+    return [{"origem": origem, "destino": destino}
+            for (tipo_relacionamento, origem), destinos in grafo.saindo.items()
+            if tipo_relacionamento == tipo and grafo.existe(origem_label, origem)
+            for destino in destinos if grafo.existe(destino_label, destino)]
+
+@_cypher(r"^UNWIND \$relacoes AS r MATCH \(a:(\w+) \{identificacao: r\.origem\}\) MATCH \(b:(\w+) \{identificacao: r\.destino\}\) CREATE \(a\)-\[:(\w+)\]->\(b\)$")
+def _criar_relacionamentos(grafo, grupos, parametros, counters):
+    origem_label, destino_label, tipo = grupos
+    for relacao in parametros["relacoes"]:
+        if grafo.existe(origem_label, relacao["origem"]) and grafo.existe(destino_label, relacao["destino"]):
+            grafo.criar_relacionamento(tipo, relacao["origem"], relacao["destino"])
+            counters.relationships_created += 1
+    return []
+
+@_cypher(r"^MATCH \(m:Migracao\) RETURN max\(m\.versao\) as versao$")
+def _versao_migracao(grafo, grupos, parametros, counters):
+    return [{"versao": max(grafo.nos["Migracao"], default=None)}]
+
+@_cypher(r"^CREATE (CONSTRAINT|INDEX) .* IF NOT EXISTS FOR .*$")
+def _criar_constraint(grafo, grupos, parametros, counters):
+    return []
+
+@_cypher(r"^MERGE \(m:Migracao \{versao: \$versao\}\) SET m\.descricao = \$descricao, m\.aplicada_em = datetime\(\)$")
+def _registrar_migracao(grafo, grupos, parametros, counters):
+    grafo.criar_no("Migracao", parametros["versao"], {"versao": parametros["versao"], "descricao": parametros["descricao"]})
+    return []
+
+@_cypher(r"^MATCH \(m:Migracao\) RETURN m\.versao as versao, m\.descricao as descricao, m\.aplicada_em as aplicada_em ORDER BY m\.versao$")
+def _listar_migracoes(grafo, grupos, parametros, counters):
+    return [{"versao": versao, "descricao": no["descricao"], "aplicada_em": None} for versao, no in sorted(grafo.nos["Migracao"].items())]
+
+class _Transacao:
+    def __init__(self, driver: "Neo4jMemoria"):
+        self._driver = driver
+
+    def run(self, query, parameters=None, **kwparameters):
+        return self._driver.executar(query, dict(parameters or {}, **kwparameters))
+
+class _Sessao(_Transacao):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwparameters):
+        self._driver.contador.neo4j_transacoes += 1
+        return super().run(query, parameters, **kwparameters)
+
+    def execute_read(self, funcao, *args, **kwargs):
+        self._driver.contador.neo4j_transacoes += 1
+        return funcao(_Transacao(self._driver), *args, **kwargs)
+
+    execute_write = execute_read
+
+class Neo4jMemoria:
+    """Substitui o driver do Neo4j, executando as consultas dos DAOs sobre um Grafo"""
+    def __init__(self, contador: Contador):
+        self.contador = contador
+        self.grafo = Grafo()
+        self._lock = threading.RLock()
+
+    def session(self, **config):
+        return _Sessao(self)
+
+    def close(self):
+        pass
+
+    def executar(self, query: str, parametros: dict) -> _Resultado:
+        self.contador.neo4j_consultas += 1
+        normalizada = _normalizar(query)
+        for padrao, tratador in TRATADORES_CYPHER:
+            encontrado = padrao.match(normalizada)
+            if encontrado:
+                counters = _Contadores()
+                with self._lock:
+                    registros = tratador(self.grafo, encontrado.groups(), parametros, counters)
+                return _Resultado(registros, counters)
+        raise NotImplementedError(f"Consulta não suportada pelo Neo4j em memória: {normalizada}")
+
+# ------------------------ MONGODB ------------------------
+
+class _ResultadoInsercao:
+    def __init__(self, inserted_id=None, inserted_ids=None):
+        self.inserted_id = inserted_id
+        self.inserted_ids = inserted_ids
+
+class _ResultadoBulk:
+    def __init__(self, inserted_count=0, matched_count=0, modified_count=0, deleted_count=0, upserted_count=0):
+        self.inserted_count = inserted_count
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.deleted_count = deleted_count
+        self.upserted_count = upserted_count
+
+class _ResultadoAlteracao:
+    def __init__(self, matched_count=0, modified_count=0, deleted_count=0, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.deleted_count = deleted_count
+        self.upserted_id = upserted_id
+
+def _peso_colacao(caractere: str) -> str:
+    """Classe do caractere na ordem da colação ICU: espaços e pontuação, dígitos, letras e, por último, U+FFFF"""
+    if caractere == "\uffff":
+        return "4"
+    if caractere.isalpha():
+        return "3"
+    return "2" if caractere.isdigit() else "1"
+
+def _sem_caixa(valor, colacao: Optional[dict]):
+    # Como na ICU, pontuação vem antes dos dígitos e estes antes das letras; sem isso a ordem por
+    # ponto de código esconderia consultas que só funcionam no Python (por exemplo "z" < "{")
+    if colacao and colacao.get("strength", 3) <= 2 and isinstance(valor, str):
+        return "".join(_peso_colacao(caractere) + caractere for caractere in valor.casefold())
+    return valor
+
+def _valor(documento: dict, campo: str):
+    partes = campo.split(".")
+    for posicao, parte in enumerate(partes):
+        if isinstance(documento, list):
+            # Caminho dentro de um array: o valor é a lista dos valores de cada elemento
+            resto = ".".join(partes[posicao:])
+            return [_valor(item, resto) for item in documento]
+        if not isinstance(documento, dict):
+            return None
+        documento = documento.get(parte)
+    return documento
+
+def _atende(documento: dict, filtro: dict, colacao: Optional[dict] = None) -> bool:
+    for campo, condicao in filtro.items():
+        if campo == "$or":
+            if not any(_atende(documento, sub, colacao) for sub in condicao):
+                return False
+            continue
+        valor = _valor(documento, campo)
+        # Em arrays a condição vale se algum elemento atende ($ne e $nin: se nenhum é igual)
+        valores = [_sem_caixa(item, colacao) for item in (valor if isinstance(valor, list) else [valor])]
+        if isinstance(condicao, dict) and any(chave.startswith("$") for chave in condicao):
+            for operador, esperado in condicao.items():
+                if operador == "$in":
+                    esperados = [_sem_caixa(item, colacao) for item in esperado]
+                    if not any(item in esperados for item in valores):
+                        return False
+                elif operador == "$nin":
+                    esperados = [_sem_caixa(item, colacao) for item in esperado]
+                    if any(item in esperados for item in valores):
+                        return False
+                elif operador == "$elemMatch":
+                    if not any(_atende(item, esperado, colacao) for item in (valor if isinstance(valor, list) else [])):
+                        return False
+                elif operador == "$exists":
+                    if (valor is not None) != bool(esperado):
+                        return False
+                elif operador == "$ne":
+                    if _sem_caixa(esperado, colacao) in valores:
+                        return False
+                elif operador in ("$gt", "$gte", "$lt", "$lte"):
+                    esperado = _sem_caixa(esperado, colacao)
+                    comparar = {"$gt": lambda item: item > esperado, "$gte": lambda item: item >= esperado,
+                                "$lt": lambda item: item < esperado, "$lte": lambda item: item <= esperado}[operador]
+                    if not any(item is not None and comparar(item) for item in valores):
+                        return False
+                elif operador == "$regex":
+                    opcoes = re.IGNORECASE if "i" in condicao.get("$options", "") else 0
+                    if not any(isinstance(item, str) and re.search(esperado, item, opcoes)
+                               for item in (valor if isinstance(valor, list) else [valor])):
+                        return False
+                elif operador == "$options":
+                    continue
+                else:
+                    raise NotImplementedError(f"Operador não suportado pelo MongoDB em memória: {operador}")
+        elif _sem_caixa(condicao, colacao) not in valores:
+            return False
+    return True
+
+def _alterar(documento: dict, alteracao: dict):
+    """Aplica os operadores de atualização ($set, $unset, $inc, $push, $pull) ao documento"""
+    for operador, campos in alteracao.items():
+        for campo, valor in campos.items():
+            *caminho, chave = campo.split(".")
+            alvo = documento
+            for parte in caminho:
+                alvo = alvo.setdefault(parte, {})
+            if operador == "$set":
+                alvo[chave] = copy.deepcopy(valor)
+            elif operador == "$unset":
+                alvo.pop(chave, None)
+            elif operador == "$inc":
+                alvo[chave] = alvo.get(chave, 0) + valor
+            elif operador == "$push":
+                itens = valor["$each"] if isinstance(valor, dict) and "$each" in valor else [valor]
+                alvo.setdefault(chave, []).extend(copy.deepcopy(itens))
+            elif operador == "$pull":
+                alvo[chave] = [item for item in alvo.get(chave, [])
+                               if not (_atende(item, valor) if isinstance(valor, dict) else item == valor)]
+            else:
+                raise NotImplementedError(f"Operador de atualização não suportado pelo MongoDB em memória: {operador}")
+
+def _projetar(documento: dict, projecao, relevancia: Optional[float] = None,
+              filtro: Optional[dict] = None, colacao: Optional[dict] = None) -> dict:
+    """Aplica a projeção; campos {"$meta": "textScore"} recebem a relevância do $text e "campo.$"
+    (operador posicional) mantém só o primeiro elemento do array que atende o $elemMatch do filtro"""
+    documento = copy.deepcopy(documento)
+    if not projecao:
+        return documento
+    if isinstance(projecao, (list, tuple)):
+        projecao = {campo: 1 for campo in projecao}
+    for campo in [campo for campo in projecao if campo.endswith(".$")]:
+        array = campo[:-2]
+        condicao = (filtro or {}).get(array, {}).get("$elemMatch", {})
+        documento[array] = [item for item in documento.get(array, []) if _atende(item, condicao, colacao)][:1]
+        projecao = {(array if chave == campo else chave): valor for chave, valor in projecao.items()}
+    metas = [campo for campo, valor in projecao.items() if isinstance(valor, dict)]
+    incluir = [campo for campo, valor in projecao.items() if valor and campo != "_id" and campo not in metas]
+    if incluir:
+        resultado = {campo: documento[campo] for campo in incluir if campo in documento}
+        if projecao.get("_id", 1):
+            resultado["_id"] = documento["_id"]
+    else:
+        resultado = documento
+        for campo, valor in projecao.items():
+            if not valor:
+                resultado.pop(campo, None)
+    for campo in metas:
+        resultado[campo] = relevancia
+    return resultado
+
+def _palavras(texto) -> List[str]:
+    """Palavras sem caixa nem acentos, como o índice de texto (versão 3) do MongoDB as compara"""
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode()
+    return re.findall(r"\w+", texto.casefold())
+
+def _expressao(documento: dict, expressao):
+    """Avalia uma expressão de agregação: "$campo", literal ou um dos operadores usados nos relatórios"""
+    if isinstance(expressao, str) and expressao.startswith("$"):
+        return _valor(documento, expressao[1:])
+    if isinstance(expressao, dict) and len(expressao) == 1 and next(iter(expressao)).startswith("$"):
+        operador, argumento = next(iter(expressao.items()))
+        valor = _expressao(documento, argumento)
+        numeros = [item for item in (valor if isinstance(valor, list) else [valor]) if isinstance(item, (int, float))]
+        if operador == "$size":
+            return len(valor or [])
+        if operador == "$sum":
+            return sum(numeros)
+        if operador == "$avg":
+            return sum(numeros) / len(numeros) if numeros else None
+        if operador == "$min":
+            return min(numeros, default=None)
+        if operador == "$max":
+            return max(numeros, default=None)
+        raise NotImplementedError(f"Expressão não suportada pelo MongoDB em memória: {operador}")
+    if isinstance(expressao, dict):
+        return {campo: _expressao(documento, sub) for campo, sub in expressao.items()}
+    return expressao
+
+def _acumular(documentos: List[dict], acumulador: dict):
+    operador, argumento = next(iter(acumulador.items()))
+    valores = [_expressao(documento, argumento) for documento in documentos]
+    numeros = [valor for valor in valores if isinstance(valor, (int, float))]
+    if operador == "$sum":
+        return sum(numeros)
+    if operador == "$avg":
+        return sum(numeros) / len(numeros) if numeros else None
+    if operador == "$min":
+        return min(numeros, default=None)
+    if operador == "$max":
+        return max(numeros, default=None)
+    if operador == "$push":
+        return valores
+    if operador == "$addToSet":
+        return list(dict.fromkeys(valor for valor in valores if valor is not None))
+    if operador == "$first":
+        return valores[0] if valores else None
+    raise NotImplementedError(f"Acumulador não suportado pelo MongoDB em memória: {operador}")
+
+def _agregar(documentos: List[dict], pipeline: List[dict]) -> List[dict]:
+    """Executa os estágios $match, $unwind, $group, $project, $sort e $limit"""
+    documentos = copy.deepcopy(documentos)
+    for estagio in pipeline:
+        nome, especificacao = next(iter(estagio.items()))
+        if nome == "$match":
+            documentos = [documento for documento in documentos if _atende(documento, especificacao)]
+        elif nome == "$unwind":
+            caminho = especificacao if isinstance(especificacao, str) else especificacao["path"]
+            manter_vazios = isinstance(especificacao, dict) and especificacao.get("preserveNullAndEmptyArrays")
+            campo = caminho[1:]
+            desenrolados = []
+            for documento in documentos:
+                itens = documento.get(campo) or []
+                if not itens and manter_vazios:
+                    desenrolados.append({chave: valor for chave, valor in documento.items() if chave != campo})
+                desenrolados.extend(dict(documento, **{campo: item}) for item in itens)
+            documentos = desenrolados
+        elif nome == "$group":
+            grupos = {}
+            for documento in documentos:
+                chave = _expressao(documento, especificacao["_id"])
+                grupos.setdefault(repr(chave), (chave, []))[1].append(documento)
+            documentos = [dict({"_id": chave}, **{campo: _acumular(membros, acumulador)
+                                                 for campo, acumulador in especificacao.items() if campo != "_id"})
+                          for chave, membros in grupos.values()]
+        elif nome == "$project":
+            projetados = []
+            for documento in documentos:
+                projetado = {} if especificacao.get("_id", 1) == 0 else {"_id": documento.get("_id")}
+                for campo, expressao in especificacao.items():
+                    if campo == "_id":
+                        continue
+                    projetado[campo] = documento.get(campo) if expressao in (1, True) else _expressao(documento, expressao)
+                projetados.append(projetado)
+            documentos = projetados
+        elif nome == "$sort":
+            cursor = CursorMemoria(documentos).sort(list(especificacao.items()))
+            documentos = cursor._documentos
+        elif nome == "$limit":
+            documentos = documentos[:especificacao]
+        else:
+            raise NotImplementedError(f"Estágio de agregação não suportado pelo MongoDB em memória: {nome}")
+    return documentos
+
+class CursorMemoria:
+    def __init__(self, documentos: List[dict]):
+        self._documentos = documentos
+        self._posicao = 0
+
+    def sort(self, chave, direcao=1, colacao: Optional[dict] = None):
+        chaves = chave if isinstance(chave, list) else [(chave, direcao)]
+        for campo, sentido in reversed(chaves):
+            # {"$meta": "textScore"} ordena pela relevância projetada no campo, da maior para a menor
+            decrescente = isinstance(sentido, dict) or sentido < 0
+            self._documentos.sort(key=lambda documento: (_valor(documento, campo) is None,
+                                                         _sem_caixa(_valor(documento, campo), colacao)),
+                                  reverse=decrescente)
+        return self
+
+    def skip(self, quantidade: int):
+        self._documentos = self._documentos[quantidade:]
+        return self
+
+    def limit(self, limite: int):
+        if limite:
+            self._documentos = self._documentos[:limite]
+        return self
+
+    def batch_size(self, tamanho: int):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._posicao >= len(self._documentos):
+            raise StopIteration
+        self._posicao += 1
+        return self._documentos[self._posicao - 1]
+
+    def close(self):
+        pass
+
+class ColecaoMemoria:
+    """Coleção do MongoDB em memória com os filtros e operações usados pelos DAOs"""
+    def __init__(self, nome: str, contador: Contador):
+        self.name = nome
+        self.contador = contador
+        self.documentos: Dict[ObjectId, dict] = {}
+        self.indices: Dict[str, dict] = {}
+
+    def _chaves(self, documento: dict, indice: dict) -> List[tuple]:
+        """Chaves do documento no índice; num índice de um campo que é array há uma chave por elemento"""
+        valores = [_valor(documento, campo) for campo, _ in indice["key"]]
+        if len(valores) == 1 and isinstance(valores[0], list):
+            return list({(_sem_caixa(valor, indice.get("collation")),) for valor in valores[0]})
+        return [tuple(_sem_caixa(valor, indice.get("collation")) for valor in valores)]
+
+    def _indexar(self, documento: dict):
+        for nome, indice in self.indices.items():
+            for chave in self._chaves(documento, indice):
+                entradas = indice["entradas"].setdefault(chave, set())
+                if indice.get("unique") and entradas - {documento["_id"]}:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {nome}", 11000)
+        for indice in self.indices.values():
+            for chave in self._chaves(documento, indice):
+                indice["entradas"][chave].add(documento["_id"])
+
+    def _desindexar(self, documento: dict):
+        for indice in self.indices.values():
+            for chave in self._chaves(documento, indice):
+                indice["entradas"].get(chave, set()).discard(documento["_id"])
+
+    def _inserir(self, documento: dict) -> ObjectId:
+        documento.setdefault("_id", ObjectId())
+        self._indexar(documento)
+        self.documentos[documento["_id"]] = copy.deepcopy(documento)
+        return documento["_id"]
+
+    def _candidatos(self, filtro: dict, colacao: Optional[dict]):
+        """Usa um índice de um campo para filtros de igualdade ou $in nesse campo, como o MongoDB faria;
+        os demais campos do filtro são conferidos depois, documento a documento"""
+        for campo, condicao in filtro.items():
+            if campo.startswith("$"):
+                continue
+            if isinstance(condicao, dict):
+                if set(condicao) != {"$in"}:
+                    continue
+                valores = condicao["$in"]
+            else:
+                valores = [condicao]
+            for indice in self.indices.values():
+                if [c for c, _ in indice["key"]] == [campo] and indice.get("collation") == colacao:
+                    ids = set()
+                    for valor in valores:
+                        ids |= indice["entradas"].get((_sem_caixa(valor, colacao),), set())
+                    return [self.documentos[i] for i in ids]
+        return self.documentos.values()
+
+    def _relevancia(self, documento: dict, busca: dict) -> int:
+        """Relevância do $text: quantas vezes os termos buscados aparecem nos campos do índice de texto"""
+        campos = [campo for indice in self.indices.values() for campo, sentido in indice["key"] if sentido == "text"]
+        if not campos:
+            raise OperationFailure("text index required for $text query", 27)
+        termos = set(_palavras(busca["$search"]))
+        return sum(1 for campo in campos for palavra in _palavras(_valor(documento, campo)) if palavra in termos)
+
+    def _encontrar(self, filtro: Optional[dict], colacao: Optional[dict] = None) -> List[dict]:
+        filtro = dict(filtro or {})
+        busca = filtro.pop("$text", None)
+        encontrados = [documento for documento in self._candidatos(filtro, colacao) if _atende(documento, filtro, colacao)]
+        if busca:
+            encontrados = [documento for documento in encontrados if self._relevancia(documento, busca)]
+        return encontrados
+
+    def insert_one(self, documento: dict):
+        self.contador.mongo_chamadas += 1
+        return _ResultadoInsercao(inserted_id=self._inserir(documento))
+
+    def insert_many(self, documentos: List[dict], ordered: bool = True):
+        self.contador.mongo_chamadas += 1
+        inseridos, erros = [], []
+        for indice, documento in enumerate(documentos):
+            try:
+                inseridos.append(self._inserir(documento))
+            except DuplicateKeyError as e:
+                erros.append({"index": indice, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if erros:
+            raise BulkWriteError({"writeErrors": erros, "nInserted": len(inseridos)})
+        return _ResultadoInsercao(inserted_ids=inseridos)
+
+    def find(self, filtro: Optional[dict] = None, projection=None, collation: Optional[dict] = None,
+             limit: int = 0, sort=None, skip: int = 0, **kwargs):
+        self.contador.mongo_chamadas += 1
+        busca = (filtro or {}).get("$text")
+        cursor = CursorMemoria([_projetar(documento, projection, self._relevancia(documento, busca) if busca else None)
+                                for documento in self._encontrar(filtro, collation)])
+        if sort:
+            cursor.sort(sort, colacao=collation)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filtro: Optional[dict] = None, projection=None, collation: Optional[dict] = None, **kwargs):
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro, collation)
+        return _projetar(encontrados[0], projection, filtro=filtro, colacao=collation) if encontrados else None
+
+    def count_documents(self, filtro: dict, **kwargs) -> int:
+        self.contador.mongo_chamadas += 1
+        return len(self._encontrar(filtro, kwargs.get("collation")))
+
+    def replace_one(self, filtro: dict, documento: dict, upsert: bool = False):
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro)
+        if not encontrados:
+            if upsert:
+                return _ResultadoAlteracao(upserted_id=self._inserir(dict(documento)))
+            return _ResultadoAlteracao()
+        self._substituir(encontrados[0], copy.deepcopy(documento))
+        return _ResultadoAlteracao(matched_count=1, modified_count=1)
+
+    def _substituir(self, atual: dict, novo: dict):
+        novo["_id"] = atual["_id"]
+        self._desindexar(atual)
+        try:
+            self._indexar(novo)
+        except DuplicateKeyError:
+            self._indexar(atual)
+            raise
+        self.documentos[atual["_id"]] = novo
+
+    def _atualizar(self, filtro: dict, alteracao: dict, upsert: bool, muitos: bool):
+        encontrados = self._encontrar(filtro)
+        if not encontrados:
+            if upsert:
+                novo = {campo: valor for campo, valor in filtro.items()
+                        if not campo.startswith("$") and not isinstance(valor, dict)}
+                _alterar(novo, alteracao)
+                return _ResultadoAlteracao(upserted_id=self._inserir(novo))
+            return _ResultadoAlteracao()
+        if not muitos:
+            encontrados = encontrados[:1]
+        for atual in encontrados:
+            novo = copy.deepcopy(atual)
+            _alterar(novo, alteracao)
+            self._substituir(atual, novo)
+        return _ResultadoAlteracao(matched_count=len(encontrados), modified_count=len(encontrados))
+
+    def update_one(self, filtro: dict, alteracao: dict, upsert: bool = False):
+        self.contador.mongo_chamadas += 1
+        return self._atualizar(filtro, alteracao, upsert, muitos=False)
+
+    def update_many(self, filtro: dict, alteracao: dict, upsert: bool = False):
+        self.contador.mongo_chamadas += 1
+        return self._atualizar(filtro, alteracao, upsert, muitos=True)
+
+    def find_one_and_replace(self, filtro: dict, documento: dict, projection=None, **kwargs):
+        """Substitui o primeiro documento encontrado e retorna a versão anterior (ReturnDocument.BEFORE)"""
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro)
+        if not encontrados:
+            return None
+        anterior = _projetar(encontrados[0], projection)
+        self._substituir(encontrados[0], copy.deepcopy(documento))
+        return anterior
+
+    def find_one_and_update(self, filtro: dict, alteracao: dict, projection=None, **kwargs):
+        """Altera o primeiro documento encontrado e retorna a versão anterior (ReturnDocument.BEFORE)"""
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro)
+        if not encontrados:
+            return None
+        anterior = _projetar(encontrados[0], projection)
+        novo = copy.deepcopy(encontrados[0])
+        _alterar(novo, alteracao)
+        self._substituir(encontrados[0], novo)
+        return anterior
+
+    def find_one_and_delete(self, filtro: dict, projection=None, **kwargs):
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro)
+        if not encontrados:
+            return None
+        self._desindexar(encontrados[0])
+        return _projetar(self.documentos.pop(encontrados[0]["_id"]), projection)
+
+    def delete_one(self, filtro: dict):
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro)
+        if encontrados:
+            self._desindexar(encontrados[0])
+            del self.documentos[encontrados[0]["_id"]]
+        return _ResultadoAlteracao(deleted_count=len(encontrados[:1]))
+
+    def delete_many(self, filtro: dict):
+        self.contador.mongo_chamadas += 1
+        encontrados = self._encontrar(filtro)
+        for documento in encontrados:
+            self._desindexar(documento)
+            del self.documentos[documento["_id"]]
+        return _ResultadoAlteracao(deleted_count=len(encontrados))
+
+    def _executar_operacao(self, operacao) -> _ResultadoAlteracao:
+        if isinstance(operacao, InsertOne):
+            self._inserir(operacao._doc)
+            return _ResultadoAlteracao()
+        if isinstance(operacao, ReplaceOne):
+            encontrados = self._encontrar(operacao._filter)
+            if encontrados:
+                self._substituir(encontrados[0], copy.deepcopy(operacao._doc))
+                return _ResultadoAlteracao(matched_count=1, modified_count=1)
+            if operacao._upsert:
+                return _ResultadoAlteracao(upserted_id=self._inserir(dict(operacao._doc)))
+            return _ResultadoAlteracao()
+        if isinstance(operacao, (UpdateOne, UpdateMany)):
+            return self._atualizar(operacao._filter, operacao._doc, operacao._upsert, muitos=isinstance(operacao, UpdateMany))
+        if isinstance(operacao, (DeleteOne, DeleteMany)):
+            encontrados = self._encontrar(operacao._filter)
+            if isinstance(operacao, DeleteOne):
+                encontrados = encontrados[:1]
+            for documento in encontrados:
+                self._desindexar(documento)
+                del self.documentos[documento["_id"]]
+            return _ResultadoAlteracao(deleted_count=len(encontrados))
+        raise NotImplementedError(f"Operação não suportada pelo bulk_write em memória: {operacao!r}")
+
+    def bulk_write(self, operacoes: list, ordered: bool = True, **kwargs):
+        """Executa as operações em uma única ida ao banco; com ordered=True para na primeira que falhar"""
+        self.contador.mongo_chamadas += 1
+        total, erros = _ResultadoBulk(), []
+        for indice, operacao in enumerate(operacoes):
+            try:
+                resultado = self._executar_operacao(operacao)
+            except DuplicateKeyError as e:
+                erros.append({"index": indice, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+                continue
+            if isinstance(operacao, InsertOne):
+                total.inserted_count += 1
+            total.matched_count += resultado.matched_count
+            total.modified_count += resultado.modified_count
+            total.deleted_count += resultado.deleted_count
+            total.upserted_count += resultado.upserted_id is not None
+        if erros:
+            raise BulkWriteError({"writeErrors": erros, "nInserted": total.inserted_count})
+        return total
+
+    def create_index(self, chaves, name: Optional[str] = None, **opcoes):
+        self.contador.mongo_chamadas += 1
+        chaves = [(chaves, 1)] if isinstance(chaves, str) else list(chaves)
+        nome = name or "_".join(f"{campo}_{sentido}" for campo, sentido in chaves)
+        if nome not in self.indices:
+            indice = dict(opcoes, key=chaves, entradas={})
+            for documento in self.documentos.values():
+                for chave in self._chaves(documento, indice):
+                    entradas = indice["entradas"].setdefault(chave, set())
+                    if indice.get("unique") and entradas:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {nome}", 11000)
+                    entradas.add(documento["_id"])
+            self.indices[nome] = indice
+        return nome
+
+    def index_information(self) -> dict:
+        self.contador.mongo_chamadas += 1
+        return {nome: {chave: valor for chave, valor in indice.items() if chave != "entradas"} for nome, indice in self.indices.items()}
+
+    def drop_index(self, nome: str):
+        self.contador.mongo_chamadas += 1
+        if self.indices.pop(nome, None) is None:
+            raise OperationFailure(f"index not found with name [{nome}]", 27)
+
+    def aggregate(self, pipeline: List[dict], **kwargs):
+        self.contador.mongo_chamadas += 1
+        if pipeline == [{"$indexStats": {}}]:
+            return CursorMemoria([])
+        return CursorMemoria(_agregar(list(self.documentos.values()), pipeline))
+
+    def drop(self):
+        self.contador.mongo_chamadas += 1
+        self.documentos.clear()
+        self.indices.clear()
+
+class MongoMemoria(dict):
+    """Banco do MongoDB em memória: cria as coleções no primeiro acesso"""
+    def __init__(self, contador: Contador):
+        super().__init__()
+        self.contador = contador
+
+    def __missing__(self, nome: str) -> ColecaoMemoria:
+        colecao = self[nome] = ColecaoMemoria(nome, self.contador)
+        return colecao
+
+    def close(self):
+        pass
+
+class DatabaseMemoria(Database):
+    """Database com Neo4j e MongoDB em memória, para benchmarks e testes sem servidores"""
+    def __init__(self):
+        self.contador = Contador()
+        self.monitor_mongo = _MonitorPoolMongo()
+        self._ao_conectar = {"neo4j": [], "mongo": []}
+        self._mongo_client = MongoMemoria(self.contador)
+        self.driver = DriverInstrumentado(lambda: Neo4jMemoria(self.contador), lambda driver: self._conectado("neo4j", driver))
+        self.mongo_db = MongoEscritaAdiada(
+            MongoInstrumentado(lambda: self._mongo_client, lambda mongo_db: self._conectado("mongo", mongo_db)))
+
+    @property
+    def mongo_client(self) -> MongoMemoria:
+        return self._mongo_client
+
+# ------------------------ ASSÍNCRONO ------------------------
+
+class _ResultadoAsync:
+    def __init__(self, resultado: _Resultado):
+        self._resultado = resultado
+        self._registros = iter(resultado)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._registros)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def single(self):
+        return self._resultado.single()
+
+    async def data(self):
+        return self._resultado.data()
+
+    async def consume(self):
+        return self._resultado.consume()
+
+class _TransacaoAsync:
+    def __init__(self, driver: Neo4jMemoria):
+        self._driver = driver
+
+    async def run(self, query, parameters=None, **kwparameters):
+        return _ResultadoAsync(self._driver.executar(query, dict(parameters or {}, **kwparameters)))
+
+class _SessaoAsync(_TransacaoAsync):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        pass
+
+    async def run(self, query, parameters=None, **kwparameters):
+        self._driver.contador.neo4j_transacoes += 1
+        return await super().run(query, parameters, **kwparameters)
+
+    async def execute_read(self, funcao, *args, **kwargs):
+        self._driver.contador.neo4j_transacoes += 1
+        return await funcao(_TransacaoAsync(self._driver), *args, **kwargs)
+
+    execute_write = execute_read
+
+class Neo4jMemoriaAsync:
+    """Interface do AsyncDriver do Neo4j sobre um Neo4jMemoria"""
+    def __init__(self, driver: Neo4jMemoria):
+        self._driver = driver
+
+    def session(self, **config):
+        return _SessaoAsync(self._driver)
+
+    async def close(self):
+        pass
+
+class CursorMemoriaAsync:
+    """Interface do AsyncIOMotorCursor sobre um CursorMemoria"""
+    def __init__(self, cursor: CursorMemoria):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, quantidade: int):
+        self._cursor.skip(quantidade)
+        return self
+
+    def limit(self, limite: int):
+        self._cursor.limit(limite)
+        return self
+
+    def batch_size(self, tamanho: int):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int] = None):
+        documentos = []
+        async for documento in self:
+            documentos.append(documento)
+            if length and len(documentos) >= length:
+                break
+        return documentos
+
+class ColecaoMemoriaAsync:
+    """Interface do AsyncIOMotorCollection sobre uma ColecaoMemoria: find e aggregate devolvem
+    cursores assíncronos e as demais operações viram corrotinas"""
+    def __init__(self, colecao: ColecaoMemoria):
+        self._colecao = colecao
+        self.name = colecao.name
+
+    def find(self, *args, **kwargs) -> CursorMemoriaAsync:
+        return CursorMemoriaAsync(self._colecao.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs) -> CursorMemoriaAsync:
+        return CursorMemoriaAsync(self._colecao.aggregate(*args, **kwargs))
+
+    def __getattr__(self, nome: str):
+        operacao = getattr(self._colecao, nome)
+
+        async def executar(*args, **kwargs):
+            return operacao(*args, **kwargs)
+        return executar
+
+class MongoMemoriaAsync(dict):
+    """Interface do AsyncIOMotorDatabase sobre um MongoMemoria"""
+    def __init__(self, mongo_db: MongoMemoria):
+        super().__init__()
+        self._mongo_db = mongo_db
+
+    def __missing__(self, nome: str) -> ColecaoMemoriaAsync:
+        colecao = self[nome] = ColecaoMemoriaAsync(self._mongo_db[nome])
+        return colecao
+
+class AsyncDatabaseMemoria:
+    """AsyncDatabase com Neo4j e MongoDB em memória, para rodar os DAOs assíncronos sem servidores"""
+    def __init__(self):
+        self.contador = Contador()
+        self.neo4j = Neo4jMemoria(self.contador)
+        self.mongo_client = MongoMemoria(self.contador)
+        self.driver = Neo4jMemoriaAsync(self.neo4j)
+        self.mongo_db = MongoMemoriaAsync(self.mongo_client)
+
+    async def close(self):
+        pass
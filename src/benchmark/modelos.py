@@ -0,0 +1,103 @@
+"""Benchmark dos modelos: memória por objeto e velocidade de conversão de/para documentos do MongoDB.
+
+Uso (a partir de src/):
+    python -m benchmark.modelos
+    python -m benchmark.modelos --quantidade 500000 --saida modelos.json
+
+Para cada modelo são gerados documentos como os guardados no MongoDB (com _id)
+e medidos: bytes por instância (tracemalloc, sem contar os documentos), tempo
+de from_dict um a um, de from_documentos (conversão em lote) e de to_dict.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, List
+from bson import ObjectId
+from data.carros_padrao import MODELOS_CARROS
+from models.carro import Carro
+from models.cliente import Cliente
+from models.concessionaria import Concessionaria
+
+def documentos_carros(quantidade: int) -> List[dict]:
+    return [dict(MODELOS_CARROS[i % len(MODELOS_CARROS)], _id=ObjectId(), identificacao=f"carro-{i:08d}",
+                 crlv=f"CRLV-{i:06d}") for i in range(quantidade)]
+
+def documentos_clientes(quantidade: int) -> List[dict]:
+    inicio = datetime(1950, 1, 1)
+    return [{"_id": ObjectId(), "identificacao": f"cliente-{i:08d}", "cpf": f"{i:011d}", "nome": f"Cliente {i}",
+             "nacionalidade": "Brasileira", "data_nascimento": (inicio + timedelta(days=i % 20000)).isoformat()}
+            for i in range(quantidade)]
+
+def documentos_concessionarias(quantidade: int) -> List[dict]:
+    return [{"_id": ObjectId(), "identificacao": f"concessionaria-{i:08d}", "nome": f"Concessionária {i}"}
+            for i in range(quantidade)]
+
+MODELOS = [
+    ("Carro", Carro, documentos_carros),
+    ("Cliente", Cliente, documentos_clientes),
+    ("Concessionaria", Concessionaria, documentos_concessionarias),
+]
+
+def _cronometrar(funcao: Callable, repeticoes: int) -> float:
+    """Melhor tempo (s) entre as repetições"""
+    melhor = None
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor
+
+def _bytes_por_objeto(modelo, documentos: List[dict]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    objetos = [modelo.from_dict(documento) for documento in documentos]
+    depois = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Desconta a lista que guarda os objetos
+    lista = len(objetos) * 8
+    return (depois - antes - lista) / len(objetos)
+
+def medir_modelo(nome: str, modelo, gerar: Callable, quantidade: int, repeticoes: int) -> dict:
+    documentos = gerar(quantidade)
+    objetos = [modelo.from_dict(documento) for documento in documentos]
+    resultado = {
+        "modelo": nome,
+        "quantidade": quantidade,
+        "slots": hasattr(modelo, "__slots__"),
+        "bytes_por_objeto": _bytes_por_objeto(modelo, documentos),
+        "from_dict_s": _cronometrar(lambda: [modelo.from_dict(documento) for documento in documentos], repeticoes),
+        "to_dict_s": _cronometrar(lambda: [objeto.to_dict() for objeto in objetos], repeticoes),
+    }
+    if hasattr(modelo, "from_documentos"):
+        resultado["from_documentos_s"] = _cronometrar(lambda: modelo.from_documentos(documentos), repeticoes)
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede memória e conversão dos modelos")
+    parser.add_argument("--quantidade", type=int, default=200000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    print(f"{'modelo':<16} {'bytes/obj':>10} {'from_dict':>12} {'from_documentos':>16} {'to_dict':>12}  (objetos/s)")
+    for nome, modelo, gerar in MODELOS:
+        resultado = medir_modelo(nome, modelo, gerar, args.quantidade, args.repeticoes)
+        resultados.append(resultado)
+        taxa = lambda chave: f"{args.quantidade / resultado[chave]:,.0f}" if chave in resultado else "-"
+        print(f"{nome:<16} {resultado['bytes_por_objeto']:>10.0f} {taxa('from_dict_s'):>12} "
+              f"{taxa('from_documentos_s'):>16} {taxa('to_dict_s'):>12}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"gerado_em": datetime.now().isoformat(timespec="seconds"), "resultados": resultados}, f, indent=2)
+        print(f"\nResultados salvos em {args.saida}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
 import sys
 import time
-from config.database import Database
+# Referência para o relatório de inicialização, incluindo as importações abaixo
+_INICIO = time.perf_counter()
+from config.database import obter_database, liberar_database, fechar_database, estatisticas_pool
+from config.schema import criar_indices_mongo, estatisticas_indices_mongo
+from config.migracoes import aplicar_migracoes, listar_migracoes
+from daos.cache import cache_habilitado, estatisticas_caches, habilitar_cache, limpar_caches
+from daos.paralelo import estatisticas_leitura_paralela
+from config.escrita_adiada import escrita_adiada_habilitada, estatisticas_escrita_adiada, habilitar_escrita_adiada
+from config.instrumentacao import (estatisticas_instrumentacao, totais_por_banco, exportar_instrumentacao,
+                                   habilitar_instrumentacao, instrumentacao_habilitada, zerar_instrumentacao)
 import config.config as config
 from daos.carro_dao import CarroDAO, Carro
-from daos.cliente_dao import ClienteDAO, Cliente
+from daos.cliente_dao import ClienteDAO, Cliente, ResultadoCompra
 from daos.concessionaria_dao import ConcessionariaDAO, Concessionaria
+from daos.recomendacao_dao import (RecomendacaoDAO, iniciar_atualizacao_recomendacoes, parar_atualizacao_recomendacoes,
+                                   estado_atualizacao_recomendacoes)
+from relatorios import gerar_relatorios, formatar_tabela, gravar_csv
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 
 def slow_print(text, delay=0.01):
     for char in text:
@@ -13,6 +26,10 @@ def slow_print(text, delay=0.01):
         time.sleep(delay)
     print()
 
+def avisar_sem_documento(dao):
+    if dao.identificacoes_sem_documento:
+        slow_print(f"Aviso: {len(dao.identificacoes_sem_documento)} registro(s) do Neo4j sem documento no MongoDB: {', '.join(dao.identificacoes_sem_documento)}")
+
 def print_banner():
     banner = r"""
                         ____________________                              
@@ -37,6 +54,7 @@ def main_menu():
     print("3. Gerenciar concessionárias")
     print("4. Transações")
     print("5. Sair")
+    print("6. Administração")
 
     choice = input("Digite sua escolha: ")
 
@@ -50,7 +68,11 @@ def main_menu():
         submenu_transacoes()
     elif choice == '5':
         slow_print("Saindo do sistema. Até logo!")
+        parar_atualizacao_recomendacoes()
+        fechar_database()
         sys.exit()
+    elif choice == '6':
+        submenu_administracao()
     else:
         slow_print("Opção inválida. Tente novamente.\n")
 
@@ -63,7 +85,8 @@ def submenu_carros():
         print("2. Listar carros")
         print("3. Atualizar carro")
         print("4. Remover carro")
-        print("5. Voltar ao menu principal")
+        print("5. Pesquisar carros")
+        print("6. Voltar ao menu principal")
 
         choice = input("Digite sua escolha: ")
 
@@ -76,6 +99,8 @@ def submenu_carros():
         elif choice == '4':
             remover_carro()
         elif choice == '5':
+            pesquisar_carros()
+        elif choice == '6':
             break
         else:
             slow_print("Opção inválida. Tente novamente.\n")
@@ -106,31 +131,63 @@ def listar_carros():
     
     try:
         dao = CarroDAO()
-        carros = dao.buscar_todos_carros()
+        conc_dao = ConcessionariaDAO()
+        total = 0
+        for pagina, _ in dao.iterar_paginas_carros():
+            # Por página: uma consulta ao Neo4j para as concessionárias e um $in para os nomes
+            concessionarias_dos_carros = dao.buscar_concessionarias_dos_carros([carro.identificacao for carro in pagina])
+            concessionarias = conc_dao.buscar_concessionarias(set(concessionarias_dos_carros.values()))
+            for carro in pagina:
+                total += 1
+                print(f"\nID: {carro.identificacao}")
+                print(f"Modelo: {carro.modelo}")
+                print(f"Ano: {carro.ano}")
+                print(f"Fabricante: {carro.fabricante}")
+                print(f"CRLV: {carro.crlv}")
+                # Mostrar concessionária, se houver
+                conc_id = concessionarias_dos_carros.get(carro.identificacao)
+                if conc_id:
+                    conc = concessionarias.get(conc_id)
+                    print(f"Concessionária: {conc.nome if conc else 'Desconhecida'}")
+                print("-" * 30)
+        avisar_sem_documento(dao)
         
-        if not carros:
+        if not total:
             slow_print("Nenhum carro cadastrado.")
-            return
-            
-        for carro in carros:
-            print(f"\nID: {carro.identificacao}")
-            print(f"Modelo: {carro.modelo}")
-            print(f"Ano: {carro.ano}")
-            print(f"Fabricante: {carro.fabricante}")
-            print(f"CRLV: {carro.crlv}")
-            # Mostrar concessionária, se houver
-            conc_id = dao.buscar_concessionaria_do_carro(carro.identificacao)
-            if conc_id:
-                conc_dao = ConcessionariaDAO()
-                conc = conc_dao.buscar_concessionaria(conc_id)
-                print(f"Concessionária: {conc.nome if conc else 'Desconhecida'}")
-                conc_dao.close()
-            print("-" * 30)
             
         dao.close()
+        conc_dao.close()
     except Exception as e:
         slow_print(f"Erro ao listar carros: {str(e)}")
 
+def pesquisar_carros():
+    slow_print("\n--- Pesquisa de Carros ---")
+    try:
+        texto = input("Palavras do modelo ou fabricante (vazio para não filtrar): ").strip() or None
+        modelo = input("Começo do modelo (vazio para não filtrar): ").strip() or None
+        fabricante = input("Começo do fabricante (vazio para não filtrar): ").strip() or None
+        ano_minimo = input("Ano mínimo (vazio para não filtrar): ").strip()
+        ano_maximo = input("Ano máximo (vazio para não filtrar): ").strip()
+        disponibilidade = input("Disponibilidade - estoque, vendido ou livre (vazio para todas): ").strip() or None
+
+        dao = CarroDAO()
+        pagina = 1
+        while True:
+            carros = dao.pesquisar_carros(texto, modelo, fabricante, int(ano_minimo) if ano_minimo else None,
+                                          int(ano_maximo) if ano_maximo else None, disponibilidade, pagina=pagina)
+            if not carros:
+                slow_print("Nenhum carro encontrado." if pagina == 1 else "Não há mais carros.")
+                break
+            print(f"\nPágina {pagina}:")
+            for carro in carros:
+                print(f"{carro.modelo} ({carro.fabricante}, {carro.ano}) - ID: {carro.identificacao}")
+            if input("\nPróxima página? (s/N): ").strip().lower() != "s":
+                break
+            pagina += 1
+        dao.close()
+    except Exception as e:
+        slow_print(f"Erro ao pesquisar carros: {str(e)}")
+
 def atualizar_carro():
     slow_print("\n--- Atualização de Carro ---")
     
@@ -218,7 +275,8 @@ def submenu_clientes():
         print("2. Listar clientes")
         print("3. Atualizar cliente")
         print("4. Remover cliente")
-        print("5. Voltar ao menu principal")
+        print("5. Recomendações de carros")
+        print("6. Voltar ao menu principal")
 
         choice = input("Digite sua escolha: ")
 
@@ -231,10 +289,39 @@ def submenu_clientes():
         elif choice == '4':
             remover_cliente()
         elif choice == '5':
+            recomendar_carros()
+        elif choice == '6':
             break
         else:
             slow_print("Opção inválida. Tente novamente.\n")
 
+def recomendar_carros():
+    slow_print("\n--- Recomendações de Carros ---")
+    try:
+        cpf = input("CPF do cliente: ")
+        cliente_dao = ClienteDAO()
+        cliente = cliente_dao.buscar_cliente_por_cpf(cpf, campos="existencia")
+        cliente_dao.close()
+        if not cliente:
+            slow_print("Cliente não encontrado.")
+            return
+
+        dao = RecomendacaoDAO()
+        recomendacoes = dao.recomendar_carros(cliente.identificacao)
+        dao.close()
+        if not recomendacoes:
+            slow_print("Nenhuma recomendação: o cliente precisa ter carros e estar cadastrado em concessionárias com estoque.")
+            return
+        conc_dao = ConcessionariaDAO()
+        for recomendacao in recomendacoes:
+            conc = conc_dao.buscar_concessionaria(recomendacao["concessionaria"])
+            print(f"{recomendacao['modelo']} ({recomendacao['fabricante']}, {recomendacao['ano']}) "
+                  f"em {conc.nome if conc else 'Desconhecida'} - comprado por {recomendacao['pontuacao']} cliente(s) "
+                  f"com carros dos mesmos modelos - ID: {recomendacao['identificacao']}")
+        conc_dao.close()
+    except Exception as e:
+        slow_print(f"Erro ao recomendar carros: {str(e)}")
+
 def cadastrar_cliente():
     slow_print("\n--- Cadastro de Novo Cliente ---")
     
@@ -252,6 +339,8 @@ def cadastrar_cliente():
         slow_print(f"Cliente cadastrado com sucesso! ID: {cliente_id}")
         
         dao.close()
+    except DuplicateKeyError:
+        slow_print("Já existe um cliente com esse CPF.")
     except ValueError as e:
         if "time data" in str(e):
             slow_print("Erro: Formato de data inválido. Use YYYY-MM-DD.")
@@ -265,28 +354,24 @@ def listar_clientes():
     
     try:
         dao = ClienteDAO()
-        clientes = dao.buscar_todos_clientes()
+        clientes = dao.buscar_clientes_com_carros(campos_carros="resumo")
+        avisar_sem_documento(dao)
         
         if not clientes:
             slow_print("Nenhum cliente cadastrado.")
             return
             
-        for cliente in clientes:
+        for cliente, carros in clientes:
             print(f"\nID: {cliente.identificacao}")
             print(f"CPF: {cliente.cpf}")
             print(f"Nome: {cliente.nome}")
             print(f"Nacionalidade: {cliente.nacionalidade}")
             print(f"Data de Nascimento: {cliente.data_nascimento.strftime('%d/%m/%Y')}")
             # Mostrar carros do cliente, se houver
-            carros_ids = dao.buscar_carros_do_cliente(cliente.identificacao)
-            if carros_ids:
+            if carros:
                 print("Carros possuídos:")
-                carro_dao = CarroDAO()
-                for carro_id in carros_ids:
-                    carro = carro_dao.buscar_carro(carro_id)
-                    if carro:
-                        print(f" - Modelo: {carro.modelo}, Fabricante: {carro.fabricante}, Ano: {carro.ano}, CRLV: {carro.crlv}")
-                carro_dao.close()
+                for carro in carros:
+                    print(f" - Modelo: {carro.modelo}, Fabricante: {carro.fabricante}, Ano: {carro.ano}, CRLV: {carro.crlv}")
             print("-" * 30)
             
         dao.close()
@@ -409,11 +494,10 @@ def cadastrar_concessionaria():
         nome = input("Nome da concessionária: ")
         dao = ConcessionariaDAO()
         # Verifica se já existe uma concessionária com esse nome
-        for c in dao.buscar_todas_concessionarias():
-            if c.nome == nome:
-                slow_print("Já existe uma concessionária com esse nome. O nome deve ser único.")
-                dao.close()
-                return
+        if dao.buscar_concessionaria_por_nome(nome, campos="existencia"):
+            slow_print("Já existe uma concessionária com esse nome. O nome deve ser único.")
+            dao.close()
+            return
         concessionaria = Concessionaria(nome=nome)
         concessionaria_id = dao.criar_concessionaria(concessionaria)
         slow_print(f"Concessionária cadastrada com sucesso! ID: {concessionaria_id}")
@@ -426,26 +510,28 @@ def listar_concessionarias():
     
     try:
         dao = ConcessionariaDAO()
-        concessionarias = dao.buscar_todas_concessionarias()
+        total = 0
+        for pagina, _ in dao.iterar_paginas_concessionarias():
+            # Um documento de estoque por concessionária, lidos em lote para a página toda
+            estoques = dao.buscar_estoques([concessionaria.identificacao for concessionaria in pagina])
+            for concessionaria in pagina:
+                total += 1
+                estoque = estoques.get(concessionaria.identificacao)
+                print(f"\nID: {concessionaria.identificacao}")
+                print(f"Nome: {concessionaria.nome}")
+                if estoque and estoque["carros"]:
+                    print(f"Carros em estoque ({estoque['total']}):")
+                    for carro in estoque["carros"]:
+                        print(f" - Modelo: {carro.modelo}, Fabricante: {carro.fabricante}, Ano: {carro.ano}, CRLV: {carro.crlv}")
+                    print("Por fabricante: " + ", ".join(f"{fabricante} ({quantidade})" for fabricante, quantidade in sorted(estoque["por_fabricante"].items())))
+                    print("Por ano: " + ", ".join(f"{ano} ({quantidade})" for ano, quantidade in sorted(estoque["por_ano"].items())))
+                else:
+                    print("Nenhum carro em estoque")
+                print("-" * 30)
+        avisar_sem_documento(dao)
         
-        if not concessionarias:
+        if not total:
             slow_print("Nenhuma concessionária cadastrada.")
-            return
-            
-        for concessionaria in concessionarias:
-            print(f"\nID: {concessionaria.identificacao}")
-            print(f"Nome: {concessionaria.nome}")
-            print("Carros em estoque:")
-            carros_ids = dao.buscar_carros_da_concessionaria(concessionaria.identificacao)
-            if carros_ids:
-                for carro_id in carros_ids:
-                    carro_data = dao.carro_collection.find_one({"identificacao": carro_id})
-                    if carro_data:
-                        carro = Carro.from_dict(carro_data)
-                        print(f" - Modelo: {carro.modelo}, Fabricante: {carro.fabricante}, Ano: {carro.ano}, CRLV: {carro.crlv}")
-            else:
-                print("Nenhum carro em estoque")
-            print("-" * 30)
             
         dao.close()
     except Exception as e:
@@ -491,24 +577,19 @@ def adicionar_carro_concessionaria():
         fabricante = input("Fabricante do carro: ")
 
         conc_dao = ConcessionariaDAO()
-        conc = None
-        for c in conc_dao.buscar_todas_concessionarias():
-            if c.nome.lower() == nome_conc.lower():
-                conc = c
-                break
+        conc = conc_dao.buscar_concessionaria_por_nome(nome_conc, campos="existencia")
         if not conc:
             slow_print("Concessionária não encontrada.")
             conc_dao.close()
             return
 
         carro_dao = CarroDAO()
-        carro_encontrado = None
-        for carro in carro_dao.buscar_todos_carros():
-            if carro.modelo.lower() == modelo.lower() and carro.fabricante.lower() == fabricante.lower():
-                carro_encontrado = carro
-                break
+        # Um carro desse modelo que não esteja em concessionária nem com cliente, numa consulta indexada
+        carros = carro_dao.pesquisar_carros(modelo=modelo, fabricante=fabricante, exato=True, disponibilidade="livre",
+                                            tamanho_pagina=1, campos="existencia")
+        carro_encontrado = carros[0] if carros else None
         if not carro_encontrado:
-            slow_print("Carro não encontrado.")
+            slow_print("Nenhum carro livre desse modelo e fabricante.")
             conc_dao.close()
             carro_dao.close()
             return
@@ -594,24 +675,19 @@ def adicionar_carro_concessionaria_transacao():
         fabricante = input("Fabricante do carro: ")
 
         conc_dao = ConcessionariaDAO()
-        conc = None
-        for c in conc_dao.buscar_todas_concessionarias():
-            if c.nome.lower() == nome_conc.lower():
-                conc = c
-                break
+        conc = conc_dao.buscar_concessionaria_por_nome(nome_conc, campos="existencia")
         if not conc:
             slow_print("Concessionária não encontrada.")
             conc_dao.close()
             return
 
         carro_dao = CarroDAO()
-        carro_encontrado = None
-        for carro in carro_dao.buscar_todos_carros():
-            if carro.modelo.lower() == modelo.lower() and carro.fabricante.lower() == fabricante.lower():
-                carro_encontrado = carro
-                break
+        # Um carro desse modelo que não esteja em concessionária nem com cliente, numa consulta indexada
+        carros = carro_dao.pesquisar_carros(modelo=modelo, fabricante=fabricante, exato=True, disponibilidade="livre",
+                                            tamanho_pagina=1, campos="existencia")
+        carro_encontrado = carros[0] if carros else None
         if not carro_encontrado:
-            slow_print("Carro não encontrado.")
+            slow_print("Nenhum carro livre desse modelo e fabricante.")
             conc_dao.close()
             carro_dao.close()
             return
@@ -643,22 +719,14 @@ def cadastrar_cliente_concessionaria():
         nome_conc = input("Nome da concessionária: ")
 
         cliente_dao = ClienteDAO()
-        cliente = None
-        for c in cliente_dao.buscar_todos_clientes():
-            if c.cpf == cpf:
-                cliente = c
-                break
+        cliente = cliente_dao.buscar_cliente_por_cpf(cpf, campos="existencia")
         if not cliente:
             slow_print("Cliente não encontrado.")
             cliente_dao.close()
             return
 
         conc_dao = ConcessionariaDAO()
-        conc = None
-        for c in conc_dao.buscar_todas_concessionarias():
-            if c.nome == nome_conc:
-                conc = c
-                break
+        conc = conc_dao.buscar_concessionaria_por_nome(nome_conc, campos="existencia")
         if not conc:
             slow_print("Concessionária não encontrada.")
             cliente_dao.close()
@@ -693,65 +761,280 @@ def comprar_carro_concessionaria():
         fabricante = input("Fabricante do carro: ")
 
         cliente_dao = ClienteDAO()
-        cliente = None
-        for c in cliente_dao.buscar_todos_clientes():
-            if c.cpf == cpf:
-                cliente = c
-                break
+        cliente = cliente_dao.buscar_cliente_por_cpf(cpf, campos="existencia")
         if not cliente:
             slow_print("Cliente não encontrado.")
             return
 
         conc_dao = ConcessionariaDAO()
-        conc = None
-        for c in conc_dao.buscar_todas_concessionarias():
-            if c.nome == nome_conc:
-                conc = c
-                break
+        conc = conc_dao.buscar_concessionaria_por_nome(nome_conc, campos="existencia")
         if not conc:
             slow_print("Concessionária não encontrada.")
             return
 
-        # Verifica se o cliente está cadastrado na concessionária
-        if not cliente_dao.verificar_cliente_concessionaria(cliente.identificacao, conc.identificacao):
-            slow_print("Cliente não está cadastrado nesta concessionária. Por favor, cadastre-se primeiro.")
-            return
-
-        carro_dao = CarroDAO()
-        carro_encontrado = None
-        for carro in carro_dao.buscar_todos_carros():
-            if carro.modelo == modelo and carro.fabricante == fabricante:
-                # Verifica se o carro está na concessionária
-                conc_id = carro_dao.buscar_concessionaria_do_carro(carro.identificacao)
-                if conc_id == conc.identificacao:
-                    carro_encontrado = carro
-                    break
+        carro_encontrado = conc_dao.buscar_carro_em_estoque(conc.identificacao, modelo, fabricante)
         if not carro_encontrado:
             slow_print("Carro não encontrado na concessionária especificada.")
             return
 
-        # Desvincula o carro da concessionária
-        conc_dao.desvincular_carro_da_concessionaria(conc.identificacao, carro_encontrado.identificacao)
-        # Vincula o carro ao cliente
-        cliente_dao.vincular_carro_ao_cliente(cliente.identificacao, carro_encontrado.identificacao)
-        slow_print("Transação realizada com sucesso! O carro agora pertence ao cliente.")
+        # Verifica o cadastro e transfere o carro para o cliente em uma única transação
+        resultado = cliente_dao.comprar_carro(cliente.identificacao, conc.identificacao, carro_encontrado.identificacao)
+        if resultado == ResultadoCompra.SUCESSO:
+            slow_print("Transação realizada com sucesso! O carro agora pertence ao cliente.")
+        elif resultado == ResultadoCompra.NAO_CADASTRADO:
+            slow_print("Cliente não está cadastrado nesta concessionária. Por favor, cadastre-se primeiro.")
+        elif resultado == ResultadoCompra.INDISPONIVEL:
+            slow_print("Este carro acabou de ser vendido. Tente novamente.")
+        else:
+            slow_print("Cliente, concessionária ou carro não encontrado.")
         conc_dao.close()
         cliente_dao.close()
-        carro_dao.close()
     except Exception as e:
         slow_print(f"Erro na transação: {str(e)}")
 
+# ------------------------ ADMINISTRAÇÃO ------------------------
+
+def submenu_administracao():
+    while True:
+        print("\n--- Menu de Administração ---")
+        print("1. Estatísticas do pool de conexões")
+        print("2. Uso dos índices do MongoDB")
+        print("3. Migrações do Neo4j")
+        print("4. Estatísticas do cache")
+        print("5. Limpar cache")
+        print("6. Latência economizada pela leitura paralela")
+        print("7. Estatísticas por consulta")
+        print(f"8. {'Desligar' if instrumentacao_habilitada() else 'Ligar'} instrumentação das consultas")
+        print("9. Exportar estatísticas das consultas (JSON)")
+        print("10. Reconstruir estoques das concessionárias")
+        print("11. Relatórios de estoque e clientes")
+        print("12. Recalcular recomendações")
+        print(f"13. {'Desligar' if escrita_adiada_habilitada() else 'Ligar'} escrita adiada no MongoDB")
+        print(f"14. {'Desligar' if cache_habilitado() else 'Ligar'} cache de leitura")
+        print("15. Voltar ao menu principal")
+        choice = input("Digite sua escolha: ")
+        if choice == '1':
+            mostrar_estatisticas_pool()
+        elif choice == '2':
+            mostrar_estatisticas_indices()
+        elif choice == '3':
+            mostrar_migracoes()
+        elif choice == '4':
+            mostrar_estatisticas_cache()
+        elif choice == '5':
+            limpar_caches()
+            slow_print("Cache limpo.")
+        elif choice == '6':
+            mostrar_estatisticas_leitura_paralela()
+        elif choice == '7':
+            mostrar_estatisticas_consultas()
+        elif choice == '8':
+            alternar_instrumentacao()
+        elif choice == '9':
+            exportar_estatisticas_consultas()
+        elif choice == '10':
+            reconstruir_estoques()
+        elif choice == '11':
+            mostrar_relatorios()
+        elif choice == '12':
+            recalcular_recomendacoes()
+        elif choice == '13':
+            alternar_escrita_adiada()
+        elif choice == '14':
+            habilitar_cache(not cache_habilitado())
+            slow_print(f"Cache de leitura {'ligado' if cache_habilitado() else 'desligado e esvaziado'}.")
+        elif choice == '15':
+            break
+        else:
+            slow_print("Opção inválida. Tente novamente.\n")
+
+def reconstruir_estoques():
+    slow_print("\n--- Reconstrução dos Estoques ---")
+    try:
+        dao = ConcessionariaDAO()
+        total = dao.reconstruir_estoques()
+        slow_print(f"{total} estoque(s) reconstruído(s) a partir do Neo4j.")
+        dao.close()
+        carro_dao = CarroDAO()
+        total = carro_dao.reconstruir_situacoes()
+        slow_print(f"Situação de {total} carro(s) em estoque ou vendido(s) regravada.")
+        carro_dao.close()
+    except Exception as e:
+        slow_print(f"Erro ao reconstruir estoques: {str(e)}")
+
+def recalcular_recomendacoes():
+    slow_print("\n--- Recálculo das Recomendações ---")
+    try:
+        carro_dao = CarroDAO()
+        total = carro_dao.sincronizar_propriedades()
+        slow_print(f"Chave do modelo regravada em {total} carro(s) do Neo4j.")
+        carro_dao.close()
+        dao = RecomendacaoDAO()
+        total = dao.recalcular_recomendacoes()
+        slow_print(f"Recomendações de {total} cliente(s) gravadas.")
+        dao.close()
+        estado = estado_atualizacao_recomendacoes()
+        if estado:
+            print(f"Atualização em segundo plano: {'ativa' if estado['ativo'] else 'parada'}, a cada "
+                  f"{estado['intervalo_segundos']} s, {estado['execucoes']} execução(ões), último erro: {estado['ultimo_erro'] or '-'}")
+    except Exception as e:
+        slow_print(f"Erro ao recalcular recomendações: {str(e)}")
+
+def mostrar_relatorios():
+    slow_print("\n--- Relatórios de Estoque e Clientes ---")
+    try:
+        relatorios = gerar_relatorios()
+        for relatorio in relatorios:
+            print("\n" + formatar_tabela(relatorio))
+        diretorio = input("\nDiretório para exportar em CSV (vazio para não exportar): ").strip()
+        if diretorio:
+            for relatorio in relatorios:
+                slow_print(f"CSV salvo em {gravar_csv(relatorio, diretorio)}")
+    except Exception as e:
+        slow_print(f"Erro ao gerar relatórios: {str(e)}")
+
+def mostrar_estatisticas_pool():
+    slow_print("\n--- Estatísticas do Pool de Conexões ---")
+    for chave, valor in estatisticas_pool().items():
+        print(f"{chave}: {valor}")
+
+def mostrar_estatisticas_indices():
+    slow_print("\n--- Uso dos Índices do MongoDB ---")
+    try:
+        for indice in estatisticas_indices_mongo(obter_database().mongo_db):
+            print(f"{indice['colecao']}.{indice['indice']}: {indice['acessos']} acesso(s) desde {indice['desde']:%d/%m/%Y %H:%M}")
+        liberar_database()
+    except Exception as e:
+        slow_print(f"Erro ao consultar índices: {str(e)}")
+
+def mostrar_migracoes():
+    slow_print("\n--- Migrações do Neo4j ---")
+    try:
+        migracoes = listar_migracoes(obter_database().driver)
+        if not migracoes:
+            slow_print("Nenhuma migração aplicada.")
+        for migracao in migracoes:
+            print(f"v{migracao['versao']} - {migracao['descricao']} (aplicada em {migracao['aplicada_em']})")
+        liberar_database()
+    except Exception as e:
+        slow_print(f"Erro ao consultar migrações: {str(e)}")
+
+def mostrar_estatisticas_cache():
+    slow_print("\n--- Estatísticas do Cache ---")
+    caches = estatisticas_caches()
+    if not caches:
+        slow_print("Nenhum cache utilizado ainda.")
+    for nome, estatisticas in caches.items():
+        print(f"{nome}: {estatisticas['itens']} itens, {estatisticas['acertos']} acertos, "
+              f"{estatisticas['falhas']} falhas, {estatisticas['despejos']} despejos "
+              f"(taxa de acerto {estatisticas['taxa_acerto']:.0%})")
+
+def mostrar_estatisticas_leitura_paralela():
+    slow_print("\n--- Leitura Paralela Neo4j + MongoDB ---")
+    estatisticas = estatisticas_leitura_paralela()
+    if not any(medidor["leituras"] for medidor in estatisticas.values()):
+        slow_print("Nenhuma leitura paralela realizada. Ative LEITURA_PARALELA em config/config.py.")
+        return
+    for nome, medidor in estatisticas.items():
+        print(f"{nome}: {medidor['leituras']} leituras, {medidor['ms_economizados']:.1f} ms economizados "
+              f"({medidor['ms_economizados_por_leitura']:.2f} ms por leitura)")
+
+def mostrar_estatisticas_consultas():
+    slow_print("\n--- Estatísticas por Consulta ---")
+    estatisticas = estatisticas_instrumentacao()
+    if not estatisticas:
+        slow_print("Nenhuma consulta registrada. Ligue a instrumentação (opção 8) ou INSTRUMENTACAO_HABILITADA em config/config.py.")
+        return
+    for banco, total in totais_por_banco().items():
+        print(f"{banco}: {total['chamadas']} chamadas, {total['total_ms']:.1f} ms no total")
+    for metodo, bancos in estatisticas.items():
+        print(f"\n{metodo}")
+        for banco, registro in bancos.items():
+            p95 = f"<= {registro['p95_ate_ms']} ms" if registro["p95_ate_ms"] is not None else "acima da última faixa"
+            consultas = f", {registro['consultas']} consultas" if banco == "neo4j" else ""
+            print(f"  {banco}: {registro['chamadas']} chamadas{consultas}, média {registro['media_ms']:.2f} ms, "
+                  f"máx {registro['max_ms']:.2f} ms, p95 {p95}")
+
+def alternar_instrumentacao():
+    habilitar_instrumentacao(not instrumentacao_habilitada())
+    if instrumentacao_habilitada():
+        zerar_instrumentacao()
+        slow_print("Instrumentação ligada. As estatísticas foram zeradas.")
+    else:
+        slow_print("Instrumentação desligada. As estatísticas coletadas continuam disponíveis.")
+
+def alternar_escrita_adiada():
+    try:
+        habilitar_escrita_adiada(not escrita_adiada_habilitada())
+    except Exception as e:
+        slow_print(f"Erro ao gravar as escritas adiadas: {str(e)}")
+    estatisticas = estatisticas_escrita_adiada()
+    if estatisticas["habilitada"]:
+        slow_print(f"Escrita adiada ligada: bulk_write a cada {estatisticas['tamanho_lote']} escritas por coleção "
+                   f"ou {estatisticas['intervalo_segundos']} s.")
+    else:
+        slow_print("Escrita adiada desligada. As escritas pendentes foram gravadas.")
+    for nome, colecao in estatisticas["colecoes"].items():
+        print(f"  {nome}: {colecao['enfileiradas']} escritas em {colecao['descargas']} bulk_write(s), "
+              f"{colecao['pendentes']} pendente(s)")
+    if estatisticas["ultimo_erro"]:
+        print(f"  Erros em segundo plano: {estatisticas['erros_em_segundo_plano']}, último: {estatisticas['ultimo_erro']}")
+
+def exportar_estatisticas_consultas():
+    caminho = input("Arquivo de saída [estatisticas_consultas.json]: ") or "estatisticas_consultas.json"
+    try:
+        exportar_instrumentacao(caminho)
+        slow_print(f"Estatísticas exportadas para {caminho}.")
+    except OSError as e:
+        slow_print(f"Erro ao exportar estatísticas: {str(e)}")
+
 # ------------------------------------------------
 
-def run():
+def preparar_bancos(persistente: bool) -> dict:
+    """Prepara os bancos e retorna o tempo (ms) de cada etapa. No modo persistente os dados são
+    mantidos e migrações/índices ficam para a primeira consulta, então nenhuma conexão é aberta aqui"""
+    etapas = {"importacoes": (time.perf_counter() - _INICIO) * 1000}
+    inicio = time.perf_counter()
+    db = obter_database()
+    etapas["database"] = (time.perf_counter() - inicio) * 1000
+    if persistente:
+        db.ao_conectar(neo4j=aplicar_migracoes, mongo=criar_indices_mongo)
+        return etapas
+    for etapa, funcao in (("limpeza", db.drop_all), ("migracoes", lambda: aplicar_migracoes(db.driver)),
+                          ("indices", lambda: criar_indices_mongo(db.mongo_db))):
+        inicio = time.perf_counter()
+        funcao()
+        etapas[etapa] = (time.perf_counter() - inicio) * 1000
+    limpar_caches()
+    return etapas
+
+def mostrar_relatorio_inicializacao(etapas: dict, persistente: bool):
+    detalhes = ", ".join(f"{etapa} {ms:.0f} ms" for etapa, ms in etapas.items())
+    print(f"Inicialização em {sum(etapas.values()):.0f} ms ({detalhes})")
+    if persistente:
+        print("Modo persistente: dados mantidos; as conexões serão abertas na primeira consulta.")
+
+def run(persistente: bool = None):
+    if persistente is None:
+        persistente = config.MODO_PERSISTENTE
     print_banner()
+    etapas = preparar_bancos(persistente)
+    mostrar_relatorio_inicializacao(etapas, persistente)
+    if config.RECOMENDACOES_PRECALCULADAS:
+        iniciar_atualizacao_recomendacoes()
     slow_print("Bem-vindo ao sistema de controle de concessionária!\n", delay=0.01)
 
-    db = Database(config.NEO4J_URI, config.NEO4J_USERNAME, config.NEO4J_PASSWORD, config.MONGO_URI)
-    db.drop_all()
-    
     while True:
         main_menu()
 
 if __name__ == "__main__":
-    run()
+    argumentos = sys.argv[1:]
+    if all(argumento in ("--persistente", "--cache") for argumento in argumentos):
+        # Sem argumentos, ou só com as opções do menu, abre o menu
+        if "--cache" in argumentos:
+            habilitar_cache()
+        run(persistente=True if "--persistente" in argumentos else None)
+    else:
+        # Modo de comandos para scripts
+        from comandos import main
+        sys.exit(main(argumentos))
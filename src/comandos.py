@@ -0,0 +1,523 @@
+"""Modo de comandos da CLI, para scripts: sem banner, sem menus e com saída em JSON.
+
+Uso (a partir de src/):
+    python cli.py carros list --limite 10
+    python cli.py clientes create --cpf 123.456.789-00 --nome "João Silva" --nacionalidade Brasileiro --data-nascimento 1990-01-01
+    python cli.py transacoes comprar --cpf 123.456.789-00 --concessionaria "Auto Center" --modelo Corolla --fabricante Toyota
+    python cli.py executar comandos.txt
+
+Cada comando imprime uma linha JSON {"comando", "ok", "resultado" | "erro"}.
+`executar` roda um arquivo com um comando por linha (linhas vazias e iniciadas
+por # são ignoradas; "-" lê da entrada padrão) no mesmo processo, com as mesmas
+conexões. Com `executar --escrita-adiada` as escritas no MongoDB são agrupadas
+(config/escrita_adiada.py) e gravadas no mais tardar ao fim do arquivo, e com
+`executar --cache` as leituras por identificacao passam pelo cache (daos/cache.py).
+Ao contrário do menu, o modo de comandos não apaga os bancos ao iniciar.
+O código de saída é 0 se todos os comandos deram certo e 1 caso contrário.
+"""
+import argparse
+import contextlib
+import io
+import json
+import shlex
+import sys
+from datetime import datetime
+from typing import List, Optional
+from pymongo.errors import DuplicateKeyError
+from config.config import RECOMENDACOES_LIMITE
+from config.database import obter_database, liberar_database, estatisticas_pool
+from config.escrita_adiada import estatisticas_escrita_adiada, habilitar_escrita_adiada
+from config.schema import criar_indices_mongo, estatisticas_indices_mongo
+from config.migracoes import aplicar_migracoes, listar_migracoes
+from config.instrumentacao import estatisticas_instrumentacao, totais_por_banco
+from relatorios import RELATORIOS, gerar_relatorios, gravar_csv
+from daos.cache import estatisticas_caches, habilitar_cache
+from daos.carro_dao import CarroDAO, Carro, TAMANHO_PAGINA_PESQUISA
+from daos.cliente_dao import ClienteDAO, Cliente, ResultadoCompra
+from daos.concessionaria_dao import ConcessionariaDAO, Concessionaria
+from daos.estoque import FILTROS_DISPONIBILIDADE
+from daos.recomendacao_dao import RecomendacaoDAO
+
+class ErroComando(Exception):
+    """Falha esperada de um comando (entidade não encontrada, argumento inválido, ...)"""
+
+class _Parser(argparse.ArgumentParser):
+    # Erros de argumentos viram ErroComando para não encerrar um arquivo de comandos no meio
+    def error(self, message):
+        raise ErroComando(f"{self.prog}: {message}")
+
+class Contexto:
+    """DAOs compartilhados pelos comandos de uma execução"""
+    def __init__(self):
+        # Migrações e índices rodam na primeira consulta a cada banco
+        obter_database().ao_conectar(neo4j=aplicar_migracoes, mongo=criar_indices_mongo)
+        liberar_database()
+        self.carros = CarroDAO()
+        self.clientes = ClienteDAO()
+        self.concessionarias = ConcessionariaDAO()
+        self.recomendacoes = RecomendacaoDAO()
+
+    def close(self):
+        self.carros.close()
+        self.clientes.close()
+        self.concessionarias.close()
+        self.recomendacoes.close()
+
+def _data(texto: str) -> datetime:
+    try:
+        return datetime.strptime(texto, "%Y-%m-%d")
+    except ValueError:
+        raise ErroComando(f"data inválida: {texto}. Use YYYY-MM-DD")
+
+def _json(valor):
+    if isinstance(valor, (Carro, Cliente, Concessionaria)):
+        return valor.to_dict()
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} não é serializável")
+
+def _obter_carro(ctx: Contexto, identificacao: str) -> Carro:
+    carro = ctx.carros.buscar_carro(identificacao)
+    if not carro:
+        raise ErroComando("Carro não encontrado.")
+    return carro
+
+def _obter_cliente(ctx: Contexto, identificacao: Optional[str] = None, cpf: Optional[str] = None) -> Cliente:
+    cliente = ctx.clientes.buscar_cliente_por_cpf(cpf) if cpf else ctx.clientes.buscar_cliente(identificacao)
+    if not cliente:
+        raise ErroComando("Cliente não encontrado.")
+    return cliente
+
+def _obter_concessionaria(ctx: Contexto, identificacao: Optional[str] = None, nome: Optional[str] = None) -> Concessionaria:
+    if nome:
+        concessionaria = ctx.concessionarias.buscar_concessionaria_por_nome(nome)
+    else:
+        concessionaria = ctx.concessionarias.buscar_concessionaria(identificacao)
+    if not concessionaria:
+        raise ErroComando("Concessionária não encontrada.")
+    return concessionaria
+
+def _exigir_um(args, *campos):
+    if not any(getattr(args, campo) for campo in campos):
+        raise ErroComando(f"informe {' ou '.join(campos)}")
+
+# ------------------------ CARROS ------------------------
+
+def carros_list(ctx: Contexto, args):
+    carros = []
+    for carro in ctx.carros.iterar_carros(cursor=args.cursor):
+        if args.limite and len(carros) >= args.limite:
+            break
+        carros.append(carro)
+    return carros
+
+def carros_search(ctx: Contexto, args):
+    return ctx.carros.pesquisar_carros(texto=args.texto, modelo=args.modelo, fabricante=args.fabricante,
+                                       ano_minimo=args.ano_min, ano_maximo=args.ano_max, disponibilidade=args.disponibilidade,
+                                       exato=args.exato, pagina=args.pagina, tamanho_pagina=args.tamanho_pagina)
+
+def carros_get(ctx: Contexto, args):
+    carro = _obter_carro(ctx, args.identificacao)
+    return dict(carro.to_dict(), concessionaria=ctx.carros.buscar_concessionaria_do_carro(carro.identificacao))
+
+def carros_create(ctx: Contexto, args):
+    carro = Carro(modelo=args.modelo, ano=args.ano, fabricante=args.fabricante, crlv=args.crlv)
+    return {"identificacao": ctx.carros.criar_carro(carro)}
+
+def carros_update(ctx: Contexto, args):
+    atual = _obter_carro(ctx, args.identificacao)
+    carro = Carro(modelo=args.modelo or atual.modelo, ano=args.ano or atual.ano,
+                  fabricante=args.fabricante or atual.fabricante, crlv=args.crlv or atual.crlv)
+    if not ctx.carros.atualizar_carro(args.identificacao, carro):
+        raise ErroComando("Falha ao atualizar carro.")
+    carro.identificacao = args.identificacao
+    return carro
+
+def carros_delete(ctx: Contexto, args):
+    _obter_carro(ctx, args.identificacao)
+    if not ctx.carros.remover_carro(args.identificacao):
+        raise ErroComando("Falha ao remover carro.")
+    return {"identificacao": args.identificacao}
+
+# ------------------------ CLIENTES ------------------------
+
+def clientes_list(ctx: Contexto, args):
+    clientes = ctx.clientes.buscar_clientes_com_carros()
+    if args.limite:
+        clientes = clientes[:args.limite]
+    return [dict(cliente.to_dict(), carros=carros) for cliente, carros in clientes]
+
+def clientes_get(ctx: Contexto, args):
+    _exigir_um(args, "identificacao", "cpf")
+    cliente = _obter_cliente(ctx, args.identificacao, args.cpf)
+    return dict(cliente.to_dict(), carros=ctx.clientes.buscar_carros_do_cliente(cliente.identificacao))
+
+def clientes_recomendacoes(ctx: Contexto, args):
+    _exigir_um(args, "identificacao", "cpf")
+    cliente = _obter_cliente(ctx, args.identificacao, args.cpf)
+    return ctx.recomendacoes.recomendar_carros(cliente.identificacao, args.limite)
+
+def clientes_create(ctx: Contexto, args):
+    cliente = Cliente(cpf=args.cpf, nome=args.nome, nacionalidade=args.nacionalidade,
+                      data_nascimento=_data(args.data_nascimento))
+    try:
+        return {"identificacao": ctx.clientes.criar_cliente(cliente)}
+    except DuplicateKeyError:
+        raise ErroComando("Já existe um cliente com esse CPF.")
+
+def clientes_update(ctx: Contexto, args):
+    atual = _obter_cliente(ctx, args.identificacao)
+    cliente = Cliente(cpf=args.cpf or atual.cpf, nome=args.nome or atual.nome,
+                      nacionalidade=args.nacionalidade or atual.nacionalidade,
+                      data_nascimento=_data(args.data_nascimento) if args.data_nascimento else atual.data_nascimento)
+    try:
+        if not ctx.clientes.atualizar_cliente(args.identificacao, cliente):
+            raise ErroComando("Falha ao atualizar cliente.")
+    except DuplicateKeyError:
+        raise ErroComando("Já existe um cliente com esse CPF.")
+    cliente.identificacao = args.identificacao
+    return cliente
+
+def clientes_delete(ctx: Contexto, args):
+    _obter_cliente(ctx, args.identificacao)
+    if not ctx.clientes.remover_cliente(args.identificacao):
+        raise ErroComando("Falha ao remover cliente.")
+    return {"identificacao": args.identificacao}
+
+# ------------------------ CONCESSIONÁRIAS ------------------------
+
+def concessionarias_list(ctx: Contexto, args):
+    concessionarias = []
+    for pagina, _ in ctx.concessionarias.iterar_paginas_concessionarias(cursor=args.cursor):
+        if args.limite:
+            pagina = pagina[:args.limite - len(concessionarias)]
+        # Os carros da página toda em uma consulta ao Neo4j
+        carros = ctx.concessionarias.buscar_carros_das_concessionarias([concessionaria.identificacao for concessionaria in pagina])
+        concessionarias.extend(dict(concessionaria.to_dict(), carros=carros.get(concessionaria.identificacao, []))
+                               for concessionaria in pagina)
+        if args.limite and len(concessionarias) >= args.limite:
+            break
+    return concessionarias
+
+def concessionarias_get(ctx: Contexto, args):
+    _exigir_um(args, "identificacao", "nome")
+    concessionaria = _obter_concessionaria(ctx, args.identificacao, args.nome)
+    return dict(concessionaria.to_dict(),
+                carros=ctx.concessionarias.buscar_carros_da_concessionaria(concessionaria.identificacao))
+
+def concessionarias_estoque(ctx: Contexto, args):
+    _exigir_um(args, "identificacao", "nome")
+    concessionaria = _obter_concessionaria(ctx, args.identificacao, args.nome)
+    estoque = ctx.concessionarias.buscar_estoque(concessionaria.identificacao)
+    return dict(estoque, carros=[carro.to_dict() for carro in estoque["carros"]])
+
+def concessionarias_create(ctx: Contexto, args):
+    if ctx.concessionarias.buscar_concessionaria_por_nome(args.nome, campos="existencia"):
+        raise ErroComando("Já existe uma concessionária com esse nome. O nome deve ser único.")
+    try:
+        identificacao = ctx.concessionarias.criar_concessionaria(Concessionaria(nome=args.nome), args.carros)
+    except DuplicateKeyError:
+        raise ErroComando("Já existe uma concessionária com esse nome. O nome deve ser único.")
+    return {"identificacao": identificacao}
+
+def concessionarias_update(ctx: Contexto, args):
+    _obter_concessionaria(ctx, args.identificacao)
+    concessionaria = Concessionaria(nome=args.nome)
+    try:
+        if not ctx.concessionarias.atualizar_concessionaria(args.identificacao, concessionaria):
+            raise ErroComando("Falha ao atualizar concessionária.")
+    except DuplicateKeyError:
+        raise ErroComando("Já existe uma concessionária com esse nome. O nome deve ser único.")
+    concessionaria.identificacao = args.identificacao
+    return concessionaria
+
+def concessionarias_delete(ctx: Contexto, args):
+    _obter_concessionaria(ctx, args.identificacao)
+    if not ctx.concessionarias.remover_concessionaria(args.identificacao):
+        raise ErroComando("Falha ao remover concessionária.")
+    return {"identificacao": args.identificacao}
+
+# ------------------------ TRANSAÇÕES ------------------------
+
+def transacoes_adicionar_carro(ctx: Contexto, args):
+    concessionaria = _obter_concessionaria(ctx, nome=args.concessionaria)
+    carros = ctx.carros.pesquisar_carros(modelo=args.modelo, fabricante=args.fabricante, exato=True,
+                                         disponibilidade="livre", tamanho_pagina=1, campos="existencia")
+    if not carros:
+        raise ErroComando("Nenhum carro livre desse modelo e fabricante.")
+    carro = carros[0]
+    if ctx.carros.buscar_concessionaria_do_carro(carro.identificacao):
+        raise ErroComando("Este carro já está em uma concessionária.")
+    if not ctx.concessionarias.vincular_carro_a_concessionaria(concessionaria.identificacao, carro.identificacao):
+        raise ErroComando("Falha ao adicionar carro à concessionária.")
+    return {"concessionaria": concessionaria.identificacao, "carro": carro.identificacao}
+
+def transacoes_cadastrar(ctx: Contexto, args):
+    cliente = _obter_cliente(ctx, cpf=args.cpf)
+    concessionaria = _obter_concessionaria(ctx, nome=args.concessionaria)
+    if ctx.clientes.verificar_cliente_concessionaria(cliente.identificacao, concessionaria.identificacao):
+        raise ErroComando("Cliente já está cadastrado nesta concessionária.")
+    if not ctx.clientes.cadastrar_cliente_concessionaria(cliente.identificacao, concessionaria.identificacao):
+        raise ErroComando("Falha ao cadastrar cliente na concessionária.")
+    return {"cliente": cliente.identificacao, "concessionaria": concessionaria.identificacao}
+
+def transacoes_comprar(ctx: Contexto, args):
+    cliente = _obter_cliente(ctx, cpf=args.cpf)
+    concessionaria = _obter_concessionaria(ctx, nome=args.concessionaria)
+    carro = ctx.concessionarias.buscar_carro_em_estoque(concessionaria.identificacao, args.modelo, args.fabricante)
+    if not carro:
+        raise ErroComando("Carro não encontrado na concessionária especificada.")
+    resultado = ctx.clientes.comprar_carro(cliente.identificacao, concessionaria.identificacao, carro.identificacao)
+    if resultado == ResultadoCompra.NAO_CADASTRADO:
+        raise ErroComando("Cliente não está cadastrado nesta concessionária.")
+    if resultado == ResultadoCompra.INDISPONIVEL:
+        raise ErroComando("Este carro acabou de ser vendido.")
+    if resultado != ResultadoCompra.SUCESSO:
+        raise ErroComando("Cliente, concessionária ou carro não encontrado.")
+    return {"cliente": cliente.identificacao, "concessionaria": concessionaria.identificacao, "carro": carro.identificacao}
+
+# ------------------------ ADMINISTRAÇÃO ------------------------
+
+def admin_pool(ctx: Contexto, args):
+    return estatisticas_pool()
+
+def admin_indices(ctx: Contexto, args):
+    return estatisticas_indices_mongo(ctx.carros.database.mongo_db)
+
+def admin_migracoes(ctx: Contexto, args):
+    return listar_migracoes(ctx.carros.driver)
+
+def admin_cache(ctx: Contexto, args):
+    return estatisticas_caches()
+
+def admin_consultas(ctx: Contexto, args):
+    return {"por_banco": totais_por_banco(), "por_metodo": estatisticas_instrumentacao()}
+
+def admin_escrita(ctx: Contexto, args):
+    return estatisticas_escrita_adiada()
+
+def admin_recomendacoes(ctx: Contexto, args):
+    resultado = {}
+    if args.sincronizar:
+        resultado["carros_sincronizados"] = ctx.carros.sincronizar_propriedades()
+    resultado["clientes"] = ctx.recomendacoes.recalcular_recomendacoes()
+    return resultado
+
+def admin_relatorios(ctx: Contexto, args):
+    try:
+        relatorios = gerar_relatorios(args.relatorios)
+    except ValueError as e:
+        raise ErroComando(str(e))
+    if args.csv:
+        for relatorio in relatorios:
+            gravar_csv(relatorio, args.csv)
+    return [relatorio.to_dict() for relatorio in relatorios]
+
+def admin_estoques(ctx: Contexto, args):
+    resultado = {"reconstruidos": ctx.concessionarias.reconstruir_estoques(args.identificacoes or None)}
+    if not args.identificacoes:
+        # Reconstrução completa: também a situação gravada em cada carro, usada pela pesquisa
+        resultado["carros_em_estoque_ou_vendidos"] = ctx.carros.reconstruir_situacoes()
+    return resultado
+
+# ------------------------------------------------
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = _Parser(prog="cli.py", description="Comandos da concessionária com saída em JSON")
+    entidades = parser.add_subparsers(dest="entidade", required=True)
+
+    carros = entidades.add_parser("carros").add_subparsers(dest="acao", required=True)
+    sub = carros.add_parser("list")
+    sub.add_argument("--limite", type=int, default=0)
+    sub.add_argument("--cursor", help="continua a listagem após esta identificacao")
+    sub.set_defaults(funcao=carros_list)
+    sub = carros.add_parser("search", help="pesquisa por palavras, começo do modelo/fabricante, ano e disponibilidade")
+    sub.add_argument("texto", nargs="?", help='palavras do modelo ou fabricante, ex.: "skyline"')
+    sub.add_argument("--modelo", help="começo do modelo, sem diferenciar maiúsculas")
+    sub.add_argument("--fabricante", help="começo do fabricante, sem diferenciar maiúsculas")
+    sub.add_argument("--exato", action="store_true", help="modelo e fabricante inteiros em vez de prefixos")
+    sub.add_argument("--ano-min", type=int)
+    sub.add_argument("--ano-max", type=int)
+    sub.add_argument("--disponibilidade", choices=list(FILTROS_DISPONIBILIDADE))
+    sub.add_argument("--pagina", type=int, default=1)
+    sub.add_argument("--tamanho-pagina", type=int, default=TAMANHO_PAGINA_PESQUISA)
+    sub.set_defaults(funcao=carros_search)
+    sub = carros.add_parser("get")
+    sub.add_argument("identificacao")
+    sub.set_defaults(funcao=carros_get)
+    sub = carros.add_parser("create")
+    sub.add_argument("--modelo", required=True)
+    sub.add_argument("--ano", type=int, required=True)
+    sub.add_argument("--fabricante", required=True)
+    sub.add_argument("--crlv", required=True)
+    sub.set_defaults(funcao=carros_create)
+    sub = carros.add_parser("update")
+    sub.add_argument("identificacao")
+    sub.add_argument("--modelo")
+    sub.add_argument("--ano", type=int)
+    sub.add_argument("--fabricante")
+    sub.add_argument("--crlv")
+    sub.set_defaults(funcao=carros_update)
+    sub = carros.add_parser("delete")
+    sub.add_argument("identificacao")
+    sub.set_defaults(funcao=carros_delete)
+
+    clientes = entidades.add_parser("clientes").add_subparsers(dest="acao", required=True)
+    sub = clientes.add_parser("list")
+    sub.add_argument("--limite", type=int, default=0)
+    sub.set_defaults(funcao=clientes_list)
+    sub = clientes.add_parser("get")
+    sub.add_argument("identificacao", nargs="?")
+    sub.add_argument("--cpf")
+    sub.set_defaults(funcao=clientes_get)
+    sub = clientes.add_parser("recomendacoes", help="carros em estoque comprados por clientes com carros dos mesmos modelos")
+    sub.add_argument("identificacao", nargs="?")
+    sub.add_argument("--cpf")
+    sub.add_argument("--limite", type=int, default=RECOMENDACOES_LIMITE)
+    sub.set_defaults(funcao=clientes_recomendacoes)
+    sub = clientes.add_parser("create")
+    sub.add_argument("--cpf", required=True)
+    sub.add_argument("--nome", required=True)
+    sub.add_argument("--nacionalidade", required=True)
+    sub.add_argument("--data-nascimento", required=True, help="YYYY-MM-DD")
+    sub.set_defaults(funcao=clientes_create)
+    sub = clientes.add_parser("update")
+    sub.add_argument("identificacao")
+    sub.add_argument("--cpf")
+    sub.add_argument("--nome")
+    sub.add_argument("--nacionalidade")
+    sub.add_argument("--data-nascimento", help="YYYY-MM-DD")
+    sub.set_defaults(funcao=clientes_update)
+    sub = clientes.add_parser("delete")
+    sub.add_argument("identificacao")
+    sub.set_defaults(funcao=clientes_delete)
+
+    concessionarias = entidades.add_parser("concessionarias").add_subparsers(dest="acao", required=True)
+    sub = concessionarias.add_parser("list")
+    sub.add_argument("--limite", type=int, default=0)
+    sub.add_argument("--cursor", help="continua a listagem após esta identificacao")
+    sub.set_defaults(funcao=concessionarias_list)
+    sub = concessionarias.add_parser("get")
+    sub.add_argument("identificacao", nargs="?")
+    sub.add_argument("--nome")
+    sub.set_defaults(funcao=concessionarias_get)
+    sub = concessionarias.add_parser("estoque")
+    sub.add_argument("identificacao", nargs="?")
+    sub.add_argument("--nome")
+    sub.set_defaults(funcao=concessionarias_estoque)
+    sub = concessionarias.add_parser("create")
+    sub.add_argument("--nome", required=True)
+    sub.add_argument("--carros", type=int, help="tamanho do estoque inicial (padrão: CARROS_POR_CONCESSIONARIA)")
+    sub.set_defaults(funcao=concessionarias_create)
+    sub = concessionarias.add_parser("update")
+    sub.add_argument("identificacao")
+    sub.add_argument("--nome", required=True)
+    sub.set_defaults(funcao=concessionarias_update)
+    sub = concessionarias.add_parser("delete")
+    sub.add_argument("identificacao")
+    sub.set_defaults(funcao=concessionarias_delete)
+
+    transacoes = entidades.add_parser("transacoes").add_subparsers(dest="acao", required=True)
+    sub = transacoes.add_parser("adicionar-carro")
+    sub.add_argument("--concessionaria", required=True, help="nome da concessionária")
+    sub.add_argument("--modelo", required=True)
+    sub.add_argument("--fabricante", required=True)
+    sub.set_defaults(funcao=transacoes_adicionar_carro)
+    sub = transacoes.add_parser("cadastrar")
+    sub.add_argument("--cpf", required=True)
+    sub.add_argument("--concessionaria", required=True, help="nome da concessionária")
+    sub.set_defaults(funcao=transacoes_cadastrar)
+    sub = transacoes.add_parser("comprar")
+    sub.add_argument("--cpf", required=True)
+    sub.add_argument("--concessionaria", required=True, help="nome da concessionária")
+    sub.add_argument("--modelo", required=True)
+    sub.add_argument("--fabricante", required=True)
+    sub.set_defaults(funcao=transacoes_comprar)
+
+    admin = entidades.add_parser("admin").add_subparsers(dest="acao", required=True)
+    for nome, funcao in [("pool", admin_pool), ("indices", admin_indices), ("migracoes", admin_migracoes),
+                         ("cache", admin_cache), ("consultas", admin_consultas), ("escrita", admin_escrita)]:
+        admin.add_parser(nome).set_defaults(funcao=funcao)
+    sub = admin.add_parser("estoques", help="reconstrói os estoques materializados (e, sem IDs, a situação dos carros) a partir do Neo4j")
+    sub.add_argument("identificacoes", nargs="*", help="concessionárias (padrão: todas)")
+    sub.set_defaults(funcao=admin_estoques)
+    sub = admin.add_parser("relatorios", help=f"relatórios agregados: {', '.join(RELATORIOS)} (padrão: todos)")
+    sub.add_argument("relatorios", nargs="*")
+    sub.add_argument("--csv", metavar="DIRETORIO", help="grava também um CSV por relatório no diretório")
+    sub.set_defaults(funcao=admin_relatorios)
+    sub = admin.add_parser("recomendacoes", help="recalcula a coleção de recomendações pré-calculadas")
+    sub.add_argument("--sincronizar", action="store_true",
+                     help="antes, grava a chave do modelo nos nós :Carro a partir do MongoDB")
+    sub.set_defaults(funcao=admin_recomendacoes)
+
+    sub = entidades.add_parser("executar", help="roda um arquivo com um comando por linha")
+    sub.add_argument("arquivo", help='arquivo de comandos ("-" para a entrada padrão)')
+    sub.add_argument("--continuar-em-erro", action="store_true", help="não para no primeiro comando que falhar")
+    sub.add_argument("--escrita-adiada", action="store_true",
+                     help="agrupa as escritas no MongoDB em bulk_writes, gravados no mais tardar ao fim do arquivo")
+    sub.add_argument("--cache", action="store_true", help="liga o cache de leitura durante o arquivo")
+    return parser
+
+def executar_comando(ctx: Contexto, parser: argparse.ArgumentParser, argv: List[str]) -> bool:
+    """Roda um comando, imprime a linha JSON do resultado e retorna se deu certo"""
+    saida = {"comando": shlex.join(argv)}
+    ajuda = io.StringIO()
+    try:
+        # O --help escreveria na saída padrão, no meio das linhas JSON: o texto vai para o resultado
+        with contextlib.redirect_stdout(ajuda):
+            args = parser.parse_args(argv)
+        if args.entidade == "executar":
+            raise ErroComando("executar não pode ser usado dentro de um arquivo de comandos")
+        saida["resultado"] = args.funcao(ctx, args)
+        saida["ok"] = True
+    except ErroComando as e:
+        saida.update(ok=False, erro=str(e))
+    except SystemExit:
+        # --help
+        saida.update(ok=True, resultado=ajuda.getvalue())
+    except Exception as e:
+        saida.update(ok=False, erro=f"{type(e).__name__}: {e}")
+    print(json.dumps(saida, default=_json, ensure_ascii=False), flush=True)
+    return saida["ok"]
+
+def _ler_comandos(arquivo: str):
+    entrada = sys.stdin if arquivo == "-" else open(arquivo, encoding="utf-8")
+    try:
+        for linha in entrada:
+            linha = linha.strip()
+            if linha and not linha.startswith("#"):
+                yield linha
+    finally:
+        if entrada is not sys.stdin:
+            entrada.close()
+
+def main(argv: List[str]) -> int:
+    parser = criar_parser()
+    try:
+        args = parser.parse_args(argv)
+    except ErroComando as e:
+        print(json.dumps({"comando": shlex.join(argv), "ok": False, "erro": str(e)}, ensure_ascii=False))
+        return 1
+
+    ctx = Contexto()
+    try:
+        if args.entidade != "executar":
+            return 0 if executar_comando(ctx, parser, argv) else 1
+        if args.escrita_adiada:
+            habilitar_escrita_adiada()
+        if args.cache:
+            habilitar_cache()
+        tudo_ok = True
+        for linha in _ler_comandos(args.arquivo):
+            try:
+                comando = shlex.split(linha)
+            except ValueError as e:
+                print(json.dumps({"comando": linha, "ok": False, "erro": str(e)}, ensure_ascii=False))
+                comando = None
+            if comando is None or not executar_comando(ctx, parser, comando):
+                tudo_ok = False
+                if not args.continuar_em_erro:
+                    break
+        return 0 if tudo_ok else 1
+    finally:
+        ctx.close()
@@ -4,3 +4,60 @@ MONGO_DB_NAME = "concessionaria"
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USERNAME = "neo4j"
 NEO4J_PASSWORD = "data_data_base"  
+
+# Pool de conexões compartilhado entre os DAOs
+NEO4J_MAX_POOL_SIZE = 50
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = 60  # segundos
+NEO4J_MAX_CONNECTION_LIFETIME = 3600  # segundos
+NEO4J_CONNECTION_TIMEOUT = 30  # segundos para abrir uma nova conexão
+NEO4J_TAMANHO_LOTE_LIMPEZA = 10000  # nós apagados por transação ao limpar o banco (drop_all)
+
+MONGO_MAX_POOL_SIZE = 50
+MONGO_MIN_POOL_SIZE = 0
+MONGO_MAX_IDLE_TIME_MS = 300000
+
+# Quantidade de identificacoes por consulta $in ao hidratar listagens no MongoDB
+MONGO_TAMANHO_LOTE = 500
+
+# Quantidade de carros do estoque inicial criado com cada concessionária
+CARROS_POR_CONCESSIONARIA = 10
+
+# Linhas gravadas por lote no importador em massa
+IMPORTACAO_TAMANHO_LOTE = 1000
+# Erros de linha guardados no resumo da importação; os demais só são contados
+IMPORTACAO_MAXIMO_ERROS = 1000
+
+# Cache de leitura das entidades (compartilhado pelos DAOs do processo). Desligado por padrão:
+# ligue por sessão com daos.cache.habilitar_cache, `cli.py --cache` ou `executar --cache`
+CACHE_HABILITADO = False
+CACHE_TAMANHO_MAXIMO = 10000  # itens por tipo de entidade
+CACHE_TTL = 60  # segundos
+
+# Itens por página nas listagens paginadas por identificacao (iterar_*)
+PAGINACAO_TAMANHO_PAGINA = 1000
+
+# Consulta Neo4j e MongoDB ao mesmo tempo em buscar_carro/cliente/concessionaria
+LEITURA_PARALELA = False
+LEITURA_PARALELA_THREADS = 8
+
+# Instrumentação das consultas por método dos DAOs (pode ser ligada pelo menu de administração)
+INSTRUMENTACAO_HABILITADA = False
+
+# Recomendações de carros: com RECOMENDACOES_PRECALCULADAS a coleção recomendacoes é recalculada em
+# segundo plano a cada RECOMENDACOES_INTERVALO segundos e cada recomendação é uma leitura indexada
+RECOMENDACOES_PRECALCULADAS = False
+RECOMENDACOES_INTERVALO = 300  # segundos
+RECOMENDACOES_LIMITE = 10  # carros por cliente
+
+# Escrita adiada (write-behind) no MongoDB: as escritas dos DAOs são gravadas juntas em um bulk_write por
+# coleção a cada ESCRITA_ADIADA_TAMANHO_LOTE operações, após ESCRITA_ADIADA_INTERVALO segundos ou no close()
+ESCRITA_ADIADA = False
+ESCRITA_ADIADA_TAMANHO_LOTE = 500
+ESCRITA_ADIADA_INTERVALO = 1.0  # segundos
+
+# Snapshot (snapshot.py): itens por bloco do arquivo e threads que comprimem/gravam os blocos
+SNAPSHOT_TAMANHO_BLOCO = 5000
+SNAPSHOT_THREADS = 8
+
+# Mantém os dados ao abrir o menu (sem drop_all); também pode ser ativado com "python cli.py --persistente"
+MODO_PERSISTENTE = False
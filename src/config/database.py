@@ -1,16 +1,113 @@
+import atexit
+import threading
 from neo4j import GraphDatabase
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
+import config.config as config
+from config.escrita_adiada import MongoEscritaAdiada, esquecer_banco
+from config.instrumentacao import DriverInstrumentado, MongoInstrumentado, instrumentado
+
+class _MonitorPoolMongo(monitoring.ConnectionPoolListener):
+    """Conta os eventos do pool de conexões do MongoClient"""
+    def __init__(self):
+        self.criadas = 0
+        self.fechadas = 0
+        self.emprestadas = 0
+        self.devolvidas = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.criadas += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.fechadas += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        self.emprestadas += 1
+
+    def connection_checked_in(self, event):
+        self.devolvidas += 1
 
 class Database:
+    """Driver do Neo4j e cliente do MongoDB, criados só quando o primeiro comando é enviado a cada banco"""
     def __init__(self, uri, user, password, mongo_uri):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        self.mongo_client = MongoClient(mongo_uri)
-        self.mongo_db = self.mongo_client["concessionaria"]
+        self.monitor_mongo = _MonitorPoolMongo()
+        self._uri, self._user, self._password, self._mongo_uri = uri, user, password, mongo_uri
+        self._mongo_client = None
+        self._lock_mongo = threading.Lock()
+        self._ao_conectar = {"neo4j": [], "mongo": []}
+        self.driver = DriverInstrumentado(self._criar_driver, lambda driver: self._conectado("neo4j", driver))
+        self.mongo_db = MongoEscritaAdiada(MongoInstrumentado(lambda: self.mongo_client[config.MONGO_DB_NAME],
+                                                              lambda mongo_db: self._conectado("mongo", mongo_db)))
+
+    def _criar_driver(self):
+        return GraphDatabase.driver(
+            self._uri,
+            auth=(self._user, self._password),
+            max_connection_pool_size=config.NEO4J_MAX_POOL_SIZE,
+            connection_acquisition_timeout=config.NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+            max_connection_lifetime=config.NEO4J_MAX_CONNECTION_LIFETIME,
+            connection_timeout=config.NEO4J_CONNECTION_TIMEOUT
+        )
+
+    @property
+    def mongo_client(self) -> MongoClient:
+        with self._lock_mongo:
+            if self._mongo_client is None:
+                self._mongo_client = MongoClient(
+                    self._mongo_uri,
+                    maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                    minPoolSize=config.MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+                    event_listeners=[self.monitor_mongo]
+                )
+            return self._mongo_client
+
+    def _conectado(self, banco: str, alvo):
+        for funcao in self._ao_conectar[banco]:
+            funcao(alvo)
+
+    def ao_conectar(self, neo4j=None, mongo=None):
+        """Registra funções chamadas com o driver / o banco do MongoDB no primeiro uso de cada um
+        (ou na hora, se já estiver conectado), ex.: aplicar migrações sem atrasar a inicialização"""
+        for banco, funcao, alvo in (("neo4j", neo4j, self.driver), ("mongo", mongo, self.mongo_db)):
+            if funcao is None:
+                continue
+            if alvo.conectado:
+                funcao(alvo)
+            else:
+                self._ao_conectar[banco].append(funcao)
 
     def close(self):
-        self.driver.close()
-        self.mongo_client.close()
+        try:
+            # Grava as escritas adiadas antes de fechar o cliente do MongoDB
+            self.mongo_db.descarregar()
+        finally:
+            esquecer_banco(self.mongo_db)
+            self.driver.close()
+            if self._mongo_client is not None:
+                self._mongo_client.close()
 
+    @instrumentado("Database.execute_query")
     def execute_query(self, query, parameters=None):
         data = []
         with self.driver.session() as session:
@@ -18,10 +115,76 @@ class Database:
             for record in results:
                 data.append(record)
             return data
-        
+
     def drop_all(self):
         with self.driver.session() as session:
-            session.run("MATCH (n) DETACH DELETE n")
+            # O log de migrações é mantido, pois as constraints sobrevivem à limpeza. Os nós são apagados
+            # em lotes, cada um na sua transação, para não acumular o banco inteiro na memória de uma só.
+            # CALL { } IN TRANSACTIONS exige transação implícita, por isso session.run e não execute_write
+            session.run(
+                "MATCH (n) WHERE NOT n:Migracao CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $tamanho_lote ROWS",
+                tamanho_lote=config.NEO4J_TAMANHO_LOTE_LIMPEZA
+            ).consume()
         self.mongo_db["carros"].drop()
         self.mongo_db["clientes"].drop()
-        self.mongo_db["concessionarias"].drop()
\ No newline at end of file
+        self.mongo_db["concessionarias"].drop()
+        self.mongo_db["estoques"].drop()
+        self.mongo_db["recomendacoes"].drop()
+
+# ------------------------ REGISTRO DE CONEXÕES ------------------------
+
+_database = None
+_lock = threading.Lock()
+_estatisticas = {"databases_criados": 0, "emprestimos": 0, "devolucoes": 0}
+
+def obter_database() -> Database:
+    """Retorna o Database compartilhado pelo processo, criando-o no primeiro uso"""
+    global _database
+    with _lock:
+        if _database is None:
+            _database = Database(config.NEO4J_URI, config.NEO4J_USERNAME, config.NEO4J_PASSWORD, config.MONGO_URI)
+            _estatisticas["databases_criados"] += 1
+        _estatisticas["emprestimos"] += 1
+        return _database
+
+def definir_database(database: Database):
+    """Substitui o Database compartilhado (ex.: pelos bancos em memória do benchmark)"""
+    global _database
+    with _lock:
+        if _database is not None and _database is not database:
+            _database.close()
+        _database = database
+
+def liberar_database():
+    """Devolve o Database emprestado, gravando as escritas adiadas; as conexões continuam abertas no pool"""
+    with _lock:
+        _estatisticas["devolucoes"] += 1
+        database = _database
+    if database is not None:
+        database.mongo_db.descarregar()
+
+def fechar_database():
+    """Fecha o driver do Neo4j e o cliente do MongoDB compartilhados"""
+    global _database
+    with _lock:
+        if _database is not None:
+            _database.close()
+            _database = None
+
+def estatisticas_pool() -> dict:
+    """Retorna os contadores de uso do registro de conexões e do pool do MongoDB"""
+    with _lock:
+        estatisticas = dict(_estatisticas)
+        estatisticas["emprestimos_ativos"] = estatisticas["emprestimos"] - estatisticas["devolucoes"]
+        estatisticas["conectado"] = _database is not None
+        if _database is not None:
+            monitor = _database.monitor_mongo
+            estatisticas["mongo_conexoes_criadas"] = monitor.criadas
+            estatisticas["mongo_conexoes_fechadas"] = monitor.fechadas
+            estatisticas["mongo_conexoes_em_uso"] = monitor.emprestadas - monitor.devolvidas
+            estatisticas["mongo_checkouts"] = monitor.emprestadas
+            estatisticas["neo4j_conectado"] = _database.driver.conectado
+            estatisticas["mongo_conectado"] = _database.mongo_db.conectado
+        return estatisticas
+
+atexit.register(fechar_database)
@@ -0,0 +1,47 @@
+import threading
+from neo4j import AsyncGraphDatabase
+from motor.motor_asyncio import AsyncIOMotorClient
+import config.config as config
+
+class AsyncDatabase:
+    def __init__(self, uri, user, password, mongo_uri):
+        self.driver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=config.NEO4J_MAX_POOL_SIZE,
+            connection_acquisition_timeout=config.NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+            max_connection_lifetime=config.NEO4J_MAX_CONNECTION_LIFETIME,
+            connection_timeout=config.NEO4J_CONNECTION_TIMEOUT
+        )
+        self.mongo_client = AsyncIOMotorClient(
+            mongo_uri,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS
+        )
+        self.mongo_db = self.mongo_client[config.MONGO_DB_NAME]
+
+    async def close(self):
+        await self.driver.close()
+        self.mongo_client.close()
+
+# ------------------------ REGISTRO DE CONEXÕES ------------------------
+
+_database = None
+_lock = threading.Lock()
+
+def obter_database_async() -> AsyncDatabase:
+    """Retorna o AsyncDatabase compartilhado pelo processo, criando-o no primeiro uso"""
+    global _database
+    with _lock:
+        if _database is None:
+            _database = AsyncDatabase(config.NEO4J_URI, config.NEO4J_USERNAME, config.NEO4J_PASSWORD, config.MONGO_URI)
+        return _database
+
+async def fechar_database_async():
+    """Fecha o driver assíncrono do Neo4j e o cliente do Motor compartilhados"""
+    global _database
+    with _lock:
+        database, _database = _database, None
+    if database is not None:
+        await database.close()
@@ -0,0 +1,325 @@
+"""Escrita adiada (write-behind) no MongoDB.
+
+O Database envolve o banco do MongoDB com MongoEscritaAdiada. Desligada, as
+coleções repassam tudo à coleção original. Ligada, as escritas cujo resultado
+os DAOs não usam (insert_one, insert_many, replace_one, update_one,
+update_many, delete_one, delete_many) entram numa fila por coleção e são
+gravadas juntas com um único bulk_write ordenado quando:
+
+- a fila chega a ESCRITA_ADIADA_TAMANHO_LOTE operações;
+- a thread de fundo encontra operações esperando há ESCRITA_ADIADA_INTERVALO segundos;
+- um DAO é fechado (liberar_database), a escrita adiada é desligada ou o
+  processo termina (fechar_database, registrado no atexit).
+
+Leituras veem as próprias escritas: uma leitura só por identificacao
+(igualdade ou $in) de entidades sem escrita pendente vai direto ao banco;
+qualquer outra leitura da coleção grava a fila antes. Escritas que precisam da
+resposta na hora (contagens, DuplicateKeyError) usam escrita_imediata(), e
+insert_many(ordered=False) não entra na fila, para não perder a semântica não
+ordenada.
+Erros de uma gravação adiada aparecem em quem disparou a gravação, ou em
+estatisticas_escrita_adiada() quando ela foi feita pela thread de fundo.
+"""
+import copy
+import threading
+import time
+from typing import Dict, List, Optional, Set
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+import config.config as config
+
+_habilitada = config.ESCRITA_ADIADA
+_TODAS = None  # operação ou leitura que não se restringe a certas identificacoes
+
+def _identificacoes_do_filtro(filtro: Optional[dict]) -> Optional[Set[str]]:
+    """Identificacoes a que o filtro se restringe, ou None se ele puder alcançar qualquer documento"""
+    valor = (filtro or {}).get("identificacao")
+    if isinstance(valor, str):
+        return {valor}
+    if isinstance(valor, dict) and set(valor) == {"$in"}:
+        return set(valor["$in"])
+    return _TODAS
+
+def _identificacoes_dos_documentos(documentos: List[dict]) -> Optional[Set[str]]:
+    identificacoes = {documento.get("identificacao") for documento in documentos}
+    return _TODAS if None in identificacoes else identificacoes
+
+class ColecaoEscritaAdiada:
+    """Coleção do MongoDB com a fila de escritas adiadas"""
+    def __init__(self, colecao):
+        self._colecao = colecao
+        self._operacoes: list = []
+        self._pendentes: Set[str] = set()
+        self._indeterminada = False
+        self._desde: Optional[float] = None
+        self._lock = threading.RLock()
+        self.enfileiradas = 0
+        self.gravadas = 0
+        self.descargas = 0
+
+    # ------------------------ ESCRITAS ------------------------
+
+    def _enfileirar(self, operacoes: list, identificacoes: Optional[Set[str]]):
+        if not operacoes:
+            return
+        _garantir_gravacao_periodica()
+        with self._lock:
+            if not self._operacoes:
+                self._desde = time.monotonic()
+            self._operacoes.extend(operacoes)
+            self.enfileiradas += len(operacoes)
+            if identificacoes is _TODAS:
+                self._indeterminada = True
+            else:
+                self._pendentes |= identificacoes
+            if len(self._operacoes) >= config.ESCRITA_ADIADA_TAMANHO_LOTE:
+                self.descarregar()
+
+    def insert_one(self, documento: dict, **kwargs):
+        if not _habilitada:
+            return self._colecao.insert_one(documento, **kwargs)
+        documento = copy.copy(documento)
+        self._enfileirar([InsertOne(documento)], _identificacoes_dos_documentos([documento]))
+
+    def insert_many(self, documentos: List[dict], ordered: bool = True, **kwargs):
+        if not _habilitada:
+            return self._colecao.insert_many(documentos, ordered=ordered, **kwargs)
+        if not ordered:
+            # A fila é gravada com um bulk_write ordenado, que pararia no primeiro documento recusado:
+            # o insert não ordenado vai direto, depois da fila
+            return self.imediata().insert_many(documentos, ordered=False, **kwargs)
+        documentos = [copy.copy(documento) for documento in documentos]
+        self._enfileirar([InsertOne(documento) for documento in documentos], _identificacoes_dos_documentos(documentos))
+
+    def replace_one(self, filtro: dict, documento: dict, upsert: bool = False, **kwargs):
+        if not _habilitada:
+            return self._colecao.replace_one(filtro, documento, upsert=upsert, **kwargs)
+        self._enfileirar([ReplaceOne(filtro, copy.copy(documento), upsert=upsert)], _identificacoes_do_filtro(filtro))
+
+    def update_one(self, filtro: dict, alteracao: dict, upsert: bool = False, **kwargs):
+        if not _habilitada:
+            return self._colecao.update_one(filtro, alteracao, upsert=upsert, **kwargs)
+        self._enfileirar([UpdateOne(filtro, alteracao, upsert=upsert)], _identificacoes_do_filtro(filtro))
+
+    def update_many(self, filtro: dict, alteracao: dict, upsert: bool = False, **kwargs):
+        if not _habilitada:
+            return self._colecao.update_many(filtro, alteracao, upsert=upsert, **kwargs)
+        self._enfileirar([UpdateMany(filtro, alteracao, upsert=upsert)], _identificacoes_do_filtro(filtro))
+
+    def delete_one(self, filtro: dict, **kwargs):
+        if not _habilitada:
+            return self._colecao.delete_one(filtro, **kwargs)
+        self._enfileirar([DeleteOne(filtro)], _identificacoes_do_filtro(filtro))
+
+    def delete_many(self, filtro: dict, **kwargs):
+        if not _habilitada:
+            return self._colecao.delete_many(filtro, **kwargs)
+        self._enfileirar([DeleteMany(filtro)], _identificacoes_do_filtro(filtro))
+
+    def descarregar(self) -> int:
+        """Grava a fila com um bulk_write ordenado. Se uma operação falhar, as anteriores ficam gravadas,
+        ela é descartada, as seguintes voltam para a fila e o erro é repassado. Retorna quantas foram gravadas"""
+        with self._lock:
+            if not self._operacoes:
+                return 0
+            operacoes = self._operacoes
+            self._operacoes, self._pendentes, self._indeterminada, self._desde = [], set(), False, None
+            try:
+                self._colecao.bulk_write(operacoes, ordered=True)
+            except BulkWriteError as e:
+                erros = e.details.get("writeErrors") or [{"index": len(operacoes)}]
+                falha = erros[0]["index"]
+                self.gravadas += falha
+                self._devolver(operacoes[falha + 1:])
+                raise
+            except Exception:
+                # Não se sabe o que foi gravado: a fila inteira é tentada de novo na próxima gravação
+                self._devolver(operacoes)
+                raise
+            self.gravadas += len(operacoes)
+            self.descargas += 1
+            return len(operacoes)
+
+    def _devolver(self, operacoes: list):
+        if operacoes:
+            self._operacoes = operacoes + self._operacoes
+            self._indeterminada = True
+            self._desde = time.monotonic()
+
+    @property
+    def pendentes(self) -> int:
+        return len(self._operacoes)
+
+    def esperando_desde(self) -> Optional[float]:
+        return self._desde
+
+    def imediata(self):
+        """A coleção original, depois de gravar a fila, para escritas cujo resultado é usado na hora"""
+        self.descarregar()
+        return self._colecao
+
+    # ------------------------ LEITURAS ------------------------
+
+    def _antes_de_ler(self, filtro: Optional[dict]):
+        """Grava a fila se a leitura puder alcançar um documento com escrita pendente"""
+        if not self._operacoes:
+            return
+        with self._lock:
+            identificacoes = _identificacoes_do_filtro(filtro)
+            if self._indeterminada or identificacoes is _TODAS or identificacoes & self._pendentes:
+                self.descarregar()
+
+    def _ler(self, metodo: str, args, kwargs):
+        self._antes_de_ler(args[0] if args else kwargs.get("filter"))
+        return getattr(self._colecao, metodo)(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return self._ler("find", args, kwargs)
+
+    def find_one(self, *args, **kwargs):
+        return self._ler("find_one", args, kwargs)
+
+    def count_documents(self, *args, **kwargs):
+        return self._ler("count_documents", args, kwargs)
+
+    def find_one_and_update(self, *args, **kwargs):
+        return self._ler("find_one_and_update", args, kwargs)
+
+    def find_one_and_replace(self, *args, **kwargs):
+        return self._ler("find_one_and_replace", args, kwargs)
+
+    def find_one_and_delete(self, *args, **kwargs):
+        return self._ler("find_one_and_delete", args, kwargs)
+
+    def __getattr__(self, nome):
+        # aggregate, distinct, create_index, drop, ...: podem depender de qualquer documento
+        self.descarregar()
+        return getattr(self._colecao, nome)
+
+class MongoEscritaAdiada:
+    """Envolve o banco do MongoDB, devolvendo as coleções com a fila de escritas adiadas"""
+    def __init__(self, mongo_db):
+        self._mongo_db = mongo_db
+        self._colecoes: Dict[str, ColecaoEscritaAdiada] = {}
+        self._lock = threading.Lock()
+        self.erros_em_segundo_plano = 0
+        self.ultimo_erro: Optional[str] = None
+        _registrar_banco(self)
+
+    def __getitem__(self, nome: str) -> ColecaoEscritaAdiada:
+        colecao = self._colecoes.get(nome)
+        if colecao is None:
+            with self._lock:
+                colecao = self._colecoes.get(nome)
+                if colecao is None:
+                    colecao = self._colecoes[nome] = ColecaoEscritaAdiada(self._mongo_db[nome])
+        return colecao
+
+    def descarregar(self, esperando_ha: float = 0.0) -> int:
+        """Grava as filas de todas as coleções (só as que esperam há esperando_ha segundos ou mais).
+        Todas são tentadas; o primeiro erro é repassado no fim"""
+        agora = time.monotonic()
+        gravadas, erro = 0, None
+        for colecao in list(self._colecoes.values()):
+            desde = colecao.esperando_desde()
+            if desde is None or agora - desde < esperando_ha:
+                continue
+            try:
+                gravadas += colecao.descarregar()
+            except Exception as e:
+                erro = erro or e
+        if erro is not None:
+            raise erro
+        return gravadas
+
+    def estatisticas(self) -> Dict[str, dict]:
+        return {nome: {"pendentes": colecao.pendentes, "enfileiradas": colecao.enfileiradas,
+                       "gravadas": colecao.gravadas, "descargas": colecao.descargas}
+                for nome, colecao in sorted(self._colecoes.items())}
+
+    def __getattr__(self, nome):
+        return getattr(self._mongo_db, nome)
+
+def escrita_imediata(colecao):
+    """A coleção para uma escrita cujo resultado é usado na hora (matched_count, DuplicateKeyError):
+    grava antes as escritas adiadas dela, para manter a ordem"""
+    if isinstance(colecao, ColecaoEscritaAdiada):
+        return colecao.imediata()
+    return colecao
+
+# ------------------------ GRAVAÇÃO POR TEMPO ------------------------
+
+_bancos: List[MongoEscritaAdiada] = []
+_lock_bancos = threading.Lock()
+# Cada thread de fundo tem o seu evento de parada: uma thread que ainda está terminando depois de a
+# escrita adiada ser desligada não impede que outra comece quando ela for religada
+_parar: Optional[threading.Event] = None
+_thread: Optional[threading.Thread] = None
+
+def _registrar_banco(banco: MongoEscritaAdiada):
+    with _lock_bancos:
+        _bancos.append(banco)
+
+def _gravar_periodicamente(parar: threading.Event):
+    while not parar.wait(min(config.ESCRITA_ADIADA_INTERVALO / 2, 1.0)):
+        with _lock_bancos:
+            bancos = list(_bancos)
+        for banco in bancos:
+            try:
+                banco.descarregar(esperando_ha=config.ESCRITA_ADIADA_INTERVALO)
+            except Exception as e:
+                # As operações seguintes à que falhou continuam na fila para a próxima rodada
+                banco.erros_em_segundo_plano += 1
+                banco.ultimo_erro = str(e)
+
+def _garantir_gravacao_periodica():
+    global _thread, _parar
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock_bancos:
+        if _thread is None or not _thread.is_alive():
+            _parar = threading.Event()
+            _thread = threading.Thread(target=_gravar_periodicamente, args=(_parar,), name="escrita-adiada", daemon=True)
+            _thread.start()
+
+def _parar_gravacao_periodica():
+    global _thread, _parar
+    with _lock_bancos:
+        if _parar is not None:
+            _parar.set()
+        _thread, _parar = None, None
+
+def habilitar_escrita_adiada(habilitada: bool = True):
+    """Liga ou desliga a escrita adiada; ao desligar, grava o que estava na fila"""
+    global _habilitada
+    _habilitada = habilitada
+    if not habilitada:
+        _parar_gravacao_periodica()
+        descarregar_escritas()
+
+def escrita_adiada_habilitada() -> bool:
+    return _habilitada
+
+def descarregar_escritas() -> int:
+    """Grava as escritas adiadas de todos os bancos do processo"""
+    with _lock_bancos:
+        bancos = list(_bancos)
+    return sum(banco.descarregar() for banco in bancos)
+
+def esquecer_banco(banco: MongoEscritaAdiada):
+    """Tira um banco fechado da gravação por tempo"""
+    with _lock_bancos:
+        if banco in _bancos:
+            _bancos.remove(banco)
+
+def estatisticas_escrita_adiada() -> dict:
+    with _lock_bancos:
+        bancos = list(_bancos)
+    return {
+        "habilitada": _habilitada,
+        "tamanho_lote": config.ESCRITA_ADIADA_TAMANHO_LOTE,
+        "intervalo_segundos": config.ESCRITA_ADIADA_INTERVALO,
+        "erros_em_segundo_plano": sum(banco.erros_em_segundo_plano for banco in bancos),
+        "ultimo_erro": next((banco.ultimo_erro for banco in reversed(bancos) if banco.ultimo_erro), None),
+        "colecoes": {nome: valores for banco in bancos for nome, valores in banco.estatisticas().items()},
+    }
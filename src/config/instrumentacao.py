@@ -0,0 +1,377 @@
+"""Instrumentação das chamadas ao Neo4j e ao MongoDB.
+
+O Database envolve o driver do Neo4j e o banco do MongoDB com as classes
+abaixo, que também só criam o driver/cliente no primeiro uso (a criação fica
+com quem as constrói). Com a instrumentação desligada elas repassam as chamadas direto ao
+objeto original (sessões e coleções não são envolvidas), então o custo é uma
+verificação de flag. Ligada, cada transação/consulta do Neo4j e cada chamada a
+uma coleção do MongoDB é contada e cronometrada por método do DAO e por banco,
+com um histograma de latência.
+
+O método do DAO é o método público mais externo em execução, marcado com
+@instrumentado ou @instrumentar_dao. Chamadas fora de um DAO ficam com o nome
+da função da transação (Neo4j) ou da coleção (MongoDB).
+"""
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+import config.config as config
+
+# Limites superiores (ms) das faixas do histograma; a última faixa é "acima de 2500 ms"
+FAIXAS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_habilitada = config.INSTRUMENTACAO_HABILITADA
+_FIM = object()
+_metodo_atual: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("metodo_atual", default=None)
+
+class Registro:
+    """Contagem, tempo total e histograma de latência de um método em um banco"""
+    def __init__(self):
+        self.chamadas = 0
+        self.consultas = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+        self.histograma = [0] * (len(FAIXAS_MS) + 1)
+
+    def registrar(self, segundos: float, consultas: int):
+        self.chamadas += 1
+        self.consultas += consultas
+        self.segundos += segundos
+        self.maximo = max(self.maximo, segundos)
+        ms = segundos * 1000
+        for faixa, limite in enumerate(FAIXAS_MS):
+            if ms <= limite:
+                break
+        else:
+            faixa = len(FAIXAS_MS)
+        self.histograma[faixa] += 1
+
+    def percentil_ms(self, p: float) -> Optional[float]:
+        """Limite superior da faixa do histograma onde cai o percentil (None se acima da última faixa)"""
+        alvo = p / 100 * self.chamadas
+        acumulado = 0
+        for faixa, quantidade in enumerate(self.histograma):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                return FAIXAS_MS[faixa] if faixa < len(FAIXAS_MS) else None
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "chamadas": self.chamadas,
+            "consultas": self.consultas,
+            "total_ms": self.segundos * 1000,
+            "media_ms": self.segundos * 1000 / self.chamadas if self.chamadas else 0.0,
+            "max_ms": self.maximo * 1000,
+            "p50_ate_ms": self.percentil_ms(50),
+            "p95_ate_ms": self.percentil_ms(95),
+            "histograma": {
+                (f"<={limite}" if faixa < len(FAIXAS_MS) else f">{FAIXAS_MS[-1]}"): quantidade
+                for faixa, (limite, quantidade) in enumerate(zip(FAIXAS_MS + (None,), self.histograma))
+            },
+        }
+
+_registros: Dict[Tuple[str, str], Registro] = {}
+_lock = threading.Lock()
+
+def _registrar(metodo: str, banco: str, segundos: float, consultas: int = 1):
+    with _lock:
+        registro = _registros.get((metodo, banco))
+        if registro is None:
+            registro = _registros[(metodo, banco)] = Registro()
+        registro.registrar(segundos, consultas)
+
+def habilitar_instrumentacao(habilitada: bool = True):
+    global _habilitada
+    _habilitada = habilitada
+
+def instrumentacao_habilitada() -> bool:
+    return _habilitada
+
+def zerar_instrumentacao():
+    with _lock:
+        _registros.clear()
+
+def estatisticas_instrumentacao() -> Dict[str, Dict[str, dict]]:
+    """Retorna {método: {banco: estatísticas}}; o banco "dao" é o tempo total do método do DAO"""
+    with _lock:
+        estatisticas: Dict[str, Dict[str, dict]] = {}
+        for (metodo, banco), registro in sorted(_registros.items()):
+            estatisticas.setdefault(metodo, {})[banco] = registro.to_dict()
+        return estatisticas
+
+def totais_por_banco() -> Dict[str, dict]:
+    """Soma os registros de cada banco, sem o tempo dos métodos dos DAOs"""
+    totais: Dict[str, Registro] = {}
+    with _lock:
+        for (_, banco), registro in _registros.items():
+            if banco == "dao":
+                continue
+            total = totais.setdefault(banco, Registro())
+            total.chamadas += registro.chamadas
+            total.consultas += registro.consultas
+            total.segundos += registro.segundos
+            total.maximo = max(total.maximo, registro.maximo)
+            total.histograma = [a + b for a, b in zip(total.histograma, registro.histograma)]
+    return {banco: total.to_dict() for banco, total in sorted(totais.items())}
+
+def exportar_instrumentacao(caminho: str):
+    """Grava as estatísticas em JSON"""
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({
+            "habilitada": _habilitada,
+            "faixas_ms": FAIXAS_MS,
+            "por_banco": totais_por_banco(),
+            "por_metodo": estatisticas_instrumentacao(),
+        }, f, ensure_ascii=False, indent=2)
+
+# ------------------------ MÉTODOS DOS DAOS ------------------------
+
+def instrumentado(nome: str):
+    """Decora um método para que as chamadas aos bancos feitas dentro dele sejam atribuídas a nome"""
+    def decorar(metodo: Callable):
+        if inspect.isgeneratorfunction(metodo):
+            return _instrumentar_gerador(nome, metodo)
+
+        @functools.wraps(metodo)
+        def envolvido(*args, **kwargs):
+            if not _habilitada or _metodo_atual.get() is not None:
+                return metodo(*args, **kwargs)
+            token = _metodo_atual.set(nome)
+            inicio = time.perf_counter()
+            try:
+                return metodo(*args, **kwargs)
+            finally:
+                _registrar(nome, "dao", time.perf_counter() - inicio, 0)
+                _metodo_atual.reset(token)
+        return envolvido
+    return decorar
+
+def _instrumentar_gerador(nome: str, metodo: Callable):
+    """O corpo de um gerador roda a cada next(); o método é marcado durante cada avanço
+    e o tempo somado é registrado uma vez, ao final da iteração"""
+    @functools.wraps(metodo)
+    def envolvido(*args, **kwargs):
+        gerador = metodo(*args, **kwargs)
+        segundos = 0.0
+        instrumentar = _habilitada and _metodo_atual.get() is None
+        try:
+            while True:
+                if not instrumentar:
+                    item = next(gerador, _FIM)
+                else:
+                    token = _metodo_atual.set(nome)
+                    inicio = time.perf_counter()
+                    try:
+                        item = next(gerador, _FIM)
+                    finally:
+                        segundos += time.perf_counter() - inicio
+                        _metodo_atual.reset(token)
+                if item is _FIM:
+                    return
+                yield item
+        finally:
+            gerador.close()
+            if instrumentar:
+                _registrar(nome, "dao", segundos, 0)
+    return envolvido
+
+def instrumentar_dao(cls):
+    """Aplica @instrumentado a todos os métodos públicos do DAO, com o nome Classe.metodo"""
+    for nome, atributo in list(vars(cls).items()):
+        if nome.startswith("_") or not inspect.isfunction(atributo) or nome == "close":
+            continue
+        setattr(cls, nome, instrumentado(f"{cls.__name__}.{nome}")(atributo))
+    return cls
+
+# ------------------------ NEO4J ------------------------
+
+class _TransacaoInstrumentada:
+    def __init__(self, tx):
+        self._tx = tx
+        self.consultas = 0
+
+    def run(self, *args, **kwargs):
+        self.consultas += 1
+        return self._tx.run(*args, **kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self._tx, nome)
+
+class _SessaoInstrumentada:
+    def __init__(self, sessao):
+        self._sessao = sessao
+
+    def __enter__(self):
+        self._sessao.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self._sessao.__exit__(*args)
+
+    def _executar(self, executar, funcao, *args, **kwargs):
+        transacoes = []
+
+        def funcao_instrumentada(tx, *a, **k):
+            transacao = _TransacaoInstrumentada(tx)
+            transacoes.append(transacao)
+            return funcao(transacao, *a, **k)
+
+        inicio = time.perf_counter()
+        try:
+            return executar(funcao_instrumentada, *args, **kwargs)
+        finally:
+            # Uma transação repetida pelo driver conta as consultas de todas as tentativas
+            _registrar(_metodo_atual.get() or getattr(funcao, "__qualname__", "transacao"), "neo4j",
+                       time.perf_counter() - inicio, sum(transacao.consultas for transacao in transacoes))
+
+    def execute_read(self, funcao, *args, **kwargs):
+        return self._executar(self._sessao.execute_read, funcao, *args, **kwargs)
+
+    def execute_write(self, funcao, *args, **kwargs):
+        return self._executar(self._sessao.execute_write, funcao, *args, **kwargs)
+
+    def run(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._sessao.run(*args, **kwargs)
+        finally:
+            _registrar(_metodo_atual.get() or "session.run", "neo4j", time.perf_counter() - inicio)
+
+    def __getattr__(self, nome):
+        return getattr(self._sessao, nome)
+
+class _Preguicoso:
+    """Cria o objeto envolvido na primeira vez que ele é usado e então chama ao_conectar(self).
+    O objeto só é publicado depois que ao_conectar termina; se ele falhar, a próxima chamada tenta de novo"""
+    def __init__(self, criar: Callable, ao_conectar: Optional[Callable] = None):
+        self._criar = criar
+        self._ao_conectar = ao_conectar
+        self._objeto = None
+        self._pendente = None
+        # Reentrante: ao_conectar usa o próprio envolvido (ex.: migrações abrem sessões) segurando o lock
+        self._lock_criacao = threading.RLock()
+
+    @property
+    def conectado(self) -> bool:
+        return self._objeto is not None
+
+    def _obter(self):
+        objeto = self._objeto
+        if objeto is None:
+            with self._lock_criacao:
+                if self._objeto is not None:
+                    return self._objeto
+                if self._pendente is not None:
+                    # Chamada feita de dentro de ao_conectar: usa o objeto ainda não publicado
+                    return self._pendente
+                self._pendente = self._criar()
+                try:
+                    if self._ao_conectar is not None:
+                        self._ao_conectar(self)
+                    self._objeto = objeto = self._pendente
+                finally:
+                    self._pendente = None
+        return objeto
+
+    def __getattr__(self, nome):
+        return getattr(self._obter(), nome)
+
+class DriverInstrumentado(_Preguicoso):
+    """Envolve o driver do Neo4j; as sessões só são instrumentadas com a instrumentação ligada"""
+    def session(self, **config):
+        sessao = self._obter().session(**config)
+        return _SessaoInstrumentada(sessao) if _habilitada else sessao
+
+    def close(self):
+        if self._objeto is not None:
+            self._objeto.close()
+
+# ------------------------ MONGODB ------------------------
+
+class _CursorInstrumentado:
+    """Cronometra a leitura dos lotes do cursor e registra ao esgotá-lo ou fechá-lo"""
+    def __init__(self, cursor, metodo: str, segundos: float):
+        self._cursor = cursor
+        self._metodo = metodo
+        self._segundos = segundos
+        self._registrado = False
+
+    def _registrar(self):
+        if not self._registrado:
+            self._registrado = True
+            _registrar(self._metodo, "mongo", self._segundos)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            self._registrar()
+            raise
+        finally:
+            self._segundos += time.perf_counter() - inicio
+
+    def close(self):
+        self._cursor.close()
+        self._registrar()
+
+    def __del__(self):
+        self._registrar()
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._cursor, nome)
+        if nome in ("sort", "limit", "skip", "batch_size", "hint", "collation", "max_time_ms"):
+            # Métodos encadeáveis devolvem o próprio cursor
+            @functools.wraps(atributo)
+            def encadear(*args, **kwargs):
+                self._cursor = atributo(*args, **kwargs)
+                return self
+            return encadear
+        return atributo
+
+class _ColecaoInstrumentada:
+    def __init__(self, mongo_db: "MongoInstrumentado", nome: str):
+        self._mongo_db = mongo_db
+        self._nome = nome
+        self._colecao = None
+
+    def __getattr__(self, nome):
+        if self._colecao is None:
+            self._colecao = self._mongo_db._obter()[self._nome]
+        atributo = getattr(self._colecao, nome)
+        # Todo método público da coleção é uma ida ao banco (find, bulk_write, find_one_and_delete, drop_index, ...);
+        # atributos como name e subcoleções (também chamáveis no pymongo) passam direto
+        if not _habilitada or nome.startswith("_") or not inspect.ismethod(atributo):
+            return atributo
+        metodo = _metodo_atual.get() or f"{self._colecao.name}.{nome}"
+
+        @functools.wraps(atributo)
+        def chamar(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = atributo(*args, **kwargs)
+            segundos = time.perf_counter() - inicio
+            if nome in ("find", "aggregate"):
+                return _CursorInstrumentado(resultado, metodo, segundos)
+            _registrar(metodo, "mongo", segundos)
+            return resultado
+        return chamar
+
+class MongoInstrumentado(_Preguicoso):
+    """Envolve o banco do MongoDB, devolvendo coleções instrumentadas que só conectam no primeiro uso"""
+    def __init__(self, criar: Callable, ao_conectar: Optional[Callable] = None):
+        super().__init__(criar, ao_conectar)
+        self._colecoes: Dict[str, _ColecaoInstrumentada] = {}
+
+    def __getitem__(self, nome: str) -> _ColecaoInstrumentada:
+        colecao = self._colecoes.get(nome)
+        if colecao is None:
+            colecao = self._colecoes[nome] = _ColecaoInstrumentada(self, nome)
+        return colecao
@@ -0,0 +1,46 @@
+from typing import List
+
+# Migrações do Neo4j em ordem de versão. Cada comando roda em sua própria
+# transação, pois o Neo4j não mistura alterações de schema com escrita de dados.
+MIGRACOES = [
+    (1, "Unicidade de identificacao em :Carro, :Cliente, :Concessionaria e versão em :Migracao", [
+        "CREATE CONSTRAINT migracao_versao IF NOT EXISTS FOR (m:Migracao) REQUIRE m.versao IS UNIQUE",
+        "CREATE CONSTRAINT carro_identificacao IF NOT EXISTS FOR (c:Carro) REQUIRE c.identificacao IS UNIQUE",
+        "CREATE CONSTRAINT cliente_identificacao IF NOT EXISTS FOR (c:Cliente) REQUIRE c.identificacao IS UNIQUE",
+        "CREATE CONSTRAINT concessionaria_identificacao IF NOT EXISTS FOR (c:Concessionaria) REQUIRE c.identificacao IS UNIQUE",
+    ]),
+    (2, "Índice de chave_modelo em :Carro, usado nas recomendações", [
+        "CREATE INDEX carro_chave_modelo IF NOT EXISTS FOR (c:Carro) ON (c.chave_modelo)",
+    ]),
+]
+
+def versao_atual(driver) -> int:
+    """Retorna a última versão de migração registrada no Neo4j"""
+    with driver.session() as session:
+        record = session.run("MATCH (m:Migracao) RETURN max(m.versao) as versao").single()
+        return record["versao"] or 0
+
+def aplicar_migracoes(driver) -> List[int]:
+    """Aplica as migrações pendentes em ordem e retorna as versões aplicadas"""
+    aplicadas = []
+    versao = versao_atual(driver)
+    with driver.session() as session:
+        for numero, descricao, comandos in MIGRACOES:
+            if numero <= versao:
+                continue
+            for comando in comandos:
+                session.run(comando).consume()
+            session.run(
+                "MERGE (m:Migracao {versao: $versao}) SET m.descricao = $descricao, m.aplicada_em = datetime()",
+                versao=numero, descricao=descricao
+            ).consume()
+            aplicadas.append(numero)
+    return aplicadas
+
+def listar_migracoes(driver) -> List[dict]:
+    """Retorna o log de migrações aplicadas"""
+    with driver.session() as session:
+        result = session.run(
+            "MATCH (m:Migracao) RETURN m.versao as versao, m.descricao as descricao, m.aplicada_em as aplicada_em ORDER BY m.versao"
+        )
+        return [record.data() for record in result]
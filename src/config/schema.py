@@ -0,0 +1,101 @@
+from typing import List
+from pymongo import ASCENDING, TEXT
+
+# Colação usada nas buscas por nome, modelo e fabricante sem diferenciar maiúsculas
+COLACAO_SEM_CAIXA = {"locale": "pt", "strength": 2}
+
+# Índices de cada coleção: nome -> (chaves, opções)
+INDICES_MONGO = {
+    "carros": {
+        "identificacao_unico": ([("identificacao", ASCENDING)], {"unique": True}),
+        "fabricante_modelo_sem_caixa": ([("fabricante", ASCENDING), ("modelo", ASCENDING)], {"collation": COLACAO_SEM_CAIXA}),
+        "modelo": ([("modelo", ASCENDING)], {"collation": COLACAO_SEM_CAIXA}),
+        "ano": ([("ano", ASCENDING)], {}),
+        "situacao": ([("situacao", ASCENDING)], {}),
+        # Palavras do modelo e do fabricante, sem stemming ("none"): nomes de carro não são português
+        "texto_modelo_fabricante": ([("modelo", TEXT), ("fabricante", TEXT)], {"default_language": "none"}),
+    },
+    "clientes": {
+        "identificacao_unico": ([("identificacao", ASCENDING)], {"unique": True}),
+        "cpf_unico": ([("cpf", ASCENDING)], {"unique": True}),
+    },
+    "concessionarias": {
+        "identificacao_unico": ([("identificacao", ASCENDING)], {"unique": True}),
+        "nome_unico_sem_caixa": ([("nome", ASCENDING)], {"unique": True, "collation": COLACAO_SEM_CAIXA}),
+    },
+    "estoques": {
+        "identificacao_unico": ([("identificacao", ASCENDING)], {"unique": True}),
+        "carros_identificacao": ([("carros.identificacao", ASCENDING)], {}),
+    },
+    "recomendacoes": {
+        "identificacao_unico": ([("identificacao", ASCENDING)], {"unique": True}),
+    },
+}
+
+# Índices substituídos por outros de nome novo, removidos por criar_indices_mongo depois de criar os
+# atuais. O MongoDB não aceita mudar as opções de um índice mantendo o nome (IndexOptionsConflict)
+INDICES_MONGO_REMOVIDOS = {
+    "carros": ["fabricante_modelo"],  # sem colação; agora fabricante_modelo_sem_caixa
+    "concessionarias": ["nome_unico"],  # sem colação; agora nome_unico_sem_caixa
+}
+
+# Campos lidos de cada coleção: "completo" traz o documento sem o _id, "resumo" só o que as
+# listagens mostram e "existencia" só a identificacao (para checar se existe ou obter o id)
+PROJECOES = {
+    "carros": {
+        "completo": {"_id": 0},
+        "resumo": {"_id": 0, "identificacao": 1, "modelo": 1, "fabricante": 1, "ano": 1, "crlv": 1},
+        "existencia": {"_id": 0, "identificacao": 1},
+    },
+    "clientes": {
+        "completo": {"_id": 0},
+        "resumo": {"_id": 0, "identificacao": 1, "cpf": 1, "nome": 1},
+        "existencia": {"_id": 0, "identificacao": 1},
+    },
+    "concessionarias": {
+        "completo": {"_id": 0},
+        "resumo": {"_id": 0, "identificacao": 1, "nome": 1},
+        "existencia": {"_id": 0, "identificacao": 1},
+    },
+    "estoques": {
+        "completo": {"_id": 0},
+        "resumo": {"_id": 0, "identificacao": 1, "total": 1, "por_fabricante": 1, "por_ano": 1},
+        "existencia": {"_id": 0, "identificacao": 1},
+    },
+    "recomendacoes": {
+        "completo": {"_id": 0},
+        "resumo": {"_id": 0, "identificacao": 1, "carros": 1},
+        "existencia": {"_id": 0, "identificacao": 1},
+    },
+}
+
+def projecao(colecao: str, campos: str = "completo") -> dict:
+    """Retorna a projeção do conjunto de campos da coleção"""
+    try:
+        return PROJECOES[colecao][campos]
+    except KeyError:
+        raise ValueError(f"Conjunto de campos desconhecido para {colecao}: {campos}. Use {', '.join(PROJECOES[colecao])}")
+
+def criar_indices_mongo(mongo_db):
+    """Cria os índices das coleções e remove os substituídos; pode ser executado a cada inicialização"""
+    for colecao, indices in INDICES_MONGO.items():
+        for nome, (chaves, opcoes) in indices.items():
+            mongo_db[colecao].create_index(chaves, name=nome, **opcoes)
+    for colecao, nomes in INDICES_MONGO_REMOVIDOS.items():
+        existentes = mongo_db[colecao].index_information()
+        for nome in nomes:
+            if nome in existentes:
+                mongo_db[colecao].drop_index(nome)
+
+def estatisticas_indices_mongo(mongo_db) -> List[dict]:
+    """Retorna quantas vezes cada índice foi usado desde que o servidor iniciou"""
+    estatisticas = []
+    for colecao in INDICES_MONGO:
+        for indice in mongo_db[colecao].aggregate([{"$indexStats": {}}]):
+            estatisticas.append({
+                "colecao": colecao,
+                "indice": indice["name"],
+                "acessos": indice["accesses"]["ops"],
+                "desde": indice["accesses"]["since"],
+            })
+    return estatisticas
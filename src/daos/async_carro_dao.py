@@ -0,0 +1,215 @@
+from typing import AsyncIterator, List, Optional, Tuple
+from models.carro import Carro
+import uuid
+from config.config import MONGO_TAMANHO_LOTE
+from config.database_async import obter_database_async
+from config.schema import COLACAO_SEM_CAIXA, projecao
+from daos.hidratacao import buscar_documentos_em_lotes_async, paginar_documentos_async
+from daos.lote import criar_em_lote_async
+from daos.cache import obter_cache
+from daos.carro_dao import TAMANHO_PAGINA_PESQUISA, consulta_pesquisa
+from daos.recomendacao_dao import propriedades_do_carro
+from daos.estoque import SITUACAO_ESTOQUE, SITUACAO_VENDIDO, alteracao_adicionar, alteracao_remover, resumo_do_carro
+
+class AsyncCarroDAO:
+    """Versão assíncrona do CarroDAO, com os mesmos nomes de métodos"""
+    def __init__(self, database=None):
+        self.database = database or obter_database_async()
+        self.driver = self.database.driver
+        self.mongo_collection = self.database.mongo_db["carros"]
+        self.estoque_collection = self.database.mongo_db["estoques"]
+        self.identificacoes_sem_documento = []
+        self.cache = obter_cache("carros")
+        self.cache_concessionaria_do_carro = obter_cache("concessionaria_do_carro")
+
+    def close(self):
+        """As conexões pertencem ao AsyncDatabase compartilhado; veja fechar_database_async"""
+        self.database = None
+
+    async def criar_carro(self, carro: Carro) -> str:
+        """Cria um novo carro no Neo4j e MongoDB, retorna sua identificacao"""
+        identificacao = str(uuid.uuid4())
+        carro_data = carro.to_dict()
+        carro_data["identificacao"] = identificacao
+        async with self.driver.session() as session:
+            await session.execute_write(self._criar_carro, identificacao, propriedades_do_carro(carro_data))
+        await self.mongo_collection.insert_one(carro_data)
+        return identificacao
+
+    async def _criar_carro(self, tx, identificacao: str, propriedades: dict):
+        query = "CREATE (c:Carro {identificacao: $identificacao}) SET c += $propriedades"
+        await tx.run(query, identificacao=identificacao, propriedades=propriedades)
+
+    async def criar_carros_em_lote(self, carros: List[Carro]) -> List[str]:
+        """Cria vários carros com uma instrução no Neo4j e um insert_many no MongoDB.
+        Retorna as identificacoes dos que foram criados"""
+        documentos = [carro.to_dict() for carro in carros]
+        return await criar_em_lote_async(self.driver, self.mongo_collection, "Carro", documentos, propriedades_do_carro)
+
+    async def buscar_carro(self, identificacao: str) -> Optional[Carro]:
+        """Busca um carro pela identificacao, passando pelo cache"""
+        return await self.cache.obter_ou_carregar_async(identificacao, lambda: self._carregar_carro(identificacao))
+
+    async def _carregar_carro(self, identificacao: str) -> Optional[Carro]:
+        async with self.driver.session() as session:
+            existe = await session.execute_read(self._buscar_carro, identificacao)
+        if existe:
+            mongo_data = await self.mongo_collection.find_one({"identificacao": identificacao}, projecao("carros"))
+            if mongo_data:
+                return Carro.from_dict(mongo_data)
+        return None
+
+    async def _buscar_carro(self, tx, identificacao: str) -> bool:
+        query = "MATCH (c:Carro) WHERE c.identificacao = $identificacao RETURN c.identificacao as identificacao"
+        result = await tx.run(query, identificacao=identificacao)
+        return await result.single() is not None
+
+    async def buscar_carros_por_modelo(self, modelo: str, fabricante: str, limite: int = 0, campos: str = "completo") -> List[Carro]:
+        """Busca os carros de um modelo e fabricante, sem diferenciar maiúsculas"""
+        cursor = self.mongo_collection.find(
+            {"fabricante": fabricante, "modelo": modelo}, projecao("carros", campos), collation=COLACAO_SEM_CAIXA, limit=limite
+        )
+        return Carro.from_documentos(await cursor.to_list(length=None))
+
+    async def pesquisar_carros(self, texto: Optional[str] = None, modelo: Optional[str] = None, fabricante: Optional[str] = None,
+                               ano_minimo: Optional[int] = None, ano_maximo: Optional[int] = None, disponibilidade: Optional[str] = None,
+                               exato: bool = False, pagina: int = 1, tamanho_pagina: int = TAMANHO_PAGINA_PESQUISA,
+                               campos: str = "resumo") -> List[Carro]:
+        """Mesma pesquisa de CarroDAO.pesquisar_carros"""
+        filtro, projecao_pesquisa, opcoes = consulta_pesquisa(texto, modelo, fabricante, ano_minimo, ano_maximo,
+                                                              disponibilidade, exato, campos)
+        cursor = self.mongo_collection.find(filtro, projecao_pesquisa, skip=(max(pagina, 1) - 1) * tamanho_pagina,
+                                            limit=tamanho_pagina, **opcoes)
+        return Carro.from_documentos(await cursor.to_list(length=None))
+
+    async def reconstruir_situacoes(self) -> int:
+        """Recalcula a situação gravada em cada carro a partir das relações OFERECE e POSSUI do Neo4j.
+        Retorna quantos carros estão em estoque ou vendidos"""
+        async with self.driver.session() as session:
+            situacoes = await session.execute_read(self._buscar_situacoes)
+        await self.mongo_collection.update_many({"situacao": {"$exists": True}}, {"$unset": {"situacao": ""}})
+        for situacao in (SITUACAO_ESTOQUE, SITUACAO_VENDIDO):
+            identificacoes = [identificacao for identificacao, atual in situacoes if atual == situacao]
+            if identificacoes:
+                await self.mongo_collection.update_many({"identificacao": {"$in": identificacoes}}, {"$set": {"situacao": situacao}})
+        return len(situacoes)
+
+    async def _buscar_situacoes(self, tx) -> List[Tuple[str, str]]:
+        """Mesma consulta de CarroDAO._buscar_situacoes"""
+        query = """
+        MATCH (:Concessionaria)-[:OFERECE]->(car:Carro)
+        RETURN car.identificacao as identificacao, $estoque as situacao
+        UNION
+        MATCH (:Cliente)-[:POSSUI]->(car:Carro)
+        RETURN car.identificacao as identificacao, $vendido as situacao
+        """
+        result = await tx.run(query, estoque=SITUACAO_ESTOQUE, vendido=SITUACAO_VENDIDO)
+        return [(record["identificacao"], record["situacao"]) async for record in result]
+
+    async def sincronizar_propriedades(self, tamanho_lote: int = MONGO_TAMANHO_LOTE) -> int:
+        """Grava nos nós :Carro as propriedades derivadas do MongoDB (chave_modelo). Retorna quantos carros foram lidos"""
+        total = 0
+        lote = []
+        async with self.driver.session() as session:
+            async for documento in self.mongo_collection.find({}, projecao("carros", "resumo")).batch_size(tamanho_lote):
+                lote.append(dict(propriedades_do_carro(documento), identificacao=documento["identificacao"]))
+                if len(lote) >= tamanho_lote:
+                    await session.execute_write(self._gravar_propriedades, lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                await session.execute_write(self._gravar_propriedades, lote)
+                total += len(lote)
+        return total
+
+    async def iterar_paginas_carros(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                    campos: str = "completo") -> AsyncIterator[Tuple[List[Carro], Optional[str]]]:
+        """Percorre os carros em páginas ordenadas por identificacao (async for), cada uma com o cursor da seguinte"""
+        self.identificacoes_sem_documento = []
+        async for documentos, ausentes, proximo_cursor in paginar_documentos_async(self.driver, "Carro", self.mongo_collection, tamanho_pagina,
+                                                                                       cursor, projecao("carros", campos)):
+            self.identificacoes_sem_documento.extend(ausentes)
+            yield Carro.from_documentos(documentos), proximo_cursor
+
+    async def iterar_carros(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                            campos: str = "completo") -> AsyncIterator[Carro]:
+        """Percorre os carros um a um (async for), buscando uma página por vez"""
+        async for pagina, _ in self.iterar_paginas_carros(tamanho_pagina, cursor, campos):
+            for carro in pagina:
+                yield carro
+
+    async def buscar_todos_carros(self, tamanho_lote: Optional[int] = None, campos: str = "completo") -> List[Carro]:
+        """Retorna todos os carros do Neo4j e MongoDB, hidratando os documentos em lotes"""
+        async with self.driver.session() as session:
+            identificacoes = await session.execute_read(self._buscar_todos_carros)
+        documentos, self.identificacoes_sem_documento = await buscar_documentos_em_lotes_async(self.mongo_collection, identificacoes, tamanho_lote,
+                                                                                                   projecao("carros", campos))
+        return Carro.from_documentos(documentos)
+
+    async def _buscar_todos_carros(self, tx) -> List[str]:
+        query = "MATCH (c:Carro) RETURN c.identificacao as identificacao"
+        result = await tx.run(query)
+        return [record["identificacao"] async for record in result]
+
+    async def remover_carro(self, identificacao: str) -> bool:
+        """Remove um carro pela identificacao do Neo4j e MongoDB"""
+        async with self.driver.session() as session:
+            success = await session.execute_write(self._remover_carro, identificacao)
+        if success:
+            carro = await self.mongo_collection.find_one_and_delete({"identificacao": identificacao}, projection=projecao("carros", "resumo"))
+            if carro:
+                await self.estoque_collection.update_one(*alteracao_remover(carro))
+            self.cache.invalidar(identificacao)
+            self.cache_concessionaria_do_carro.invalidar(identificacao)
+        return success
+
+    async def _remover_carro(self, tx, identificacao: str) -> bool:
+        query = "MATCH (c:Carro) WHERE c.identificacao = $identificacao DETACH DELETE c"
+        result = await tx.run(query, identificacao=identificacao)
+        summary = await result.consume()
+        return summary.counters.nodes_deleted > 0
+
+    async def buscar_concessionaria_do_carro(self, identificacao: str) -> Optional[str]:
+        """Busca a concessionária que possui o carro, passando pelo cache"""
+        return await self.cache_concessionaria_do_carro.obter_ou_carregar_async(
+            identificacao, lambda: self._carregar_concessionaria_do_carro(identificacao), guardar_nulo=True
+        )
+
+    async def _carregar_concessionaria_do_carro(self, identificacao: str) -> Optional[str]:
+        async with self.driver.session() as session:
+            return await session.execute_read(self._buscar_concessionaria_do_carro, identificacao)
+
+    async def _buscar_concessionaria_do_carro(self, tx, identificacao: str) -> Optional[str]:
+        query = """
+        MATCH (c:Carro)<-[:OFERECE]-(conc:Concessionaria)
+        WHERE c.identificacao = $identificacao
+        RETURN conc.identificacao as identificacao
+        """
+        result = await tx.run(query, identificacao=identificacao)
+        record = await result.single()
+        return record["identificacao"] if record else None
+
+    async def atualizar_carro(self, identificacao: str, carro_update: Carro) -> bool:
+        """Atualiza os dados de um carro no MongoDB (e a chave do modelo no nó do Neo4j, se mudou)"""
+        carro_data = carro_update.to_dict()
+        carro_data["identificacao"] = identificacao
+        anterior = await self.mongo_collection.find_one_and_update({"identificacao": identificacao}, {"$set": carro_data},
+                                                                   projection=projecao("carros", "resumo"))
+        self.cache.invalidar(identificacao)
+        if anterior and resumo_do_carro(anterior) != resumo_do_carro(carro_data):
+            if propriedades_do_carro(anterior) != propriedades_do_carro(carro_data):
+                async with self.driver.session() as session:
+                    await session.execute_write(self._gravar_propriedades, [dict(propriedades_do_carro(carro_data), identificacao=identificacao)])
+            concessionaria = await self.buscar_concessionaria_do_carro(identificacao)
+            if concessionaria:
+                await self.estoque_collection.update_one(*alteracao_remover(anterior, concessionaria))
+                await self.estoque_collection.update_one(*alteracao_adicionar(concessionaria, carro_data))
+        return anterior is not None
+
+    async def _gravar_propriedades(self, tx, carros: List[dict]):
+        query = """
+        UNWIND $carros AS carro
+        MATCH (c:Carro {identificacao: carro.identificacao})
+        SET c.chave_modelo = carro.chave_modelo
+        """
+        await tx.run(query, carros=carros)
@@ -0,0 +1,280 @@
+from typing import AsyncIterator, List, Optional, Tuple
+from models.cliente import Cliente
+from models.carro import Carro
+import uuid
+from pymongo.errors import DuplicateKeyError
+from config.database_async import obter_database_async
+from daos.cliente_dao import ResultadoCompra
+from config.schema import projecao
+from daos.hidratacao import buscar_documentos_em_lotes_async, paginar_documentos_async
+from daos.lote import criar_em_lote_async
+from daos.cache import obter_cache
+from daos.estoque import SITUACAO_VENDIDO, alteracao_remover, alteracao_situacao
+
+class AsyncClienteDAO:
+    """Versão assíncrona do ClienteDAO, com os mesmos nomes de métodos"""
+    def __init__(self, database=None):
+        self.database = database or obter_database_async()
+        self.driver = self.database.driver
+        self.mongo_collection = self.database.mongo_db["clientes"]
+        self.carro_collection = self.database.mongo_db["carros"]
+        self.estoque_collection = self.database.mongo_db["estoques"]
+        self.identificacoes_sem_documento = []
+        self.cache = obter_cache("clientes")
+        self.cache_concessionaria_do_carro = obter_cache("concessionaria_do_carro")
+
+    def close(self):
+        """As conexões pertencem ao AsyncDatabase compartilhado; veja fechar_database_async"""
+        self.database = None
+
+    async def criar_cliente(self, cliente: Cliente) -> str:
+        """Cria um novo cliente no Neo4j e MongoDB, retorna sua identificacao"""
+        identificacao = str(uuid.uuid4())
+        async with self.driver.session() as session:
+            await session.execute_write(self._criar_cliente, identificacao)
+            cliente_data = cliente.to_dict()
+            cliente_data["identificacao"] = identificacao
+            try:
+                await self.mongo_collection.insert_one(cliente_data)
+            except DuplicateKeyError:
+                # Desfaz o nó criado no Neo4j para não deixar registros órfãos
+                await session.execute_write(self._remover_cliente, identificacao)
+                raise
+        return identificacao
+
+    async def _criar_cliente(self, tx, identificacao: str):
+        query = "CREATE (c:Cliente {identificacao: $identificacao})"
+        await tx.run(query, identificacao=identificacao)
+
+    async def criar_clientes_em_lote(self, clientes: List[Cliente]) -> List[str]:
+        """Cria vários clientes com uma instrução no Neo4j e um insert_many no MongoDB.
+        Retorna as identificacoes dos que foram criados"""
+        documentos = [cliente.to_dict() for cliente in clientes]
+        return await criar_em_lote_async(self.driver, self.mongo_collection, "Cliente", documentos)
+
+    async def buscar_cliente(self, identificacao: str) -> Optional[Cliente]:
+        """Busca um cliente pela identificacao, passando pelo cache"""
+        return await self.cache.obter_ou_carregar_async(identificacao, lambda: self._carregar_cliente(identificacao))
+
+    async def _carregar_cliente(self, identificacao: str) -> Optional[Cliente]:
+        async with self.driver.session() as session:
+            existe = await session.execute_read(self._buscar_cliente, identificacao)
+        if existe:
+            mongo_data = await self.mongo_collection.find_one({"identificacao": identificacao}, projecao("clientes"))
+            if mongo_data:
+                return Cliente.from_dict(mongo_data)
+        return None
+
+    async def _buscar_cliente(self, tx, identificacao: str) -> bool:
+        query = "MATCH (c:Cliente) WHERE c.identificacao = $identificacao RETURN c.identificacao as identificacao"
+        result = await tx.run(query, identificacao=identificacao)
+        return await result.single() is not None
+
+    async def buscar_cliente_por_cpf(self, cpf: str, campos: str = "completo") -> Optional[Cliente]:
+        """Busca um cliente pelo CPF usando o índice único de clientes.cpf"""
+        mongo_data = await self.mongo_collection.find_one({"cpf": cpf}, projecao("clientes", campos))
+        return Cliente.from_dict(mongo_data) if mongo_data else None
+
+    async def buscar_todos_clientes(self, tamanho_lote: Optional[int] = None, campos: str = "completo") -> List[Cliente]:
+        """Retorna todos os clientes do Neo4j e MongoDB, hidratando os documentos em lotes"""
+        async with self.driver.session() as session:
+            identificacoes = await session.execute_read(self._buscar_todos_clientes)
+        documentos, self.identificacoes_sem_documento = await buscar_documentos_em_lotes_async(self.mongo_collection, identificacoes, tamanho_lote,
+                                                                                                   projecao("clientes", campos))
+        return Cliente.from_documentos(documentos)
+
+    async def _buscar_todos_clientes(self, tx) -> List[str]:
+        query = "MATCH (c:Cliente) RETURN c.identificacao as identificacao"
+        result = await tx.run(query)
+        return [record["identificacao"] async for record in result]
+
+    async def iterar_paginas_clientes(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                      campos: str = "completo") -> AsyncIterator[Tuple[List[Cliente], Optional[str]]]:
+        """Percorre os clientes em páginas ordenadas por identificacao (async for), cada uma com o cursor da seguinte"""
+        self.identificacoes_sem_documento = []
+        async for documentos, ausentes, proximo_cursor in paginar_documentos_async(self.driver, "Cliente", self.mongo_collection, tamanho_pagina,
+                                                                                       cursor, projecao("clientes", campos)):
+            self.identificacoes_sem_documento.extend(ausentes)
+            yield Cliente.from_documentos(documentos), proximo_cursor
+
+    async def iterar_clientes(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                              campos: str = "completo") -> AsyncIterator[Cliente]:
+        """Percorre os clientes um a um (async for), buscando uma página por vez"""
+        async for pagina, _ in self.iterar_paginas_clientes(tamanho_pagina, cursor, campos):
+            for cliente in pagina:
+                yield cliente
+
+    async def buscar_clientes_com_carros(self, tamanho_lote: Optional[int] = None, campos: str = "completo",
+                                         campos_carros: str = "completo") -> List[Tuple[Cliente, List[Carro]]]:
+        """Retorna todos os clientes com os carros que possuem: uma consulta no Neo4j e leituras em lote no MongoDB"""
+        async with self.driver.session() as session:
+            registros = await session.execute_read(self._buscar_clientes_com_carros)
+        clientes_identificacoes = [identificacao for identificacao, _ in registros]
+        carros_identificacoes = [carro for _, carros in registros for carro in carros]
+        documentos, self.identificacoes_sem_documento = await buscar_documentos_em_lotes_async(self.mongo_collection, clientes_identificacoes,
+                                                                                               tamanho_lote, projecao("clientes", campos))
+        carros_documentos, _ = await buscar_documentos_em_lotes_async(self.carro_collection, carros_identificacoes, tamanho_lote,
+                                                                      projecao("carros", campos_carros))
+        carros = {carro.identificacao: carro for carro in Carro.from_documentos(carros_documentos)}
+        carros_por_cliente = dict(registros)
+        return [
+            (cliente, [carros[carro] for carro in carros_por_cliente[cliente.identificacao] if carro in carros])
+            for cliente in Cliente.from_documentos(documentos)
+        ]
+
+    async def _buscar_clientes_com_carros(self, tx) -> List[Tuple[str, List[str]]]:
+        query = """
+        MATCH (c:Cliente)
+        OPTIONAL MATCH (c)-[:POSSUI]->(car:Carro)
+        RETURN c.identificacao as identificacao, collect(car.identificacao) as carros
+        """
+        result = await tx.run(query)
+        return [(record["identificacao"], record["carros"]) async for record in result]
+
+    async def remover_cliente(self, identificacao: str) -> bool:
+        """Remove um cliente pela identificacao do Neo4j e MongoDB; os carros que ele possuía voltam a ser livres"""
+        async with self.driver.session() as session:
+            success, carros = await session.execute_write(self._remover_cliente_e_carros, identificacao)
+        if success:
+            await self.mongo_collection.delete_one({"identificacao": identificacao})
+            if carros:
+                await self.carro_collection.update_many({"identificacao": {"$in": carros}}, alteracao_situacao(None))
+            self.cache.invalidar(identificacao)
+        return success
+
+    async def _remover_cliente_e_carros(self, tx, identificacao: str) -> Tuple[bool, List[str]]:
+        carros = await self._buscar_carros_do_cliente(tx, identificacao)
+        return await self._remover_cliente(tx, identificacao), carros
+
+    async def _remover_cliente(self, tx, identificacao: str) -> bool:
+        query = "MATCH (c:Cliente) WHERE c.identificacao = $identificacao DETACH DELETE c"
+        result = await tx.run(query, identificacao=identificacao)
+        summary = await result.consume()
+        return summary.counters.nodes_deleted > 0
+
+    async def buscar_carros_do_cliente(self, identificacao: str) -> List[str]:
+        """Busca as identificacoes dos carros que o cliente possui"""
+        async with self.driver.session() as session:
+            return await session.execute_read(self._buscar_carros_do_cliente, identificacao)
+
+    async def _buscar_carros_do_cliente(self, tx, identificacao: str) -> List[str]:
+        query = """
+        MATCH (c:Cliente)-[:POSSUI]->(car:Carro)
+        WHERE c.identificacao = $identificacao
+        RETURN car.identificacao as identificacao
+        """
+        result = await tx.run(query, identificacao=identificacao)
+        return [record["identificacao"] async for record in result]
+
+    async def vincular_carro_ao_cliente(self, cliente_identificacao: str, carro_identificacao: str) -> bool:
+        """Vincula um carro a um cliente"""
+        async with self.driver.session() as session:
+            success = await session.execute_write(self._vincular_carro_ao_cliente, cliente_identificacao, carro_identificacao)
+        if success:
+            await self.carro_collection.update_one({"identificacao": carro_identificacao}, alteracao_situacao(SITUACAO_VENDIDO))
+        return success
+
+    async def _vincular_carro_ao_cliente(self, tx, cliente_identificacao: str, carro_identificacao: str) -> bool:
+        query = """
+        MATCH (c:Cliente {identificacao: $cliente_identificacao})
+        MATCH (car:Carro {identificacao: $carro_identificacao})
+        CREATE (c)-[:POSSUI]->(car)
+        """
+        result = await tx.run(query, cliente_identificacao=cliente_identificacao, carro_identificacao=carro_identificacao)
+        summary = await result.consume()
+        return summary.counters.relationships_created > 0
+
+    async def desvincular_carro_do_cliente(self, cliente_identificacao: str, carro_identificacao: str) -> bool:
+        """Remove a relação entre um cliente e um carro"""
+        async with self.driver.session() as session:
+            success = await session.execute_write(self._desvincular_carro_do_cliente, cliente_identificacao, carro_identificacao)
+        if success:
+            await self.carro_collection.update_one({"identificacao": carro_identificacao}, alteracao_situacao(None))
+        return success
+
+    async def _desvincular_carro_do_cliente(self, tx, cliente_identificacao: str, carro_identificacao: str) -> bool:
+        query = """
+        MATCH (c:Cliente)-[r:POSSUI]->(car:Carro)
+        WHERE c.identificacao = $cliente_identificacao AND car.identificacao = $carro_identificacao
+        DELETE r
+        """
+        result = await tx.run(query, cliente_identificacao=cliente_identificacao, carro_identificacao=carro_identificacao)
+        summary = await result.consume()
+        return summary.counters.relationships_deleted > 0
+
+    async def comprar_carro(self, cliente_identificacao: str, concessionaria_identificacao: str, carro_identificacao: str) -> ResultadoCompra:
+        """Transfere o carro da concessionária para o cliente em uma única transação"""
+        async with self.driver.session() as session:
+            resultado = await session.execute_write(self._comprar_carro, cliente_identificacao, concessionaria_identificacao, carro_identificacao)
+        if resultado == ResultadoCompra.SUCESSO:
+            carro = await self.carro_collection.find_one_and_update({"identificacao": carro_identificacao}, alteracao_situacao(SITUACAO_VENDIDO),
+                                                                    projection=projecao("carros", "resumo"))
+            if carro:
+                await self.estoque_collection.update_one(*alteracao_remover(carro, concessionaria_identificacao))
+            self.cache_concessionaria_do_carro.invalidar(carro_identificacao)
+        return resultado
+
+    async def _comprar_carro(self, tx, cliente_identificacao: str, concessionaria_identificacao: str, carro_identificacao: str) -> ResultadoCompra:
+        """Mesma instrução de ClienteDAO._comprar_carro"""
+        query = """
+        MATCH (car:Carro {identificacao: $carro_identificacao})
+        SET car.identificacao = car.identificacao
+        WITH car
+        MATCH (c:Cliente {identificacao: $cliente_identificacao})
+        MATCH (conc:Concessionaria {identificacao: $concessionaria_identificacao})
+        OPTIONAL MATCH (conc)-[oferta:OFERECE]->(car)
+        WITH c, car, oferta, oferta IS NOT NULL as disponivel, EXISTS { (c)-[:CADASTRADO]->(conc) } as cadastrado
+        FOREACH (_ IN CASE WHEN cadastrado AND disponivel THEN [1] ELSE [] END |
+            DELETE oferta
+            CREATE (c)-[:POSSUI]->(car)
+        )
+        RETURN cadastrado, disponivel
+        """
+        result = await tx.run(query, cliente_identificacao=cliente_identificacao,
+                              concessionaria_identificacao=concessionaria_identificacao, carro_identificacao=carro_identificacao)
+        record = await result.single()
+        if not record:
+            return ResultadoCompra.NAO_ENCONTRADO
+        if not record["cadastrado"]:
+            return ResultadoCompra.NAO_CADASTRADO
+        if not record["disponivel"]:
+            return ResultadoCompra.INDISPONIVEL
+        return ResultadoCompra.SUCESSO
+
+    async def atualizar_cliente(self, identificacao: str, cliente_update: Cliente) -> bool:
+        """Atualiza os dados de um cliente no MongoDB"""
+        cliente_data = cliente_update.to_dict()
+        cliente_data["identificacao"] = identificacao
+        result = await self.mongo_collection.replace_one({"identificacao": identificacao}, cliente_data)
+        self.cache.invalidar(identificacao)
+        return result.matched_count > 0
+
+    async def cadastrar_cliente_concessionaria(self, cliente_identificacao: str, concessionaria_identificacao: str) -> bool:
+        """Cadastra um cliente em uma concessionária"""
+        async with self.driver.session() as session:
+            return await session.execute_write(self._cadastrar_cliente_concessionaria, cliente_identificacao, concessionaria_identificacao)
+
+    async def _cadastrar_cliente_concessionaria(self, tx, cliente_identificacao: str, concessionaria_identificacao: str) -> bool:
+        query = """
+        MATCH (c:Cliente {identificacao: $cliente_identificacao})
+        MATCH (conc:Concessionaria {identificacao: $concessionaria_identificacao})
+        CREATE (c)-[:CADASTRADO]->(conc)
+        """
+        result = await tx.run(query, cliente_identificacao=cliente_identificacao, concessionaria_identificacao=concessionaria_identificacao)
+        summary = await result.consume()
+        return summary.counters.relationships_created > 0
+
+    async def verificar_cliente_concessionaria(self, cliente_identificacao: str, concessionaria_identificacao: str) -> bool:
+        """Verifica se um cliente está cadastrado em uma concessionária"""
+        async with self.driver.session() as session:
+            return await session.execute_read(self._verificar_cliente_concessionaria, cliente_identificacao, concessionaria_identificacao)
+
+    async def _verificar_cliente_concessionaria(self, tx, cliente_identificacao: str, concessionaria_identificacao: str) -> bool:
+        query = """
+        MATCH (c:Cliente)-[:CADASTRADO]->(conc:Concessionaria)
+        WHERE c.identificacao = $cliente_identificacao AND conc.identificacao = $concessionaria_identificacao
+        RETURN count(*) > 0 as existe
+        """
+        result = await tx.run(query, cliente_identificacao=cliente_identificacao, concessionaria_identificacao=concessionaria_identificacao)
+        record = await result.single()
+        return record["existe"] if record else False
@@ -0,0 +1,275 @@
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from models.concessionaria import Concessionaria
+from models.carro import Carro
+import uuid
+from config.config import CARROS_POR_CONCESSIONARIA
+from config.database_async import obter_database_async
+from config.schema import COLACAO_SEM_CAIXA, projecao
+from daos.concessionaria_dao import consulta_carro_em_estoque, gerar_carro_aleatorio
+from daos.hidratacao import buscar_documentos_em_lotes_async, paginar_documentos_async
+from daos.lote import criar_em_lote_async
+from daos.cache import obter_cache
+from daos.estoque import SITUACAO_ESTOQUE, alteracao_adicionar, alteracao_remover, alteracao_situacao, limpar_contagens, montar_estoque
+from daos.recomendacao_dao import propriedades_do_carro
+
+class AsyncConcessionariaDAO:
+    """Versão assíncrona do ConcessionariaDAO, com os mesmos nomes de métodos"""
+    def __init__(self, database=None):
+        self.database = database or obter_database_async()
+        self.driver = self.database.driver
+        self.mongo_collection = self.database.mongo_db["concessionarias"]
+        self.carro_collection = self.database.mongo_db["carros"]
+        self.estoque_collection = self.database.mongo_db["estoques"]
+        self.identificacoes_sem_documento = []
+        self.cache = obter_cache("concessionarias")
+        self.cache_carros = obter_cache("carros")
+        self.cache_concessionaria_do_carro = obter_cache("concessionaria_do_carro")
+
+    def close(self):
+        """As conexões pertencem ao AsyncDatabase compartilhado; veja fechar_database_async"""
+        self.database = None
+
+    async def criar_concessionaria(self, concessionaria: Concessionaria, quantidade_carros: Optional[int] = None) -> str:
+        """Cria uma nova concessionária no Neo4j e MongoDB com um estoque inicial de carros aleatórios
+        (CARROS_POR_CONCESSIONARIA por padrão), e retorna a identificacao da concessionária"""
+        if quantidade_carros is None:
+            quantidade_carros = CARROS_POR_CONCESSIONARIA
+        identificacao = str(uuid.uuid4())
+        concessionaria_data = concessionaria.to_dict()
+        concessionaria_data["identificacao"] = identificacao
+        await self.mongo_collection.insert_one(concessionaria_data)
+        carros = [gerar_carro_aleatorio() for _ in range(quantidade_carros)]
+        for carro in carros:
+            carro.identificacao = str(uuid.uuid4())
+        nos_carros = [dict(propriedades_do_carro(carro.to_dict()), identificacao=carro.identificacao) for carro in carros]
+        carros_identificacoes = [carro.identificacao for carro in carros]
+        async with self.driver.session() as session:
+            try:
+                await session.execute_write(self._criar_concessionaria, identificacao, nos_carros)
+            except Exception:
+                await self._desfazer_criacao(identificacao, carros_identificacoes)
+                raise
+            carros_data = [dict(carro.to_dict(), situacao=SITUACAO_ESTOQUE) for carro in carros]
+            try:
+                if carros_data:
+                    await self.carro_collection.insert_many(carros_data, ordered=False)
+            except Exception:
+                await session.execute_write(self._remover_concessionaria_e_carros, identificacao, carros_identificacoes)
+                await self._desfazer_criacao(identificacao, carros_identificacoes)
+                raise
+        await self.estoque_collection.replace_one({"identificacao": identificacao}, montar_estoque(identificacao, carros_data), upsert=True)
+        return identificacao
+
+    async def _criar_concessionaria(self, tx, identificacao: str, carros: List[dict]):
+        query = """
+        CREATE (c:Concessionaria {identificacao: $identificacao})
+        WITH c
+        UNWIND $carros AS carro
+        CREATE (c)-[:OFERECE]->(:Carro {identificacao: carro.identificacao, chave_modelo: carro.chave_modelo})
+        """
+        await tx.run(query, identificacao=identificacao, carros=carros)
+
+    async def _remover_concessionaria_e_carros(self, tx, identificacao: str, carros_identificacoes: List[str]):
+        await tx.run("MATCH (n:Carro) WHERE n.identificacao IN $identificacoes DETACH DELETE n", identificacoes=carros_identificacoes)
+        await self._remover_concessionaria(tx, identificacao)
+
+    async def _desfazer_criacao(self, identificacao: str, carros_identificacoes: List[str]):
+        """Mesma compensação de ConcessionariaDAO._desfazer_criacao"""
+        await self.mongo_collection.delete_one({"identificacao": identificacao})
+        if carros_identificacoes:
+            await self.carro_collection.delete_many({"identificacao": {"$in": carros_identificacoes}})
+
+    async def criar_concessionarias_em_lote(self, concessionarias: List[Concessionaria]) -> List[str]:
+        """Cria várias concessionárias com uma instrução no Neo4j e um insert_many no MongoDB, sem estoque inicial.
+        Retorna as identificacoes das que foram criadas"""
+        documentos = [concessionaria.to_dict() for concessionaria in concessionarias]
+        return await criar_em_lote_async(self.driver, self.mongo_collection, "Concessionaria", documentos)
+
+    async def buscar_concessionaria(self, identificacao: str) -> Optional[Concessionaria]:
+        """Busca uma concessionária pela identificacao, passando pelo cache"""
+        return await self.cache.obter_ou_carregar_async(identificacao, lambda: self._carregar_concessionaria(identificacao))
+
+    async def _carregar_concessionaria(self, identificacao: str) -> Optional[Concessionaria]:
+        async with self.driver.session() as session:
+            existe = await session.execute_read(self._buscar_concessionaria, identificacao)
+        if existe:
+            mongo_data = await self.mongo_collection.find_one({"identificacao": identificacao}, projecao("concessionarias"))
+            if mongo_data:
+                return Concessionaria.from_dict(mongo_data)
+        return None
+
+    async def _buscar_concessionaria(self, tx, identificacao: str) -> bool:
+        query = "MATCH (c:Concessionaria) WHERE c.identificacao = $identificacao RETURN c.identificacao as identificacao"
+        result = await tx.run(query, identificacao=identificacao)
+        return await result.single() is not None
+
+    async def buscar_concessionaria_por_nome(self, nome: str, campos: str = "completo") -> Optional[Concessionaria]:
+        """Busca uma concessionária pelo nome, sem diferenciar maiúsculas, usando o índice único de nome"""
+        mongo_data = await self.mongo_collection.find_one({"nome": nome}, projecao("concessionarias", campos), collation=COLACAO_SEM_CAIXA)
+        return Concessionaria.from_dict(mongo_data) if mongo_data else None
+
+    async def buscar_todas_concessionarias(self, tamanho_lote: Optional[int] = None, campos: str = "completo") -> List[Concessionaria]:
+        """Retorna todas as concessionárias do Neo4j e MongoDB, hidratando os documentos em lotes"""
+        async with self.driver.session() as session:
+            identificacoes = await session.execute_read(self._buscar_todas_concessionarias)
+        documentos, self.identificacoes_sem_documento = await buscar_documentos_em_lotes_async(self.mongo_collection, identificacoes, tamanho_lote,
+                                                                                                   projecao("concessionarias", campos))
+        return Concessionaria.from_documentos(documentos)
+
+    async def _buscar_todas_concessionarias(self, tx) -> List[str]:
+        query = "MATCH (c:Concessionaria) RETURN c.identificacao as identificacao"
+        result = await tx.run(query)
+        return [record["identificacao"] async for record in result]
+
+    async def iterar_paginas_concessionarias(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                             campos: str = "completo") -> AsyncIterator[Tuple[List[Concessionaria], Optional[str]]]:
+        """Percorre as concessionárias em páginas ordenadas por identificacao (async for), cada uma com o cursor da seguinte"""
+        self.identificacoes_sem_documento = []
+        async for documentos, ausentes, proximo_cursor in paginar_documentos_async(self.driver, "Concessionaria", self.mongo_collection,
+                                                                                       tamanho_pagina, cursor, projecao("concessionarias", campos)):
+            self.identificacoes_sem_documento.extend(ausentes)
+            yield Concessionaria.from_documentos(documentos), proximo_cursor
+
+    async def iterar_concessionarias(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                     campos: str = "completo") -> AsyncIterator[Concessionaria]:
+        """Percorre as concessionárias uma a uma (async for), buscando uma página por vez"""
+        async for pagina, _ in self.iterar_paginas_concessionarias(tamanho_pagina, cursor, campos):
+            for concessionaria in pagina:
+                yield concessionaria
+
+    async def remover_concessionaria(self, identificacao: str) -> bool:
+        """Remove uma concessionária pela identificacao do Neo4j e MongoDB"""
+        carros_identificacoes = await self.buscar_carros_da_concessionaria(identificacao)
+        async with self.driver.session() as session:
+            success = await session.execute_write(self._remover_concessionaria, identificacao)
+        if success:
+            await self.mongo_collection.delete_one({"identificacao": identificacao})
+            await self.estoque_collection.delete_one({"identificacao": identificacao})
+            # Remover carros associados do MongoDB
+            await self.carro_collection.delete_many({"identificacao": {"$in": carros_identificacoes}})
+            self.cache.invalidar(identificacao)
+            self.cache_carros.invalidar(*carros_identificacoes)
+            self.cache_concessionaria_do_carro.invalidar(*carros_identificacoes)
+        return success
+
+    async def _remover_concessionaria(self, tx, identificacao: str) -> bool:
+        query = "MATCH (c:Concessionaria) WHERE c.identificacao = $identificacao DETACH DELETE c"
+        result = await tx.run(query, identificacao=identificacao)
+        summary = await result.consume()
+        return summary.counters.nodes_deleted > 0
+
+    async def buscar_carros_da_concessionaria(self, identificacao: str) -> List[str]:
+        """Busca as identificacoes dos carros que a concessionária possui"""
+        async with self.driver.session() as session:
+            return await session.execute_read(self._buscar_carros_da_concessionaria, identificacao)
+
+    async def _buscar_carros_da_concessionaria(self, tx, identificacao: str) -> List[str]:
+        query = """
+        MATCH (c:Concessionaria)-[:OFERECE]->(car:Carro)
+        WHERE c.identificacao = $identificacao
+        RETURN car.identificacao as identificacao
+        """
+        result = await tx.run(query, identificacao=identificacao)
+        return [record["identificacao"] async for record in result]
+
+    async def buscar_estoques(self, identificacoes: List[str]) -> Dict[str, dict]:
+        """Mesmo retorno de ConcessionariaDAO.buscar_estoques: os estoques materializados lidos em lote,
+        reconstruindo os que ainda não existem"""
+        documentos, ausentes = await buscar_documentos_em_lotes_async(self.estoque_collection, identificacoes, projecao=projecao("estoques"))
+        if ausentes:
+            await self.reconstruir_estoques(ausentes)
+            documentos.extend((await buscar_documentos_em_lotes_async(self.estoque_collection, ausentes, projecao=projecao("estoques")))[0])
+        estoques = {}
+        for documento in documentos:
+            documento["carros"] = Carro.from_documentos(documento["carros"])
+            estoques[documento["identificacao"]] = limpar_contagens(documento)
+        return estoques
+
+    async def buscar_estoque(self, identificacao: str) -> Optional[dict]:
+        """Retorna o estoque materializado da concessionária, com um único documento lido"""
+        return (await self.buscar_estoques([identificacao])).get(identificacao)
+
+    async def reconstruir_estoques(self, identificacoes: Optional[List[str]] = None) -> int:
+        """Recalcula o estoque materializado a partir das relações OFERECE do Neo4j, para as
+        concessionárias informadas ou para todas. Retorna quantos estoques foram gravados"""
+        async with self.driver.session() as session:
+            registros = await session.execute_read(self._buscar_concessionarias_com_carros, identificacoes)
+        carros_identificacoes = [carro for _, carros in registros for carro in carros]
+        carros_documentos, _ = await buscar_documentos_em_lotes_async(self.carro_collection, carros_identificacoes,
+                                                                      projecao=projecao("carros", "resumo"))
+        carros = {documento["identificacao"]: documento for documento in carros_documentos}
+        for identificacao, carros_da_concessionaria in registros:
+            estoque = montar_estoque(identificacao, [carros[carro] for carro in carros_da_concessionaria if carro in carros])
+            await self.estoque_collection.replace_one({"identificacao": identificacao}, estoque, upsert=True)
+        return len(registros)
+
+    async def _buscar_concessionarias_com_carros(self, tx, identificacoes: Optional[List[str]]) -> List[Tuple[str, List[str]]]:
+        query = """
+        MATCH (c:Concessionaria)
+        WHERE $identificacoes IS NULL OR c.identificacao IN $identificacoes
+        OPTIONAL MATCH (c)-[:OFERECE]->(car:Carro)
+        RETURN c.identificacao as identificacao, collect(car.identificacao) as carros
+        """
+        result = await tx.run(query, identificacoes=identificacoes)
+        return [(record["identificacao"], record["carros"]) async for record in result]
+
+    async def buscar_carro_em_estoque(self, identificacao: str, modelo: str, fabricante: str) -> Optional[Carro]:
+        """Mesma busca de ConcessionariaDAO.buscar_carro_em_estoque, filtrada pelo MongoDB no estoque materializado"""
+        filtro, projecao_carro = consulta_carro_em_estoque(identificacao, modelo, fabricante)
+        documento = await self.estoque_collection.find_one(filtro, projecao_carro, collation=COLACAO_SEM_CAIXA)
+        if documento is None and await self.estoque_collection.find_one({"identificacao": identificacao}, projecao("estoques", "existencia")) is None:
+            if await self.reconstruir_estoques([identificacao]):
+                documento = await self.estoque_collection.find_one(filtro, projecao_carro, collation=COLACAO_SEM_CAIXA)
+        return Carro.from_dict(documento["carros"][0]) if documento else None
+
+    async def vincular_carro_a_concessionaria(self, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
+        """Vincula um carro a uma concessionária"""
+        async with self.driver.session() as session:
+            success = await session.execute_write(self._vincular_carro_a_concessionaria, concessionaria_identificacao, carro_identificacao)
+        if success:
+            carro = await self.carro_collection.find_one_and_update({"identificacao": carro_identificacao}, alteracao_situacao(SITUACAO_ESTOQUE),
+                                                                    projection=projecao("carros", "resumo"))
+            if carro:
+                await self.estoque_collection.update_one(*alteracao_adicionar(concessionaria_identificacao, carro))
+        self.cache_concessionaria_do_carro.invalidar(carro_identificacao)
+        return success
+
+    async def _vincular_carro_a_concessionaria(self, tx, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
+        query = """
+        MATCH (c:Concessionaria {identificacao: $concessionaria_identificacao})
+        MATCH (car:Carro {identificacao: $carro_identificacao})
+        CREATE (c)-[:OFERECE]->(car)
+        """
+        result = await tx.run(query, concessionaria_identificacao=concessionaria_identificacao, carro_identificacao=carro_identificacao)
+        summary = await result.consume()
+        return summary.counters.relationships_created > 0
+
+    async def desvincular_carro_da_concessionaria(self, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
+        """Remove a relação entre uma concessionária e um carro"""
+        async with self.driver.session() as session:
+            success = await session.execute_write(self._desvincular_carro_da_concessionaria, concessionaria_identificacao, carro_identificacao)
+        if success:
+            carro = await self.carro_collection.find_one_and_update({"identificacao": carro_identificacao}, alteracao_situacao(None),
+                                                                    projection=projecao("carros", "resumo"))
+            if carro:
+                await self.estoque_collection.update_one(*alteracao_remover(carro, concessionaria_identificacao))
+        self.cache_concessionaria_do_carro.invalidar(carro_identificacao)
+        return success
+
+    async def _desvincular_carro_da_concessionaria(self, tx, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
+        query = """
+        MATCH (c:Concessionaria)-[r:OFERECE]->(car:Carro)
+        WHERE c.identificacao = $concessionaria_identificacao AND car.identificacao = $carro_identificacao
+        DELETE r
+        """
+        result = await tx.run(query, concessionaria_identificacao=concessionaria_identificacao, carro_identificacao=carro_identificacao)
+        summary = await result.consume()
+        return summary.counters.relationships_deleted > 0
+
+    async def atualizar_concessionaria(self, identificacao: str, concessionaria_update: Concessionaria) -> bool:
+        """Atualiza os dados de uma concessionária no MongoDB"""
+        concessionaria_data = concessionaria_update.to_dict()
+        concessionaria_data["identificacao"] = identificacao
+        result = await self.mongo_collection.replace_one({"identificacao": identificacao}, concessionaria_data)
+        self.cache.invalidar(identificacao)
+        return result.matched_count > 0
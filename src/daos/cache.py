@@ -0,0 +1,117 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+from config.config import CACHE_HABILITADO, CACHE_TAMANHO_MAXIMO, CACHE_TTL
+
+_AUSENTE = object()
+
+class CacheLRU:
+    """Cache em memória com limite de itens (remove o menos usado) e tempo de expiração"""
+    def __init__(self, tamanho_maximo: int, ttl: float, habilitado: bool = True):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.habilitado = habilitado
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """Retorna o valor guardado ou _AUSENTE se não existir ou tiver expirado"""
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is not _AUSENTE:
+                valor, expira_em = item
+                if expira_em > time.monotonic():
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                del self._itens[chave]
+            self.falhas += 1
+            return _AUSENTE
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+                self.despejos += 1
+
+    def obter_ou_carregar(self, chave, carregar: Callable, guardar_nulo: bool = False):
+        """Retorna uma cópia do valor em cache ou carrega, guarda e retorna o valor"""
+        if not self.habilitado:
+            return carregar()
+        valor = self.obter(chave)
+        if valor is _AUSENTE:
+            valor = carregar()
+            if valor is not None or guardar_nulo:
+                self.guardar(chave, valor)
+        return copy.copy(valor)
+
+    async def obter_ou_carregar_async(self, chave, carregar: Callable, guardar_nulo: bool = False):
+        """Versão de obter_ou_carregar para funções de carga assíncronas"""
+        if not self.habilitado:
+            return await carregar()
+        valor = self.obter(chave)
+        if valor is _AUSENTE:
+            valor = await carregar()
+            if valor is not None or guardar_nulo:
+                self.guardar(chave, valor)
+        return copy.copy(valor)
+
+    def invalidar(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "itens": len(self._itens),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "despejos": self.despejos,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            }
+
+_caches: Dict[str, CacheLRU] = {}
+_lock = threading.Lock()
+_habilitado = CACHE_HABILITADO
+
+def obter_cache(nome: str) -> CacheLRU:
+    """Retorna o cache compartilhado com o nome informado, criando-o no primeiro uso"""
+    with _lock:
+        if nome not in _caches:
+            _caches[nome] = CacheLRU(CACHE_TAMANHO_MAXIMO, CACHE_TTL, _habilitado)
+        return _caches[nome]
+
+def habilitar_cache(habilitado: bool = True):
+    """Liga ou desliga os caches do processo, inclusive os já criados; ao desligar, eles são esvaziados"""
+    global _habilitado
+    with _lock:
+        _habilitado = habilitado
+        for cache in _caches.values():
+            cache.habilitado = habilitado
+            if not habilitado:
+                cache.limpar()
+
+def cache_habilitado() -> bool:
+    return _habilitado
+
+def estatisticas_caches() -> Dict[str, dict]:
+    with _lock:
+        return {nome: cache.estatisticas() for nome, cache in _caches.items()}
+
+def limpar_caches():
+    with _lock:
+        for cache in _caches.values():
+            cache.limpar()
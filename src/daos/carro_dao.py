@@ -1,42 +1,123 @@
 from neo4j import GraphDatabase
-from typing import List, Optional
+from pymongo import ASCENDING, DESCENDING
+from typing import Dict, Iterator, List, Optional, Tuple
 from models.carro import Carro
+import re
 import uuid
-from config.config import NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, MONGO_URI
-from config.database import Database
+from config.config import LEITURA_PARALELA, MONGO_TAMANHO_LOTE
+from config.database import obter_database, liberar_database
+from config.instrumentacao import instrumentar_dao
+from config.schema import COLACAO_SEM_CAIXA, projecao
+from daos.hidratacao import buscar_documentos_em_lotes, paginar_documentos
+from daos.lote import criar_em_lote
+from daos.cache import obter_cache
+from daos.estoque import (FILTROS_DISPONIBILIDADE, SITUACAO_ESTOQUE, SITUACAO_VENDIDO, alteracao_adicionar,
+                          alteracao_remover, resumo_do_carro)
+from daos.paralelo import buscar_em_paralelo, ler_neo4j, obter_medidor
+from daos.recomendacao_dao import propriedades_do_carro
 
+TAMANHO_PAGINA_PESQUISA = 20
+
+# Na colação ICU o U+FFFF tem o maior peso primário: prefixo + U+FFFF fica depois de qualquer valor
+# começado pelo prefixo. Somar 1 ao último caractere não serve, pois "z" + 1 é "{", que a colação
+# ordena antes das letras e dos dígitos
+LIMITE_COLACAO = "\uffff"
+
+def _intervalo_do_prefixo(prefixo: str) -> dict:
+    """Intervalo, na ordem da colação sem caixa, que casa os valores começados pelo prefixo usando o índice do campo"""
+    return {"$gte": prefixo, "$lt": prefixo + LIMITE_COLACAO}
+
+def consulta_pesquisa(texto: Optional[str] = None, modelo: Optional[str] = None, fabricante: Optional[str] = None,
+                      ano_minimo: Optional[int] = None, ano_maximo: Optional[int] = None,
+                      disponibilidade: Optional[str] = None, exato: bool = False, campos: str = "resumo") -> Tuple[dict, dict, dict]:
+    """Monta (filtro, projeção, opções do find) da pesquisa de carros, servindo ao PyMongo e ao Motor.
+    Com texto a busca usa o índice de texto e ordena pela relevância; sem texto, modelo e fabricante
+    são prefixos (ou valores inteiros, com exato) comparados sem caixa pelos índices com colação"""
+    filtro = {}
+    if ano_minimo is not None or ano_maximo is not None:
+        filtro["ano"] = {}
+        if ano_minimo is not None:
+            filtro["ano"]["$gte"] = ano_minimo
+        if ano_maximo is not None:
+            filtro["ano"]["$lte"] = ano_maximo
+    if disponibilidade:
+        if disponibilidade not in FILTROS_DISPONIBILIDADE:
+            raise ValueError(f"Disponibilidade desconhecida: {disponibilidade}. Use {', '.join(FILTROS_DISPONIBILIDADE)}")
+        filtro.update(FILTROS_DISPONIBILIDADE[disponibilidade])
+    projecao_pesquisa = dict(projecao("carros", campos))
+    nomes = [(campo, valor) for campo, valor in (("fabricante", fabricante), ("modelo", modelo)) if valor]
+    if texto:
+        # O $text não aceita colação: modelo e fabricante viram expressões regulares sem caixa,
+        # conferidas só nos documentos que o índice de texto já selecionou
+        filtro["$text"] = {"$search": texto}
+        for campo, valor in nomes:
+            filtro[campo] = {"$regex": f"^{re.escape(valor)}{'$' if exato else ''}", "$options": "i"}
+        projecao_pesquisa["relevancia"] = {"$meta": "textScore"}
+        return filtro, projecao_pesquisa, {"sort": [("relevancia", {"$meta": "textScore"}), ("ano", DESCENDING)]}
+    for campo, valor in nomes:
+        filtro[campo] = valor if exato else _intervalo_do_prefixo(valor)
+    ordem = [("fabricante", ASCENDING), ("modelo", ASCENDING), ("ano", DESCENDING)]
+    return filtro, projecao_pesquisa, {"sort": ordem, "collation": COLACAO_SEM_CAIXA}
+
+@instrumentar_dao
 class CarroDAO:
-    def __init__(self):
-        self.database = Database(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, MONGO_URI)
+    def __init__(self, leitura_paralela: Optional[bool] = None):
+        self.database = obter_database()
         self.driver = self.database.driver
         self.mongo_collection = self.database.mongo_db["carros"]
+        self.estoque_collection = self.database.mongo_db["estoques"]
+        self.identificacoes_sem_documento = []
+        self.cache = obter_cache("carros")
+        self.leitura_paralela = LEITURA_PARALELA if leitura_paralela is None else leitura_paralela
+        self.medidor_leitura_paralela = obter_medidor("carros")
+        self.cache_concessionaria_do_carro = obter_cache("concessionaria_do_carro")
 
     def close(self):
-        self.database.close()
+        """Devolve as conexões ao pool compartilhado"""
+        if self.database is not None:
+            liberar_database()
+            self.database = None
 
     def criar_carro(self, carro: Carro) -> str:
         """Cria um novo carro no Neo4j e MongoDB, retorna sua identificacao"""
         identificacao = str(uuid.uuid4())
+        carro_data = carro.to_dict()
+        carro_data["identificacao"] = identificacao
         with self.driver.session() as session:
-            session.execute_write(self._criar_carro, identificacao)
+            session.execute_write(self._criar_carro, identificacao, propriedades_do_carro(carro_data))
             # Salvar dados completos no MongoDB
-            carro_data = carro.to_dict()
-            carro_data["identificacao"] = identificacao
             self.mongo_collection.insert_one(carro_data)
             return identificacao
 
-    def _criar_carro(self, tx, identificacao: str):
-        """Cria um carro no Neo4j com a identificacao fornecida"""
-        query = "CREATE (c:Carro {identificacao: $identificacao})"
-        tx.run(query, identificacao=identificacao)
+    def _criar_carro(self, tx, identificacao: str, propriedades: dict):
+        """Cria um carro no Neo4j com a identificacao fornecida e a chave do modelo"""
+        query = "CREATE (c:Carro {identificacao: $identificacao}) SET c += $propriedades"
+        tx.run(query, identificacao=identificacao, propriedades=propriedades)
+
+    def criar_carros_em_lote(self, carros: List[Carro]) -> List[str]:
+        """Cria vários carros com uma instrução no Neo4j e um insert_many no MongoDB.
+        Retorna as identificacoes dos que foram criados"""
+        documentos = [carro.to_dict() for carro in carros]
+        return criar_em_lote(self.driver, self.mongo_collection, "Carro", documentos, propriedades_do_carro)
 
     def buscar_carro(self, identificacao: str) -> Optional[Carro]:
+        """Busca um carro pela identificacao, passando pelo cache"""
+        return self.cache.obter_ou_carregar(identificacao, lambda: self._carregar_carro(identificacao))
+
+    def _carregar_carro(self, identificacao: str) -> Optional[Carro]:
         """Busca um carro pela identificacao no Neo4j e MongoDB"""
+        if self.leitura_paralela:
+            neo4j_result, mongo_data = buscar_em_paralelo(
+                lambda: ler_neo4j(self.driver, self._buscar_carro, identificacao),
+                lambda: self.mongo_collection.find_one({"identificacao": identificacao}, projecao("carros")),
+                self.medidor_leitura_paralela
+            )
+            return Carro.from_dict(mongo_data) if neo4j_result and mongo_data else None
         with self.driver.session() as session:
             neo4j_result = session.execute_read(self._buscar_carro, identificacao)
             if neo4j_result:
                 # Buscar dados completos no MongoDB
-                mongo_data = self.mongo_collection.find_one({"identificacao": identificacao})
+                mongo_data = self.mongo_collection.find_one({"identificacao": identificacao}, projecao("carros"))
                 if mongo_data:
                     return Carro.from_dict(mongo_data)
             return None
@@ -50,16 +131,102 @@ class CarroDAO:
             return Carro(identificacao=record["identificacao"])
         return None
 
-    def buscar_todos_carros(self) -> List[Carro]:
-        """Retorna todos os carros do Neo4j e MongoDB"""
+    def buscar_carros_por_modelo(self, modelo: str, fabricante: str, limite: int = 0, campos: str = "completo") -> List[Carro]:
+        """Busca os carros de um modelo e fabricante, sem diferenciar maiúsculas, pelo índice (fabricante, modelo).
+        campos escolhe a projeção de config.schema.PROJECOES ("completo", "resumo" ou "existencia")"""
+        cursor = self.mongo_collection.find(
+            {"fabricante": fabricante, "modelo": modelo}, projecao("carros", campos), collation=COLACAO_SEM_CAIXA, limit=limite
+        )
+        return Carro.from_documentos(cursor)
+
+    def pesquisar_carros(self, texto: Optional[str] = None, modelo: Optional[str] = None, fabricante: Optional[str] = None,
+                         ano_minimo: Optional[int] = None, ano_maximo: Optional[int] = None, disponibilidade: Optional[str] = None,
+                         exato: bool = False, pagina: int = 1, tamanho_pagina: int = TAMANHO_PAGINA_PESQUISA,
+                         campos: str = "resumo") -> List[Carro]:
+        """Pesquisa carros com uma única consulta indexada ao MongoDB e retorna a página pedida (a partir de 1).
+        texto busca palavras do modelo ou do fabricante ("skyline"), ordenando pela relevância; modelo e
+        fabricante filtram pelo começo do nome, sem diferenciar maiúsculas. disponibilidade é "estoque"
+        (oferecido por uma concessionária), "vendido" (de um cliente) ou "livre". tamanho_pagina=0 traz tudo"""
+        filtro, projecao_pesquisa, opcoes = consulta_pesquisa(texto, modelo, fabricante, ano_minimo, ano_maximo,
+                                                              disponibilidade, exato, campos)
+        cursor = self.mongo_collection.find(filtro, projecao_pesquisa, skip=(max(pagina, 1) - 1) * tamanho_pagina,
+                                            limit=tamanho_pagina, **opcoes)
+        return Carro.from_documentos(cursor)
+
+    def reconstruir_situacoes(self) -> int:
+        """Recalcula a situação gravada em cada carro (estoque, vendido ou livre) a partir das relações
+        OFERECE e POSSUI do Neo4j. Retorna quantos carros estão em estoque ou vendidos"""
+        with self.driver.session() as session:
+            situacoes = session.execute_read(self._buscar_situacoes)
+        self.mongo_collection.update_many({"situacao": {"$exists": True}}, {"$unset": {"situacao": ""}})
+        for situacao in (SITUACAO_ESTOQUE, SITUACAO_VENDIDO):
+            identificacoes = [identificacao for identificacao, atual in situacoes if atual == situacao]
+            if identificacoes:
+                self.mongo_collection.update_many({"identificacao": {"$in": identificacoes}}, {"$set": {"situacao": situacao}})
+        return len(situacoes)
+
+    def _buscar_situacoes(self, tx) -> List[Tuple[str, str]]:
+        """Retorna a identificacao e a situação dos carros oferecidos por uma concessionária ou de um cliente"""
+        query = """
+        MATCH (:Concessionaria)-[:OFERECE]->(car:Carro)
+        RETURN car.identificacao as identificacao, $estoque as situacao
+        UNION
+        MATCH (:Cliente)-[:POSSUI]->(car:Carro)
+        RETURN car.identificacao as identificacao, $vendido as situacao
+        """
+        result = tx.run(query, estoque=SITUACAO_ESTOQUE, vendido=SITUACAO_VENDIDO)
+        return [(record["identificacao"], record["situacao"]) for record in result]
+
+    def sincronizar_propriedades(self, tamanho_lote: int = MONGO_TAMANHO_LOTE) -> int:
+        """Grava nos nós :Carro as propriedades derivadas do MongoDB (chave_modelo), para carros criados
+        antes delas ou alterados por fora dos DAOs. Retorna quantos carros foram lidos"""
+        total = 0
+        lote = []
+        with self.driver.session() as session:
+            for documento in self.mongo_collection.find({}, projecao("carros", "resumo")).batch_size(tamanho_lote):
+                lote.append(dict(propriedades_do_carro(documento), identificacao=documento["identificacao"]))
+                if len(lote) >= tamanho_lote:
+                    session.execute_write(self._gravar_propriedades, lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                session.execute_write(self._gravar_propriedades, lote)
+                total += len(lote)
+        return total
+
+    def _gravar_propriedades(self, tx, carros: List[dict]):
+        """Grava as propriedades de cada carro ({identificacao, chave_modelo}) no seu nó"""
+        query = """
+        UNWIND $carros AS carro
+        MATCH (c:Carro {identificacao: carro.identificacao})
+        SET c.chave_modelo = carro.chave_modelo
+        """
+        tx.run(query, carros=carros)
+
+    def iterar_paginas_carros(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                              campos: str = "completo") -> Iterator[Tuple[List[Carro], Optional[str]]]:
+        """Percorre os carros em páginas ordenadas por identificacao, sem carregar tudo em memória.
+        Cada página vem com o cursor que retoma a listagem a partir da página seguinte"""
+        self.identificacoes_sem_documento = []
+        for documentos, ausentes, proximo_cursor in paginar_documentos(self.driver, "Carro", self.mongo_collection, tamanho_pagina, cursor,
+                                                                           projecao("carros", campos)):
+            self.identificacoes_sem_documento.extend(ausentes)
+            yield Carro.from_documentos(documentos), proximo_cursor
+
+    def iterar_carros(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                      campos: str = "completo") -> Iterator[Carro]:
+        """Percorre os carros um a um, em ordem de identificacao, buscando uma página por vez"""
+        for pagina, _ in self.iterar_paginas_carros(tamanho_pagina, cursor, campos):
+            yield from pagina
+
+    def buscar_todos_carros(self, tamanho_lote: Optional[int] = None, campos: str = "completo") -> List[Carro]:
+        """Retorna todos os carros do Neo4j e MongoDB, hidratando os documentos em lotes"""
         with self.driver.session() as session:
             neo4j_carros = session.execute_read(self._buscar_todos_carros)
-            carros = []
-            for car in neo4j_carros:
-                mongo_data = self.mongo_collection.find_one({"identificacao": car.identificacao})
-                if mongo_data:
-                    carros.append(Carro.from_dict(mongo_data))
-            return carros
+        identificacoes = [car.identificacao for car in neo4j_carros]
+        documentos, self.identificacoes_sem_documento = buscar_documentos_em_lotes(self.mongo_collection, identificacoes, tamanho_lote,
+                                                                                       projecao("carros", campos))
+        return Carro.from_documentos(documentos)
 
     def _buscar_todos_carros(self, tx) -> List[Carro]:
         """Retorna todos os carros do Neo4j"""
@@ -72,7 +239,12 @@ class CarroDAO:
         with self.driver.session() as session:
             success = session.execute_write(self._remover_carro, identificacao)
             if success:
-                self.mongo_collection.delete_one({"identificacao": identificacao})
+                carro = self.mongo_collection.find_one_and_delete({"identificacao": identificacao}, projection=projecao("carros", "resumo"))
+                if carro:
+                    # Retira o carro do estoque da concessionária que o oferecia, se houver
+                    self.estoque_collection.update_one(*alteracao_remover(carro))
+                self.cache.invalidar(identificacao)
+                self.cache_concessionaria_do_carro.invalidar(identificacao)
             return success
 
     def _remover_carro(self, tx, identificacao: str) -> bool:
@@ -82,7 +254,13 @@ class CarroDAO:
         return result.consume().counters.nodes_deleted > 0
 
     def buscar_concessionaria_do_carro(self, identificacao: str) -> Optional[str]:
-        """Busca a concessionária que possui o carro"""
+        """Busca a concessionária que possui o carro, passando pelo cache"""
+        return self.cache_concessionaria_do_carro.obter_ou_carregar(
+            identificacao, lambda: self._carregar_concessionaria_do_carro(identificacao), guardar_nulo=True
+        )
+
+    def _carregar_concessionaria_do_carro(self, identificacao: str) -> Optional[str]:
+        """Busca a concessionária que possui o carro no Neo4j"""
         with self.driver.session() as session:
             return session.execute_read(self._buscar_concessionaria_do_carro, identificacao)
 
@@ -97,9 +275,37 @@ class CarroDAO:
         record = result.single()
         return record["identificacao"] if record else None
 
+    def buscar_concessionarias_dos_carros(self, identificacoes: List[str]) -> Dict[str, str]:
+        """Retorna, com uma única consulta ao Neo4j, a concessionária que oferece cada carro informado
+        (carros fora de estoque não aparecem)"""
+        with self.driver.session() as session:
+            return session.execute_read(self._buscar_concessionarias_dos_carros, identificacoes)
+
+    def _buscar_concessionarias_dos_carros(self, tx, identificacoes: List[str]) -> Dict[str, str]:
+        """Busca os pares (carro, concessionária que o oferece) dos carros informados"""
+        query = """
+        MATCH (conc:Concessionaria)-[:OFERECE]->(c:Carro)
+        WHERE c.identificacao IN $identificacoes
+        RETURN c.identificacao as carro, conc.identificacao as concessionaria
+        """
+        result = tx.run(query, identificacoes=identificacoes)
+        return {record["carro"]: record["concessionaria"] for record in result}
+
     def atualizar_carro(self, identificacao: str, carro_update: Carro) -> bool:
-        """Atualiza os dados de um carro no MongoDB"""
+        """Atualiza os dados de um carro no MongoDB (e a chave do modelo no nó do Neo4j, se mudou)"""
         carro_data = carro_update.to_dict()
         carro_data["identificacao"] = identificacao
-        result = self.mongo_collection.replace_one({"identificacao": identificacao}, carro_data)
-        return result.matched_count > 0
\ No newline at end of file
+        # $set em vez de substituir o documento, para manter a situacao gravada pelas outras operações
+        anterior = self.mongo_collection.find_one_and_update({"identificacao": identificacao}, {"$set": carro_data},
+                                                             projection=projecao("carros", "resumo"))
+        self.cache.invalidar(identificacao)
+        if anterior and resumo_do_carro(anterior) != resumo_do_carro(carro_data):
+            if propriedades_do_carro(anterior) != propriedades_do_carro(carro_data):
+                with self.driver.session() as session:
+                    session.execute_write(self._gravar_propriedades, [dict(propriedades_do_carro(carro_data), identificacao=identificacao)])
+            # Atualiza o resumo do carro no estoque em que ele estiver
+            concessionaria = self.buscar_concessionaria_do_carro(identificacao)
+            if concessionaria:
+                self.estoque_collection.update_one(*alteracao_remover(anterior, concessionaria))
+                self.estoque_collection.update_one(*alteracao_adicionar(concessionaria, carro_data))
+        return anterior is not None
\ No newline at end of file
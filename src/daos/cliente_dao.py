@@ -1,18 +1,46 @@
 from neo4j import GraphDatabase
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 from models.cliente import Cliente
+from models.carro import Carro
 import uuid
-from config.config import NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, MONGO_URI
-from config.database import Database
+from enum import Enum
+from pymongo.errors import DuplicateKeyError
+from config.config import LEITURA_PARALELA
+from config.database import obter_database, liberar_database
+from config.escrita_adiada import escrita_imediata
+from config.instrumentacao import instrumentar_dao
+from config.schema import projecao
+from daos.hidratacao import buscar_documentos_em_lotes, paginar_documentos
+from daos.lote import criar_em_lote
+from daos.cache import obter_cache
+from daos.estoque import SITUACAO_VENDIDO, alteracao_remover, alteracao_situacao
+from daos.paralelo import buscar_em_paralelo, ler_neo4j, obter_medidor
 
+class ResultadoCompra(Enum):
+    SUCESSO = "sucesso"
+    NAO_ENCONTRADO = "nao_encontrado"  # cliente, concessionária ou carro inexistente
+    NAO_CADASTRADO = "nao_cadastrado"  # cliente não está cadastrado na concessionária
+    INDISPONIVEL = "indisponivel"  # carro não é oferecido pela concessionária
+
+@instrumentar_dao
 class ClienteDAO:
-    def __init__(self):
-        self.database = Database(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, MONGO_URI)
+    def __init__(self, leitura_paralela: Optional[bool] = None):
+        self.database = obter_database()
         self.driver = self.database.driver
         self.mongo_collection = self.database.mongo_db["clientes"]
+        self.carro_collection = self.database.mongo_db["carros"]
+        self.estoque_collection = self.database.mongo_db["estoques"]
+        self.identificacoes_sem_documento = []
+        self.cache = obter_cache("clientes")
+        self.leitura_paralela = LEITURA_PARALELA if leitura_paralela is None else leitura_paralela
+        self.medidor_leitura_paralela = obter_medidor("clientes")
+        self.cache_concessionaria_do_carro = obter_cache("concessionaria_do_carro")
 
     def close(self):
-        self.database.close()
+        """Devolve as conexões ao pool compartilhado"""
+        if self.database is not None:
+            liberar_database()
+            self.database = None
 
     def criar_cliente(self, cliente: Cliente) -> str:
         """Cria um novo cliente no Neo4j e MongoDB, retorna sua identificacao"""
@@ -22,7 +50,12 @@ class ClienteDAO:
             # Salvar dados completos no MongoDB
             cliente_data = cliente.to_dict()
             cliente_data["identificacao"] = identificacao
-            self.mongo_collection.insert_one(cliente_data)
+            try:
+                escrita_imediata(self.mongo_collection).insert_one(cliente_data)
+            except DuplicateKeyError:
+                # Desfaz o nó criado no Neo4j para não deixar registros órfãos
+                session.execute_write(self._remover_cliente, identificacao)
+                raise
             return identificacao
 
     def _criar_cliente(self, tx, identificacao: str):
@@ -30,13 +63,30 @@ class ClienteDAO:
         query = "CREATE (c:Cliente {identificacao: $identificacao})"
         tx.run(query, identificacao=identificacao)
 
+    def criar_clientes_em_lote(self, clientes: List[Cliente]) -> List[str]:
+        """Cria vários clientes com uma instrução no Neo4j e um insert_many no MongoDB.
+        Retorna as identificacoes dos que foram criados"""
+        documentos = [cliente.to_dict() for cliente in clientes]
+        return criar_em_lote(self.driver, self.mongo_collection, "Cliente", documentos)
+
     def buscar_cliente(self, identificacao: str) -> Optional[Cliente]:
+        """Busca um cliente pela identificacao, passando pelo cache"""
+        return self.cache.obter_ou_carregar(identificacao, lambda: self._carregar_cliente(identificacao))
+
+    def _carregar_cliente(self, identificacao: str) -> Optional[Cliente]:
         """Busca um cliente pela identificacao no Neo4j e MongoDB"""
+        if self.leitura_paralela:
+            neo4j_result, mongo_data = buscar_em_paralelo(
+                lambda: ler_neo4j(self.driver, self._buscar_cliente, identificacao),
+                lambda: self.mongo_collection.find_one({"identificacao": identificacao}, projecao("clientes")),
+                self.medidor_leitura_paralela
+            )
+            return Cliente.from_dict(mongo_data) if neo4j_result and mongo_data else None
         with self.driver.session() as session:
             neo4j_result = session.execute_read(self._buscar_cliente, identificacao)
             if neo4j_result:
                 # Buscar dados completos no MongoDB
-                mongo_data = self.mongo_collection.find_one({"identificacao": identificacao})
+                mongo_data = self.mongo_collection.find_one({"identificacao": identificacao}, projecao("clientes"))
                 if mongo_data:
                     return Cliente.from_dict(mongo_data)
             return None
@@ -50,16 +100,20 @@ class ClienteDAO:
             return Cliente(identificacao=record["identificacao"])
         return None
 
-    def buscar_todos_clientes(self) -> List[Cliente]:
-        """Retorna todos os clientes do Neo4j e MongoDB"""
+    def buscar_cliente_por_cpf(self, cpf: str, campos: str = "completo") -> Optional[Cliente]:
+        """Busca um cliente pelo CPF usando o índice único de clientes.cpf.
+        campos escolhe a projeção de config.schema.PROJECOES ("completo", "resumo" ou "existencia")"""
+        mongo_data = self.mongo_collection.find_one({"cpf": cpf}, projecao("clientes", campos))
+        return Cliente.from_dict(mongo_data) if mongo_data else None
+
+    def buscar_todos_clientes(self, tamanho_lote: Optional[int] = None, campos: str = "completo") -> List[Cliente]:
+        """Retorna todos os clientes do Neo4j e MongoDB, hidratando os documentos em lotes"""
         with self.driver.session() as session:
             neo4j_clientes = session.execute_read(self._buscar_todos_clientes)
-            clientes = []
-            for cli in neo4j_clientes:
-                mongo_data = self.mongo_collection.find_one({"identificacao": cli.identificacao})
-                if mongo_data:
-                    clientes.append(Cliente.from_dict(mongo_data))
-            return clientes
+        identificacoes = [cli.identificacao for cli in neo4j_clientes]
+        documentos, self.identificacoes_sem_documento = buscar_documentos_em_lotes(self.mongo_collection, identificacoes, tamanho_lote,
+                                                                                       projecao("clientes", campos))
+        return Cliente.from_documentos(documentos)
 
     def _buscar_todos_clientes(self, tx) -> List[Cliente]:
         """Retorna todos os clientes do Neo4j"""
@@ -67,14 +121,68 @@ class ClienteDAO:
         result = tx.run(query)
         return [Cliente(identificacao=record["identificacao"]) for record in result]
 
+    def iterar_paginas_clientes(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                campos: str = "completo") -> Iterator[Tuple[List[Cliente], Optional[str]]]:
+        """Percorre os clientes em páginas ordenadas por identificacao, sem carregar tudo em memória.
+        Cada página vem com o cursor que retoma a listagem a partir da página seguinte"""
+        self.identificacoes_sem_documento = []
+        for documentos, ausentes, proximo_cursor in paginar_documentos(self.driver, "Cliente", self.mongo_collection, tamanho_pagina, cursor,
+                                                                           projecao("clientes", campos)):
+            self.identificacoes_sem_documento.extend(ausentes)
+            yield Cliente.from_documentos(documentos), proximo_cursor
+
+    def iterar_clientes(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                        campos: str = "completo") -> Iterator[Cliente]:
+        """Percorre os clientes um a um, em ordem de identificacao, buscando uma página por vez"""
+        for pagina, _ in self.iterar_paginas_clientes(tamanho_pagina, cursor, campos):
+            yield from pagina
+
+    def buscar_clientes_com_carros(self, tamanho_lote: Optional[int] = None, campos: str = "completo",
+                                   campos_carros: str = "completo") -> List[Tuple[Cliente, List[Carro]]]:
+        """Retorna todos os clientes com os carros que possuem, usando uma consulta no Neo4j
+        e leituras em lote no MongoDB para clientes e carros. campos e campos_carros escolhem
+        as projeções de cada coleção"""
+        with self.driver.session() as session:
+            registros = session.execute_read(self._buscar_clientes_com_carros)
+        clientes_identificacoes = [identificacao for identificacao, _ in registros]
+        carros_identificacoes = [carro for _, carros in registros for carro in carros]
+        documentos, self.identificacoes_sem_documento = buscar_documentos_em_lotes(self.mongo_collection, clientes_identificacoes, tamanho_lote,
+                                                                                   projecao("clientes", campos))
+        carros_documentos, _ = buscar_documentos_em_lotes(self.carro_collection, carros_identificacoes, tamanho_lote,
+                                                          projecao("carros", campos_carros))
+        carros = {carro.identificacao: carro for carro in Carro.from_documentos(carros_documentos)}
+        carros_por_cliente = dict(registros)
+        return [
+            (cliente, [carros[carro] for carro in carros_por_cliente[cliente.identificacao] if carro in carros])
+            for cliente in Cliente.from_documentos(documentos)
+        ]
+
+    def _buscar_clientes_com_carros(self, tx) -> List[Tuple[str, List[str]]]:
+        """Retorna a identificacao de cada cliente com as identificacoes dos carros que possui"""
+        query = """
+        MATCH (c:Cliente)
+        OPTIONAL MATCH (c)-[:POSSUI]->(car:Carro)
+        RETURN c.identificacao as identificacao, collect(car.identificacao) as carros
+        """
+        result = tx.run(query)
+        return [(record["identificacao"], record["carros"]) for record in result]
+
     def remover_cliente(self, identificacao: str) -> bool:
-        """Remove um cliente pela identificacao do Neo4j e MongoDB"""
+        """Remove um cliente pela identificacao do Neo4j e MongoDB; os carros que ele possuía voltam a ser livres"""
         with self.driver.session() as session:
-            success = session.execute_write(self._remover_cliente, identificacao)
+            success, carros = session.execute_write(self._remover_cliente_e_carros, identificacao)
             if success:
                 self.mongo_collection.delete_one({"identificacao": identificacao})
+                if carros:
+                    self.carro_collection.update_many({"identificacao": {"$in": carros}}, alteracao_situacao(None))
+                self.cache.invalidar(identificacao)
             return success
 
+    def _remover_cliente_e_carros(self, tx, identificacao: str) -> Tuple[bool, List[str]]:
+        """Remove o cliente e retorna, da mesma transação, os carros cujo POSSUI foi apagado junto"""
+        carros = self._buscar_carros_do_cliente(tx, identificacao)
+        return self._remover_cliente(tx, identificacao), carros
+
     def _remover_cliente(self, tx, identificacao: str) -> bool:
         """Remove um cliente pela identificacao do Neo4j"""
         query = "MATCH (c:Cliente) WHERE c.identificacao = $identificacao DETACH DELETE c"
@@ -99,13 +207,16 @@ class ClienteDAO:
     def vincular_carro_ao_cliente(self, cliente_identificacao: str, carro_identificacao: str) -> bool:
         """Vincula um carro a um cliente"""
         with self.driver.session() as session:
-            return session.execute_write(self._vincular_carro_ao_cliente, cliente_identificacao, carro_identificacao)
+            success = session.execute_write(self._vincular_carro_ao_cliente, cliente_identificacao, carro_identificacao)
+        if success:
+            self.carro_collection.update_one({"identificacao": carro_identificacao}, alteracao_situacao(SITUACAO_VENDIDO))
+        return success
 
     def _vincular_carro_ao_cliente(self, tx, cliente_identificacao: str, carro_identificacao: str) -> bool:
         """Vincula um carro a um cliente"""
         query = """
-        MATCH (c:Cliente), (car:Carro)
-        WHERE c.identificacao = $cliente_identificacao AND car.identificacao = $carro_identificacao
+        MATCH (c:Cliente {identificacao: $cliente_identificacao})
+        MATCH (car:Carro {identificacao: $carro_identificacao})
         CREATE (c)-[:POSSUI]->(car)
         """
         result = tx.run(query, cliente_identificacao=cliente_identificacao, carro_identificacao=carro_identificacao)
@@ -114,7 +225,10 @@ class ClienteDAO:
     def desvincular_carro_do_cliente(self, cliente_identificacao: str, carro_identificacao: str) -> bool:
         """Remove a relação entre um cliente e um carro"""
         with self.driver.session() as session:
-            return session.execute_write(self._desvincular_carro_do_cliente, cliente_identificacao, carro_identificacao)
+            success = session.execute_write(self._desvincular_carro_do_cliente, cliente_identificacao, carro_identificacao)
+        if success:
+            self.carro_collection.update_one({"identificacao": carro_identificacao}, alteracao_situacao(None))
+        return success
 
     def _desvincular_carro_do_cliente(self, tx, cliente_identificacao: str, carro_identificacao: str) -> bool:
         """Remove a relação entre um cliente e um carro"""
@@ -126,11 +240,52 @@ class ClienteDAO:
         result = tx.run(query, cliente_identificacao=cliente_identificacao, carro_identificacao=carro_identificacao)
         return result.consume().counters.relationships_deleted > 0
 
+    def comprar_carro(self, cliente_identificacao: str, concessionaria_identificacao: str, carro_identificacao: str) -> ResultadoCompra:
+        """Transfere o carro da concessionária para o cliente em uma única transação"""
+        with self.driver.session() as session:
+            resultado = session.execute_write(self._comprar_carro, cliente_identificacao, concessionaria_identificacao, carro_identificacao)
+        if resultado == ResultadoCompra.SUCESSO:
+            carro = self.carro_collection.find_one_and_update({"identificacao": carro_identificacao}, alteracao_situacao(SITUACAO_VENDIDO),
+                                                              projection=projecao("carros", "resumo"))
+            if carro:
+                self.estoque_collection.update_one(*alteracao_remover(carro, concessionaria_identificacao))
+            self.cache_concessionaria_do_carro.invalidar(carro_identificacao)
+        return resultado
+
+    def _comprar_carro(self, tx, cliente_identificacao: str, concessionaria_identificacao: str, carro_identificacao: str) -> ResultadoCompra:
+        """Verifica o cadastro, remove OFERECE e cria POSSUI se o carro estiver disponível.
+        O SET inicial trava o nó do carro, então compras simultâneas do mesmo carro são serializadas"""
+        query = """
+        MATCH (car:Carro {identificacao: $carro_identificacao})
+        SET car.identificacao = car.identificacao
+        WITH car
+        MATCH (c:Cliente {identificacao: $cliente_identificacao})
+        MATCH (conc:Concessionaria {identificacao: $concessionaria_identificacao})
+        OPTIONAL MATCH (conc)-[oferta:OFERECE]->(car)
+        WITH c, car, oferta, oferta IS NOT NULL as disponivel, EXISTS { (c)-[:CADASTRADO]->(conc) } as cadastrado
+        FOREACH (_ IN CASE WHEN cadastrado AND disponivel THEN [1] ELSE [] END |
+            DELETE oferta
+            CREATE (c)-[:POSSUI]->(car)
+        )
+        RETURN cadastrado, disponivel
+        """
+        result = tx.run(query, cliente_identificacao=cliente_identificacao,
+                        concessionaria_identificacao=concessionaria_identificacao, carro_identificacao=carro_identificacao)
+        record = result.single()
+        if not record:
+            return ResultadoCompra.NAO_ENCONTRADO
+        if not record["cadastrado"]:
+            return ResultadoCompra.NAO_CADASTRADO
+        if not record["disponivel"]:
+            return ResultadoCompra.INDISPONIVEL
+        return ResultadoCompra.SUCESSO
+
     def atualizar_cliente(self, identificacao: str, cliente_update: Cliente) -> bool:
         """Atualiza os dados de um cliente no MongoDB"""
         cliente_data = cliente_update.to_dict()
         cliente_data["identificacao"] = identificacao
-        result = self.mongo_collection.replace_one({"identificacao": identificacao}, cliente_data)
+        result = escrita_imediata(self.mongo_collection).replace_one({"identificacao": identificacao}, cliente_data)
+        self.cache.invalidar(identificacao)
         return result.matched_count > 0
 
     def cadastrar_cliente_concessionaria(self, cliente_identificacao: str, concessionaria_identificacao: str) -> bool:
@@ -141,8 +296,8 @@ class ClienteDAO:
     def _cadastrar_cliente_concessionaria(self, tx, cliente_identificacao: str, concessionaria_identificacao: str) -> bool:
         """Cadastra um cliente em uma concessionária"""
         query = """
-        MATCH (c:Cliente), (conc:Concessionaria)
-        WHERE c.identificacao = $cliente_identificacao AND conc.identificacao = $concessionaria_identificacao
+        MATCH (c:Cliente {identificacao: $cliente_identificacao})
+        MATCH (conc:Concessionaria {identificacao: $concessionaria_identificacao})
         CREATE (c)-[:CADASTRADO]->(conc)
         """
         result = tx.run(query, cliente_identificacao=cliente_identificacao, concessionaria_identificacao=concessionaria_identificacao)
@@ -1,81 +1,138 @@
 from neo4j import GraphDatabase
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from models.concessionaria import Concessionaria
 from models.carro import Carro
 from data.carros_padrao import MODELOS_CARROS, PREFIXOS_CRLV
 import random
 import uuid
-from config.config import NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, MONGO_URI
-from config.database import Database
+from config.config import CARROS_POR_CONCESSIONARIA, LEITURA_PARALELA
+from config.database import obter_database, liberar_database
+from config.escrita_adiada import escrita_imediata
+from config.instrumentacao import instrumentar_dao
+from config.schema import COLACAO_SEM_CAIXA, projecao
+from daos.hidratacao import buscar_documentos_em_lotes, paginar_documentos
+from daos.lote import criar_em_lote
+from daos.cache import obter_cache
+from daos.estoque import SITUACAO_ESTOQUE, alteracao_adicionar, alteracao_remover, alteracao_situacao, limpar_contagens, montar_estoque
+from daos.recomendacao_dao import propriedades_do_carro
+from daos.paralelo import buscar_em_paralelo, ler_neo4j, obter_medidor
 
+def gerar_carro_aleatorio() -> Carro:
+    """Sorteia um modelo padrão e gera um CRLV para ele"""
+    carro_data = random.choice(MODELOS_CARROS)
+    crlv = f"{PREFIXOS_CRLV[carro_data['fabricante']]}-{random.randint(1000, 9999)}"
+    return Carro(
+        modelo=carro_data["modelo"],
+        ano=carro_data["ano"],
+        fabricante=carro_data["fabricante"],
+        crlv=crlv
+    )
+
+def consulta_carro_em_estoque(identificacao: str, modelo: str, fabricante: str) -> Tuple[dict, dict]:
+    """Filtro e projeção que trazem do estoque só o primeiro carro do modelo e fabricante (use COLACAO_SEM_CAIXA)"""
+    filtro = {"identificacao": identificacao, "carros": {"$elemMatch": {"modelo": modelo, "fabricante": fabricante}}}
+    return filtro, {"_id": 0, "carros.$": 1}
+
+@instrumentar_dao
 class ConcessionariaDAO:
-    def __init__(self):
-        self.database = Database(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, MONGO_URI)
+    def __init__(self, leitura_paralela: Optional[bool] = None):
+        self.database = obter_database()
         self.driver = self.database.driver
         self.mongo_collection = self.database.mongo_db["concessionarias"]
         self.carro_collection = self.database.mongo_db["carros"]
+        self.estoque_collection = self.database.mongo_db["estoques"]
+        self.identificacoes_sem_documento = []
+        self.cache = obter_cache("concessionarias")
+        self.leitura_paralela = LEITURA_PARALELA if leitura_paralela is None else leitura_paralela
+        self.medidor_leitura_paralela = obter_medidor("concessionarias")
+        self.cache_carros = obter_cache("carros")
+        self.cache_concessionaria_do_carro = obter_cache("concessionaria_do_carro")
 
     def close(self):
-        self.database.close()
+        """Devolve as conexões ao pool compartilhado"""
+        if self.database is not None:
+            liberar_database()
+            self.database = None
 
-    def criar_concessionaria(self, concessionaria: Concessionaria) -> str:
-        """Cria uma nova concessionária no Neo4j e MongoDB, cria e vincula 10 carros, e retorna a identificacao da concessionária"""
+    def criar_concessionaria(self, concessionaria: Concessionaria, quantidade_carros: Optional[int] = None) -> str:
+        """Cria uma nova concessionária no Neo4j e MongoDB com um estoque inicial de carros aleatórios
+        (CARROS_POR_CONCESSIONARIA por padrão), e retorna a identificacao da concessionária"""
+        if quantidade_carros is None:
+            quantidade_carros = CARROS_POR_CONCESSIONARIA
         identificacao = str(uuid.uuid4())
+        # Salvar dados da concessionária no MongoDB antes do Neo4j, validando o nome único
+        concessionaria_data = concessionaria.to_dict()
+        concessionaria_data["identificacao"] = identificacao
+        escrita_imediata(self.mongo_collection).insert_one(concessionaria_data)
+        carros = [gerar_carro_aleatorio() for _ in range(quantidade_carros)]
+        for carro in carros:
+            carro.identificacao = str(uuid.uuid4())
+        nos_carros = [dict(propriedades_do_carro(carro.to_dict()), identificacao=carro.identificacao) for carro in carros]
+        carros_identificacoes = [carro.identificacao for carro in carros]
         with self.driver.session() as session:
-            session.execute_write(self._criar_concessionaria, identificacao)
-            # Salvar dados da concessionária no MongoDB
-            concessionaria_data = concessionaria.to_dict()
-            concessionaria_data["identificacao"] = identificacao
-            self.mongo_collection.insert_one(concessionaria_data)
-            # Criar e vincular 10 carros aleatórios
-            carros = []
-            for _ in range(10):
-                carro_data = random.choice(MODELOS_CARROS)
-                crlv = f"{PREFIXOS_CRLV[carro_data['fabricante']]}-{random.randint(1000, 9999)}"
-                carro = Carro(
-                    modelo=carro_data["modelo"],
-                    ano=carro_data["ano"],
-                    fabricante=carro_data["fabricante"],
-                    crlv=crlv
-                )
-                carros.append(carro)
-            carros_identificacoes = session.execute_write(self._criar_e_vincular_carros, identificacao, carros)
-            # Salvar carros no MongoDB
-            for carro, carro_identificacao in zip(carros, carros_identificacoes):
-                carro_data = carro.to_dict()
-                carro_data["identificacao"] = carro_identificacao
-                self.carro_collection.insert_one(carro_data)
-            return identificacao
-
-    def _criar_concessionaria(self, tx, identificacao: str):
-        """Cria uma concessionária no Neo4j com a identificacao fornecida"""
-        query = "CREATE (c:Concessionaria {identificacao: $identificacao})"
-        tx.run(query, identificacao=identificacao)
-
-    def _criar_e_vincular_carros(self, tx, concessionaria_identificacao: str, carros: List[Carro]) -> List[str]:
-        """Cria 10 carros e vincula à concessionária"""
-        carros_identificacoes = []
-        for _ in carros:
-            carro_identificacao = str(uuid.uuid4())
-            query = "CREATE (c:Carro {identificacao: $identificacao})"
-            tx.run(query, identificacao=carro_identificacao)
-            carros_identificacoes.append(carro_identificacao)
-            # Vincula o carro à concessionária
-            query = """
-            MATCH (c:Concessionaria), (car:Carro)
-            WHERE c.identificacao = $concessionaria_identificacao AND car.identificacao = $carro_identificacao
-            CREATE (c)-[:OFERECE]->(car)
-            """
-            tx.run(query, concessionaria_identificacao=concessionaria_identificacao, carro_identificacao=carro_identificacao)
-        return carros_identificacoes
+            try:
+                session.execute_write(self._criar_concessionaria, identificacao, nos_carros)
+            except Exception:
+                # A transação do Neo4j foi desfeita; resta remover o documento já gravado
+                self._desfazer_criacao(identificacao, carros_identificacoes)
+                raise
+            # Salvar carros no MongoDB (sem adiar, para saber aqui se falhou)
+            carros_data = [dict(carro.to_dict(), situacao=SITUACAO_ESTOQUE) for carro in carros]
+            try:
+                if carros_data:
+                    escrita_imediata(self.carro_collection).insert_many(carros_data, ordered=False)
+            except Exception:
+                session.execute_write(self._remover_concessionaria_e_carros, identificacao, carros_identificacoes)
+                self._desfazer_criacao(identificacao, carros_identificacoes)
+                raise
+        self.estoque_collection.replace_one({"identificacao": identificacao}, montar_estoque(identificacao, carros_data), upsert=True)
+        return identificacao
+
+    def _criar_concessionaria(self, tx, identificacao: str, carros: List[dict]):
+        """Cria uma concessionária no Neo4j e os carros que ela oferece em uma única instrução"""
+        query = """
+        CREATE (c:Concessionaria {identificacao: $identificacao})
+        WITH c
+        UNWIND $carros AS carro
+        CREATE (c)-[:OFERECE]->(:Carro {identificacao: carro.identificacao, chave_modelo: carro.chave_modelo})
+        """
+        tx.run(query, identificacao=identificacao, carros=carros)
+
+    def _remover_concessionaria_e_carros(self, tx, identificacao: str, carros_identificacoes: List[str]):
+        """Remove do Neo4j a concessionária e os carros criados com ela"""
+        tx.run("MATCH (n:Carro) WHERE n.identificacao IN $identificacoes DETACH DELETE n", identificacoes=carros_identificacoes)
+        self._remover_concessionaria(tx, identificacao)
+
+    def _desfazer_criacao(self, identificacao: str, carros_identificacoes: List[str]):
+        """Remove do MongoDB o documento da concessionária e os dos carros que chegaram a ser gravados"""
+        escrita_imediata(self.mongo_collection).delete_one({"identificacao": identificacao})
+        if carros_identificacoes:
+            escrita_imediata(self.carro_collection).delete_many({"identificacao": {"$in": carros_identificacoes}})
+
+    def criar_concessionarias_em_lote(self, concessionarias: List[Concessionaria]) -> List[str]:
+        """Cria várias concessionárias com uma instrução no Neo4j e um insert_many no MongoDB, sem estoque inicial.
+        Retorna as identificacoes das que foram criadas"""
+        documentos = [concessionaria.to_dict() for concessionaria in concessionarias]
+        return criar_em_lote(self.driver, self.mongo_collection, "Concessionaria", documentos)
 
     def buscar_concessionaria(self, identificacao: str) -> Optional[Concessionaria]:
+        """Busca uma concessionária pela identificacao, passando pelo cache"""
+        return self.cache.obter_ou_carregar(identificacao, lambda: self._carregar_concessionaria(identificacao))
+
+    def _carregar_concessionaria(self, identificacao: str) -> Optional[Concessionaria]:
         """Busca uma concessionária pela identificacao no Neo4j e MongoDB"""
+        if self.leitura_paralela:
+            neo4j_result, mongo_data = buscar_em_paralelo(
+                lambda: ler_neo4j(self.driver, self._buscar_concessionaria, identificacao),
+                lambda: self.mongo_collection.find_one({"identificacao": identificacao}, projecao("concessionarias")),
+                self.medidor_leitura_paralela
+            )
+            return Concessionaria.from_dict(mongo_data) if neo4j_result and mongo_data else None
         with self.driver.session() as session:
             neo4j_result = session.execute_read(self._buscar_concessionaria, identificacao)
             if neo4j_result:
                 # Buscar dados completos no MongoDB
-                mongo_data = self.mongo_collection.find_one({"identificacao": identificacao})
+                mongo_data = self.mongo_collection.find_one({"identificacao": identificacao}, projecao("concessionarias"))
                 if mongo_data:
                     return Concessionaria.from_dict(mongo_data)
             return None
@@ -89,16 +146,25 @@ class ConcessionariaDAO:
             return Concessionaria(identificacao=record["identificacao"])
         return None
 
-    def buscar_todas_concessionarias(self) -> List[Concessionaria]:
-        """Retorna todas as concessionárias do Neo4j e MongoDB"""
+    def buscar_concessionarias(self, identificacoes: Iterable[str], campos: str = "resumo") -> Dict[str, Concessionaria]:
+        """Retorna as concessionárias das identificacoes por identificacao, lidas do MongoDB em lote ($in)"""
+        documentos, _ = buscar_documentos_em_lotes(self.mongo_collection, list(identificacoes), projecao=projecao("concessionarias", campos))
+        return {concessionaria.identificacao: concessionaria for concessionaria in Concessionaria.from_documentos(documentos)}
+
+    def buscar_concessionaria_por_nome(self, nome: str, campos: str = "completo") -> Optional[Concessionaria]:
+        """Busca uma concessionária pelo nome, sem diferenciar maiúsculas, usando o índice único de nome.
+        campos escolhe a projeção de config.schema.PROJECOES ("completo", "resumo" ou "existencia")"""
+        mongo_data = self.mongo_collection.find_one({"nome": nome}, projecao("concessionarias", campos), collation=COLACAO_SEM_CAIXA)
+        return Concessionaria.from_dict(mongo_data) if mongo_data else None
+
+    def buscar_todas_concessionarias(self, tamanho_lote: Optional[int] = None, campos: str = "completo") -> List[Concessionaria]:
+        """Retorna todas as concessionárias do Neo4j e MongoDB, hidratando os documentos em lotes"""
         with self.driver.session() as session:
             neo4j_concessionarias = session.execute_read(self._buscar_todas_concessionarias)
-            concessionarias = []
-            for conc in neo4j_concessionarias:
-                mongo_data = self.mongo_collection.find_one({"identificacao": conc.identificacao})
-                if mongo_data:
-                    concessionarias.append(Concessionaria.from_dict(mongo_data))
-            return concessionarias
+        identificacoes = [conc.identificacao for conc in neo4j_concessionarias]
+        documentos, self.identificacoes_sem_documento = buscar_documentos_em_lotes(self.mongo_collection, identificacoes, tamanho_lote,
+                                                                                       projecao("concessionarias", campos))
+        return Concessionaria.from_documentos(documentos)
 
     def _buscar_todas_concessionarias(self, tx) -> List[Concessionaria]:
         """Retorna todas as concessionárias do Neo4j"""
@@ -106,6 +172,22 @@ class ConcessionariaDAO:
         result = tx.run(query)
         return [Concessionaria(identificacao=record["identificacao"]) for record in result]
 
+    def iterar_paginas_concessionarias(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                       campos: str = "completo") -> Iterator[Tuple[List[Concessionaria], Optional[str]]]:
+        """Percorre as concessionárias em páginas ordenadas por identificacao, sem carregar tudo em memória.
+        Cada página vem com o cursor que retoma a listagem a partir da página seguinte"""
+        self.identificacoes_sem_documento = []
+        for documentos, ausentes, proximo_cursor in paginar_documentos(self.driver, "Concessionaria", self.mongo_collection, tamanho_pagina, cursor,
+                                                                           projecao("concessionarias", campos)):
+            self.identificacoes_sem_documento.extend(ausentes)
+            yield Concessionaria.from_documentos(documentos), proximo_cursor
+
+    def iterar_concessionarias(self, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                               campos: str = "completo") -> Iterator[Concessionaria]:
+        """Percorre as concessionárias um a um, em ordem de identificacao, buscando uma página por vez"""
+        for pagina, _ in self.iterar_paginas_concessionarias(tamanho_pagina, cursor, campos):
+            yield from pagina
+
     def remover_concessionaria(self, identificacao: str) -> bool:
         """Remove uma concessionária pela identificacao do Neo4j e MongoDB"""
         with self.driver.session() as session:
@@ -114,9 +196,12 @@ class ConcessionariaDAO:
             success = session.execute_write(self._remover_concessionaria, identificacao)
             if success:
                 self.mongo_collection.delete_one({"identificacao": identificacao})
+                self.estoque_collection.delete_one({"identificacao": identificacao})
                 # Remover carros associados do MongoDB
-                for carro_identificacao in carros_identificacoes:
-                    self.carro_collection.delete_one({"identificacao": carro_identificacao})
+                self.carro_collection.delete_many({"identificacao": {"$in": carros_identificacoes}})
+                self.cache.invalidar(identificacao)
+                self.cache_carros.invalidar(*carros_identificacoes)
+                self.cache_concessionaria_do_carro.invalidar(*carros_identificacoes)
             return success
 
     def _remover_concessionaria(self, tx, identificacao: str) -> bool:
@@ -140,16 +225,85 @@ class ConcessionariaDAO:
         result = tx.run(query, identificacao=identificacao)
         return [record["identificacao"] for record in result]
 
+    def buscar_carros_das_concessionarias(self, identificacoes: List[str]) -> Dict[str, List[str]]:
+        """buscar_carros_da_concessionaria para várias concessionárias, com uma única consulta"""
+        if not identificacoes:
+            return {}
+        with self.driver.session() as session:
+            return dict(session.execute_read(self._buscar_concessionarias_com_carros, identificacoes))
+
+    def buscar_estoques(self, identificacoes: List[str]) -> Dict[str, dict]:
+        """Retorna o estoque materializado de cada concessionária ({identificacao, carros, total,
+        por_fabricante, por_ano}) com uma leitura em lote na coleção estoques. Os estoques que ainda
+        não existem (ex.: concessionárias importadas em lote) são reconstruídos a partir do Neo4j"""
+        documentos, ausentes = buscar_documentos_em_lotes(self.estoque_collection, identificacoes, projecao=projecao("estoques"))
+        if ausentes:
+            self.reconstruir_estoques(ausentes)
+            documentos.extend(buscar_documentos_em_lotes(self.estoque_collection, ausentes, projecao=projecao("estoques"))[0])
+        estoques = {}
+        for documento in documentos:
+            documento["carros"] = Carro.from_documentos(documento["carros"])
+            estoques[documento["identificacao"]] = limpar_contagens(documento)
+        return estoques
+
+    def buscar_estoque(self, identificacao: str) -> Optional[dict]:
+        """Retorna o estoque materializado da concessionária, com um único documento lido"""
+        return self.buscar_estoques([identificacao]).get(identificacao)
+
+    def reconstruir_estoques(self, identificacoes: Optional[List[str]] = None) -> int:
+        """Recalcula o estoque materializado a partir das relações OFERECE do Neo4j, para as
+        concessionárias informadas ou para todas. Retorna quantos estoques foram gravados"""
+        with self.driver.session() as session:
+            registros = session.execute_read(self._buscar_concessionarias_com_carros, identificacoes)
+        carros_identificacoes = [carro for _, carros in registros for carro in carros]
+        carros_documentos, _ = buscar_documentos_em_lotes(self.carro_collection, carros_identificacoes,
+                                                          projecao=projecao("carros", "resumo"))
+        carros = {documento["identificacao"]: documento for documento in carros_documentos}
+        for identificacao, carros_da_concessionaria in registros:
+            estoque = montar_estoque(identificacao, [carros[carro] for carro in carros_da_concessionaria if carro in carros])
+            self.estoque_collection.replace_one({"identificacao": identificacao}, estoque, upsert=True)
+        return len(registros)
+
+    def _buscar_concessionarias_com_carros(self, tx, identificacoes: Optional[List[str]]) -> List[Tuple[str, List[str]]]:
+        """Retorna a identificacao de cada concessionária (todas, se identificacoes for None)
+        com as identificacoes dos carros que oferece"""
+        query = """
+        MATCH (c:Concessionaria)
+        WHERE $identificacoes IS NULL OR c.identificacao IN $identificacoes
+        OPTIONAL MATCH (c)-[:OFERECE]->(car:Carro)
+        RETURN c.identificacao as identificacao, collect(car.identificacao) as carros
+        """
+        result = tx.run(query, identificacoes=identificacoes)
+        return [(record["identificacao"], record["carros"]) for record in result]
+
+    def buscar_carro_em_estoque(self, identificacao: str, modelo: str, fabricante: str) -> Optional[Carro]:
+        """Busca um carro do modelo e fabricante no estoque materializado da concessionária, com o filtro
+        feito pelo MongoDB sem diferenciar maiúsculas. A compra confere no Neo4j se o carro ainda está disponível"""
+        filtro, projecao_carro = consulta_carro_em_estoque(identificacao, modelo, fabricante)
+        documento = self.estoque_collection.find_one(filtro, projecao_carro, collation=COLACAO_SEM_CAIXA)
+        if documento is None and self.estoque_collection.find_one({"identificacao": identificacao}, projecao("estoques", "existencia")) is None:
+            # Estoque ainda não materializado (ex.: concessionária importada em lote)
+            if self.reconstruir_estoques([identificacao]):
+                documento = self.estoque_collection.find_one(filtro, projecao_carro, collation=COLACAO_SEM_CAIXA)
+        return Carro.from_dict(documento["carros"][0]) if documento else None
+
     def vincular_carro_a_concessionaria(self, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
         """Vincula um carro a uma concessionária"""
         with self.driver.session() as session:
-            return session.execute_write(self._vincular_carro_a_concessionaria, concessionaria_identificacao, carro_identificacao)
+            success = session.execute_write(self._vincular_carro_a_concessionaria, concessionaria_identificacao, carro_identificacao)
+        if success:
+            carro = self.carro_collection.find_one_and_update({"identificacao": carro_identificacao}, alteracao_situacao(SITUACAO_ESTOQUE),
+                                                              projection=projecao("carros", "resumo"))
+            if carro:
+                self.estoque_collection.update_one(*alteracao_adicionar(concessionaria_identificacao, carro))
+        self.cache_concessionaria_do_carro.invalidar(carro_identificacao)
+        return success
 
     def _vincular_carro_a_concessionaria(self, tx, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
         """Vincula um carro a uma concessionária"""
         query = """
-        MATCH (c:Concessionaria), (car:Carro)
-        WHERE c.identificacao = $concessionaria_identificacao AND car.identificacao = $carro_identificacao
+        MATCH (c:Concessionaria {identificacao: $concessionaria_identificacao})
+        MATCH (car:Carro {identificacao: $carro_identificacao})
         CREATE (c)-[:OFERECE]->(car)
         """
         result = tx.run(query, concessionaria_identificacao=concessionaria_identificacao, carro_identificacao=carro_identificacao)
@@ -158,7 +312,14 @@ class ConcessionariaDAO:
     def desvincular_carro_da_concessionaria(self, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
         """Remove a relação entre uma concessionária e um carro"""
         with self.driver.session() as session:
-            return session.execute_write(self._desvincular_carro_da_concessionaria, concessionaria_identificacao, carro_identificacao)
+            success = session.execute_write(self._desvincular_carro_da_concessionaria, concessionaria_identificacao, carro_identificacao)
+        if success:
+            carro = self.carro_collection.find_one_and_update({"identificacao": carro_identificacao}, alteracao_situacao(None),
+                                                              projection=projecao("carros", "resumo"))
+            if carro:
+                self.estoque_collection.update_one(*alteracao_remover(carro, concessionaria_identificacao))
+        self.cache_concessionaria_do_carro.invalidar(carro_identificacao)
+        return success
 
     def _desvincular_carro_da_concessionaria(self, tx, concessionaria_identificacao: str, carro_identificacao: str) -> bool:
         """Remove a relação entre uma concessionária e um carro"""
@@ -174,5 +335,6 @@ class ConcessionariaDAO:
         """Atualiza os dados de uma concessionária no MongoDB"""
         concessionaria_data = concessionaria_update.to_dict()
         concessionaria_data["identificacao"] = identificacao
-        result = self.mongo_collection.replace_one({"identificacao": identificacao}, concessionaria_data)
+        result = escrita_imediata(self.mongo_collection).replace_one({"identificacao": identificacao}, concessionaria_data)
+        self.cache.invalidar(identificacao)
         return result.matched_count > 0
\ No newline at end of file
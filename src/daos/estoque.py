@@ -0,0 +1,71 @@
+from typing import Iterable, Optional, Tuple
+
+# Estoque materializado de cada concessionária na coleção estoques do MongoDB:
+# {identificacao, carros: [{identificacao, modelo, fabricante, ano, crlv}], total, por_fabricante, por_ano}.
+# As funções abaixo só montam documentos e alterações, para servirem tanto ao PyMongo quanto ao Motor.
+
+CAMPOS_RESUMO = ("identificacao", "modelo", "fabricante", "ano", "crlv")
+
+# Situação do carro gravada no próprio documento da coleção carros, para a busca filtrar a
+# disponibilidade no mesmo índice: "estoque" (oferecido), "vendido" (de um cliente) ou ausente (livre)
+SITUACAO_ESTOQUE = "estoque"
+SITUACAO_VENDIDO = "vendido"
+
+FILTROS_DISPONIBILIDADE = {
+    "estoque": {"situacao": SITUACAO_ESTOQUE},
+    "vendido": {"situacao": SITUACAO_VENDIDO},
+    "livre": {"situacao": {"$exists": False}},
+}
+
+def alteracao_situacao(situacao: Optional[str]) -> dict:
+    """Alteração que grava a situação do carro (None o deixa livre)"""
+    if situacao is None:
+        return {"$unset": {"situacao": ""}}
+    return {"$set": {"situacao": situacao}}
+
+def resumo_do_carro(documento: dict) -> dict:
+    """Campos do carro guardados no estoque"""
+    return {campo: documento.get(campo) for campo in CAMPOS_RESUMO}
+
+def _chave(valor) -> str:
+    """Chave de contagem válida como caminho do MongoDB (sem '.' nem '$' no início)"""
+    return str(valor).replace(".", "_").lstrip("$") or "_"
+
+def _contagens(carro: dict, sinal: int) -> dict:
+    return {
+        "total": sinal,
+        f"por_fabricante.{_chave(carro['fabricante'])}": sinal,
+        f"por_ano.{_chave(carro['ano'])}": sinal,
+    }
+
+def montar_estoque(identificacao: str, carros: Iterable[dict]) -> dict:
+    """Monta o documento de estoque completo a partir dos documentos dos carros"""
+    estoque = {"identificacao": identificacao, "carros": [], "total": 0, "por_fabricante": {}, "por_ano": {}}
+    for carro in carros:
+        resumo = resumo_do_carro(carro)
+        estoque["carros"].append(resumo)
+        estoque["total"] += 1
+        for campo, contagem in (("fabricante", "por_fabricante"), ("ano", "por_ano")):
+            chave = _chave(resumo[campo])
+            estoque[contagem][chave] = estoque[contagem].get(chave, 0) + 1
+    return estoque
+
+def alteracao_adicionar(identificacao: str, carro: dict) -> Tuple[dict, dict]:
+    """Filtro e alteração que incluem o carro no estoque, se ele ainda não estiver lá"""
+    resumo = resumo_do_carro(carro)
+    filtro = {"identificacao": identificacao, "carros.identificacao": {"$ne": resumo["identificacao"]}}
+    return filtro, {"$push": {"carros": resumo}, "$inc": _contagens(resumo, 1)}
+
+def alteracao_remover(carro: dict, identificacao: Optional[str] = None) -> Tuple[dict, dict]:
+    """Filtro e alteração que retiram o carro do estoque da concessionária (ou do estoque
+    em que ele estiver, se a concessionária não for informada)"""
+    filtro = {"carros.identificacao": carro["identificacao"]}
+    if identificacao:
+        filtro["identificacao"] = identificacao
+    return filtro, {"$pull": {"carros": {"identificacao": carro["identificacao"]}}, "$inc": _contagens(carro, -1)}
+
+def limpar_contagens(estoque: dict) -> dict:
+    """Descarta as contagens zeradas pelas remoções"""
+    for contagem in ("por_fabricante", "por_ano"):
+        estoque[contagem] = {chave: quantidade for chave, quantidade in estoque.get(contagem, {}).items() if quantidade > 0}
+    return estoque
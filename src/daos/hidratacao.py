@@ -0,0 +1,96 @@
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from config.config import MONGO_TAMANHO_LOTE, PAGINACAO_TAMANHO_PAGINA
+
+def buscar_documentos_em_lotes(collection, identificacoes: List[str], tamanho_lote: Optional[int] = None,
+                               projecao: Optional[dict] = None) -> Tuple[List[dict], List[str]]:
+    """Busca os documentos das identificacoes com uma consulta $in por lote, mantendo a ordem recebida.
+    Retorna os documentos encontrados e as identificacoes que existem no Neo4j mas não no MongoDB.
+    A projeção, se informada, precisa incluir a identificacao"""
+    tamanho_lote = tamanho_lote or MONGO_TAMANHO_LOTE
+    documentos = []
+    ausentes = []
+    for inicio in range(0, len(identificacoes), tamanho_lote):
+        lote = identificacoes[inicio:inicio + tamanho_lote]
+        por_identificacao = {doc["identificacao"]: doc for doc in collection.find({"identificacao": {"$in": lote}}, projecao)}
+        for identificacao in lote:
+            documento = por_identificacao.get(identificacao)
+            if documento:
+                documentos.append(documento)
+            else:
+                ausentes.append(identificacao)
+    return documentos, ausentes
+
+def paginar_documentos(driver, label: str, collection, tamanho_pagina: Optional[int] = None,
+                       cursor: Optional[str] = None, projecao: Optional[dict] = None) -> Iterator[Tuple[List[dict], List[str], Optional[str]]]:
+    """Percorre os nós do rótulo em ordem de identificacao, uma página por vez (paginação por chave).
+    Para cada página retorna os documentos do MongoDB, as identificacoes sem documento e o cursor
+    que retoma a listagem após essa página (None na última)"""
+    tamanho_pagina = tamanho_pagina or PAGINACAO_TAMANHO_PAGINA
+    cursor = cursor or ""
+    while True:
+        with driver.session() as session:
+            identificacoes = session.execute_read(_buscar_pagina, label, cursor, tamanho_pagina)
+        if not identificacoes:
+            return
+        documentos, ausentes = buscar_documentos_em_lotes(collection, identificacoes, tamanho_pagina, projecao)
+        cursor = identificacoes[-1] if len(identificacoes) == tamanho_pagina else None
+        yield documentos, ausentes, cursor
+        if cursor is None:
+            return
+
+def _buscar_pagina(tx, label: str, cursor: str, tamanho_pagina: int) -> List[str]:
+    """Retorna as próximas identificacoes do rótulo após o cursor, usando o índice da constraint"""
+    query = f"""
+    MATCH (n:{label})
+    WHERE n.identificacao > $cursor
+    RETURN n.identificacao as identificacao
+    ORDER BY n.identificacao
+    LIMIT $tamanho_pagina
+    """
+    result = tx.run(query, cursor=cursor, tamanho_pagina=tamanho_pagina)
+    return [record["identificacao"] for record in result]
+
+async def buscar_documentos_em_lotes_async(collection, identificacoes: List[str], tamanho_lote: Optional[int] = None,
+                                           projecao: Optional[dict] = None) -> Tuple[List[dict], List[str]]:
+    """Versão assíncrona de buscar_documentos_em_lotes, para coleções do Motor"""
+    tamanho_lote = tamanho_lote or MONGO_TAMANHO_LOTE
+    documentos = []
+    ausentes = []
+    for inicio in range(0, len(identificacoes), tamanho_lote):
+        lote = identificacoes[inicio:inicio + tamanho_lote]
+        encontrados = await collection.find({"identificacao": {"$in": lote}}, projecao).to_list(length=None)
+        por_identificacao = {doc["identificacao"]: doc for doc in encontrados}
+        for identificacao in lote:
+            documento = por_identificacao.get(identificacao)
+            if documento:
+                documentos.append(documento)
+            else:
+                ausentes.append(identificacao)
+    return documentos, ausentes
+
+async def paginar_documentos_async(driver, label: str, collection, tamanho_pagina: Optional[int] = None, cursor: Optional[str] = None,
+                                   projecao: Optional[dict] = None) -> AsyncIterator[Tuple[List[dict], List[str], Optional[str]]]:
+    """Versão assíncrona de paginar_documentos, para o driver assíncrono do Neo4j e coleções do Motor"""
+    tamanho_pagina = tamanho_pagina or PAGINACAO_TAMANHO_PAGINA
+    cursor = cursor or ""
+    while True:
+        async with driver.session() as session:
+            identificacoes = await session.execute_read(_buscar_pagina_async, label, cursor, tamanho_pagina)
+        if not identificacoes:
+            return
+        documentos, ausentes = await buscar_documentos_em_lotes_async(collection, identificacoes, tamanho_pagina, projecao)
+        cursor = identificacoes[-1] if len(identificacoes) == tamanho_pagina else None
+        yield documentos, ausentes, cursor
+        if cursor is None:
+            return
+
+async def _buscar_pagina_async(tx, label: str, cursor: str, tamanho_pagina: int) -> List[str]:
+    query = f"""
+    MATCH (n:{label})
+    WHERE n.identificacao > $cursor
+    RETURN n.identificacao as identificacao
+    ORDER BY n.identificacao
+    LIMIT $tamanho_pagina
+    """
+    result = await tx.run(query, cursor=cursor, tamanho_pagina=tamanho_pagina)
+    return [record["identificacao"] async for record in result]
@@ -0,0 +1,65 @@
+from typing import Callable, List, Optional
+import uuid
+from pymongo.errors import BulkWriteError
+from config.escrita_adiada import escrita_imediata
+
+def criar_em_lote(driver, collection, label: str, documentos: List[dict],
+                  propriedades: Optional[Callable[[dict], dict]] = None) -> List[str]:
+    """Cria os nós de um rótulo com um único UNWIND e grava os documentos com um insert_many não ordenado.
+    propriedades(documento) retorna as propriedades extras de cada nó, além da identificacao.
+    Documentos recusados pelo MongoDB (ex.: chave duplicada) têm o nó removido do Neo4j.
+    Retorna as identificacoes efetivamente criadas, na ordem recebida"""
+    if not documentos:
+        return []
+    for documento in documentos:
+        documento["identificacao"] = str(uuid.uuid4())
+    identificacoes = [documento["identificacao"] for documento in documentos]
+    nos = [dict(propriedades(documento) if propriedades else {}, identificacao=documento["identificacao"])
+           for documento in documentos]
+    with driver.session() as session:
+        session.execute_write(_criar_nos, label, nos)
+        try:
+            escrita_imediata(collection).insert_many(documentos, ordered=False)
+            return identificacoes
+        except BulkWriteError as e:
+            recusadas = {identificacoes[erro["index"]] for erro in e.details["writeErrors"]}
+            session.execute_write(_remover_nos, label, list(recusadas))
+            return [identificacao for identificacao in identificacoes if identificacao not in recusadas]
+
+async def criar_em_lote_async(driver, collection, label: str, documentos: List[dict],
+                              propriedades: Optional[Callable[[dict], dict]] = None) -> List[str]:
+    """Versão assíncrona de criar_em_lote, para o driver assíncrono do Neo4j e coleções do Motor"""
+    if not documentos:
+        return []
+    for documento in documentos:
+        documento["identificacao"] = str(uuid.uuid4())
+    identificacoes = [documento["identificacao"] for documento in documentos]
+    nos = [dict(propriedades(documento) if propriedades else {}, identificacao=documento["identificacao"])
+           for documento in documentos]
+    async with driver.session() as session:
+        await session.execute_write(_criar_nos_async, label, nos)
+        try:
+            await collection.insert_many(documentos, ordered=False)
+            return identificacoes
+        except BulkWriteError as e:
+            recusadas = {identificacoes[erro["index"]] for erro in e.details["writeErrors"]}
+            await session.execute_write(_remover_nos_async, label, list(recusadas))
+            return [identificacao for identificacao in identificacoes if identificacao not in recusadas]
+
+def _criar_nos(tx, label: str, nos: List[dict]):
+    """Cria um nó do rótulo para cada mapa de propriedades"""
+    query = f"UNWIND $nos AS no CREATE (n:{label}) SET n = no"
+    tx.run(query, nos=nos)
+
+def _remover_nos(tx, label: str, identificacoes: List[str]):
+    """Remove os nós do rótulo com as identificacoes fornecidas"""
+    query = f"MATCH (n:{label}) WHERE n.identificacao IN $identificacoes DETACH DELETE n"
+    tx.run(query, identificacoes=identificacoes)
+
+async def _criar_nos_async(tx, label: str, nos: List[dict]):
+    query = f"UNWIND $nos AS no CREATE (n:{label}) SET n = no"
+    await tx.run(query, nos=nos)
+
+async def _remover_nos_async(tx, label: str, identificacoes: List[str]):
+    query = f"MATCH (n:{label}) WHERE n.identificacao IN $identificacoes DETACH DELETE n"
+    await tx.run(query, identificacoes=identificacoes)
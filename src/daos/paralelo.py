@@ -0,0 +1,72 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+from config.config import LEITURA_PARALELA_THREADS
+
+class MedidorLatencia:
+    """Acumula quanto tempo as leituras paralelas economizaram em relação a rodar em série"""
+    def __init__(self):
+        self.leituras = 0
+        self.segundos_em_serie = 0.0  # soma das duas consultas, o que custaria em série
+        self.segundos_reais = 0.0
+        self._lock = threading.Lock()
+
+    def registrar(self, em_serie: float, real: float):
+        with self._lock:
+            self.leituras += 1
+            self.segundos_em_serie += em_serie
+            self.segundos_reais += real
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            economizado = self.segundos_em_serie - self.segundos_reais
+            return {
+                "leituras": self.leituras,
+                "ms_economizados": economizado * 1000,
+                "ms_economizados_por_leitura": economizado * 1000 / self.leituras if self.leituras else 0.0,
+            }
+
+_executor = None
+_medidores: Dict[str, MedidorLatencia] = {}
+_lock = threading.Lock()
+
+def _obter_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LEITURA_PARALELA_THREADS, thread_name_prefix="leitura")
+        return _executor
+
+def obter_medidor(nome: str) -> MedidorLatencia:
+    """Retorna o medidor compartilhado com o nome informado, criando-o no primeiro uso"""
+    with _lock:
+        if nome not in _medidores:
+            _medidores[nome] = MedidorLatencia()
+        return _medidores[nome]
+
+def estatisticas_leitura_paralela() -> Dict[str, dict]:
+    with _lock:
+        return {nome: medidor.estatisticas() for nome, medidor in _medidores.items()}
+
+def ler_neo4j(driver, funcao: Callable, *args):
+    """Executa uma função de leitura em uma sessão própria (sessões não são compartilhadas entre threads)"""
+    with driver.session() as session:
+        return session.execute_read(funcao, *args)
+
+def _cronometrar(consulta: Callable) -> Tuple[object, float]:
+    inicio = time.perf_counter()
+    resultado = consulta()
+    return resultado, time.perf_counter() - inicio
+
+def buscar_em_paralelo(consultar_neo4j: Callable, consultar_mongo: Callable, medidor: MedidorLatencia) -> Tuple[object, object]:
+    """Roda a consulta do MongoDB em outra thread enquanto a do Neo4j roda nesta,
+    e retorna os dois resultados. Cabe a quem chama decidir a existência pelo Neo4j"""
+    inicio = time.perf_counter()
+    # O contexto é copiado para a outra thread manter o método do DAO na instrumentação
+    futuro_mongo = _obter_executor().submit(contextvars.copy_context().run, _cronometrar, consultar_mongo)
+    neo4j_result, tempo_neo4j = _cronometrar(consultar_neo4j)
+    mongo_data, tempo_mongo = futuro_mongo.result()
+    medidor.registrar(tempo_neo4j + tempo_mongo, time.perf_counter() - inicio)
+    return neo4j_result, mongo_data
@@ -0,0 +1,189 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from pymongo import ReplaceOne
+from config.config import MONGO_TAMANHO_LOTE, RECOMENDACOES_INTERVALO, RECOMENDACOES_LIMITE, RECOMENDACOES_PRECALCULADAS
+from config.database import obter_database, liberar_database
+from config.instrumentacao import instrumentar_dao
+from config.schema import projecao
+from daos.estoque import resumo_do_carro
+from daos.hidratacao import buscar_documentos_em_lotes
+
+def chave_modelo(fabricante, modelo) -> Optional[str]:
+    """Fabricante e modelo sem caixa, gravados nos nós :Carro para o Neo4j agrupar carros do mesmo modelo"""
+    if not fabricante or not modelo:
+        return None
+    return f"{str(fabricante).strip().casefold()}|{str(modelo).strip().casefold()}"
+
+def propriedades_do_carro(documento: dict) -> dict:
+    """Propriedades do nó :Carro derivadas do documento do carro no MongoDB"""
+    return {"chave_modelo": chave_modelo(documento.get("fabricante"), documento.get("modelo"))}
+
+@instrumentar_dao
+class RecomendacaoDAO:
+    def __init__(self, precalculadas: Optional[bool] = None):
+        self.database = obter_database()
+        self.driver = self.database.driver
+        self.mongo_collection = self.database.mongo_db["recomendacoes"]
+        self.carro_collection = self.database.mongo_db["carros"]
+        self.precalculadas = RECOMENDACOES_PRECALCULADAS if precalculadas is None else precalculadas
+
+    def close(self):
+        """Devolve as conexões ao pool compartilhado"""
+        if self.database is not None:
+            liberar_database()
+            self.database = None
+
+    def recomendar_carros(self, cliente_identificacao: str, limite: int = RECOMENDACOES_LIMITE) -> List[dict]:
+        """Carros em estoque nas concessionárias em que o cliente está cadastrado, dos modelos que outros
+        clientes com carros do mesmo modelo que os dele também compraram. Cada item traz identificacao,
+        modelo, fabricante, ano, concessionaria e pontuacao (quantos desses clientes compraram o modelo).
+        Com as recomendações pré-calculadas é uma leitura indexada da coleção recomendacoes, que pode estar
+        até RECOMENDACOES_INTERVALO segundos atrasada; clientes ainda sem documento consultam o Neo4j"""
+        if self.precalculadas:
+            documento = self.mongo_collection.find_one({"identificacao": cliente_identificacao}, projecao("recomendacoes", "resumo"))
+            if documento is not None:
+                return documento["carros"][:limite]
+        with self.driver.session() as session:
+            registros = session.execute_read(self._recomendar_carros, cliente_identificacao, limite)
+        return self._hidratar(registros, self._buscar_resumos(registros))
+
+    def _recomendar_carros(self, tx, cliente_identificacao: str, limite: int) -> List[dict]:
+        """Percorre, em uma única consulta, cliente -> seus modelos -> outros donos desses modelos -> modelos
+        que eles compraram -> carros desses modelos oferecidos nas concessionárias do cliente"""
+        query = """
+        MATCH (cli:Cliente {identificacao: $identificacao})-[:POSSUI]->(meu:Carro)
+        WITH cli, collect(DISTINCT meu.chave_modelo) as meus_modelos
+        MATCH (semelhante:Carro)<-[:POSSUI]-(outro:Cliente)-[:POSSUI]->(comprado:Carro)
+        WHERE semelhante.chave_modelo IN meus_modelos AND outro <> cli AND NOT comprado.chave_modelo IN meus_modelos
+        WITH cli, comprado.chave_modelo as chave_modelo, count(DISTINCT outro) as pontuacao
+        MATCH (cli)-[:CADASTRADO]->(conc:Concessionaria)-[:OFERECE]->(car:Carro {chave_modelo: chave_modelo})
+        WITH conc, chave_modelo, pontuacao, min(car.identificacao) as carro
+        RETURN carro, conc.identificacao as concessionaria, pontuacao
+        ORDER BY pontuacao DESC, carro
+        LIMIT $limite
+        """
+        result = tx.run(query, identificacao=cliente_identificacao, limite=limite)
+        return [record.data() for record in result]
+
+    def _buscar_resumos(self, registros: List[dict]) -> Dict[str, dict]:
+        identificacoes = list({registro["carro"] for registro in registros})
+        documentos, _ = buscar_documentos_em_lotes(self.carro_collection, identificacoes, projecao=projecao("carros", "resumo"))
+        return {documento["identificacao"]: documento for documento in documentos}
+
+    def _hidratar(self, registros: List[dict], resumos: Dict[str, dict]) -> List[dict]:
+        """Junta o resumo do MongoDB a cada carro recomendado, na ordem do Neo4j"""
+        return [dict(resumo_do_carro(resumos[registro["carro"]]), concessionaria=registro["concessionaria"],
+                     pontuacao=registro["pontuacao"])
+                for registro in registros if registro["carro"] in resumos]
+
+    def recalcular_recomendacoes(self, limite: int = RECOMENDACOES_LIMITE) -> int:
+        """Recalcula a coleção recomendacoes para todos os clientes (os sem recomendação ficam com a lista
+        vazia, para também custarem uma só leitura). Retorna quantos clientes foram gravados"""
+        with self.driver.session() as session:
+            por_cliente = session.execute_read(self._recomendar_para_todos, limite)
+        resumos = self._buscar_resumos([registro for registros in por_cliente.values() for registro in registros])
+        # Em milissegundos, a precisão com que o MongoDB guarda datas, para o $ne abaixo comparar igual
+        agora = datetime.now()
+        gerado_em = agora.replace(microsecond=agora.microsecond // 1000 * 1000)
+        operacoes = [ReplaceOne({"identificacao": cliente},
+                                {"identificacao": cliente, "carros": self._hidratar(registros, resumos), "gerado_em": gerado_em},
+                                upsert=True)
+                     for cliente, registros in por_cliente.items()]
+        for inicio in range(0, len(operacoes), MONGO_TAMANHO_LOTE):
+            self.mongo_collection.bulk_write(operacoes[inicio:inicio + MONGO_TAMANHO_LOTE], ordered=False)
+        # Clientes removidos desde o último cálculo
+        self.mongo_collection.delete_many({"gerado_em": {"$ne": gerado_em}})
+        return len(por_cliente)
+
+    def _recomendar_para_todos(self, tx, limite: int) -> Dict[str, List[dict]]:
+        """A consulta de recomendação de todos os clientes em uma só consulta: a subconsulta termina em um
+        collect sem agrupamento, que devolve a lista vazia para o cliente sem recomendação"""
+        query = """
+        MATCH (cli:Cliente)
+        CALL {
+            WITH cli
+            MATCH (cli)-[:POSSUI]->(meu:Carro)
+            WITH cli, collect(DISTINCT meu.chave_modelo) as meus_modelos
+            MATCH (semelhante:Carro)<-[:POSSUI]-(outro:Cliente)-[:POSSUI]->(comprado:Carro)
+            WHERE semelhante.chave_modelo IN meus_modelos AND outro <> cli AND NOT comprado.chave_modelo IN meus_modelos
+            WITH cli, comprado.chave_modelo as chave_modelo, count(DISTINCT outro) as pontuacao
+            MATCH (cli)-[:CADASTRADO]->(conc:Concessionaria)-[:OFERECE]->(car:Carro {chave_modelo: chave_modelo})
+            WITH conc, chave_modelo, pontuacao, min(car.identificacao) as carro
+            ORDER BY pontuacao DESC, carro
+            LIMIT $limite
+            RETURN collect({carro: carro, concessionaria: conc.identificacao, pontuacao: pontuacao}) as carros
+        }
+        RETURN cli.identificacao as identificacao, carros
+        """
+        result = tx.run(query, limite=limite)
+        return {record["identificacao"]: record["carros"] for record in result}
+
+class AtualizadorRecomendacoes:
+    """Recalcula as recomendações pré-calculadas em uma thread de fundo: logo ao iniciar e depois a cada intervalo"""
+    def __init__(self, intervalo: float = RECOMENDACOES_INTERVALO):
+        self.intervalo = intervalo
+        self.execucoes = 0
+        self.ultima_execucao: Optional[datetime] = None
+        self.ultimo_erro: Optional[str] = None
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        if self.ativo:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="recomendacoes", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _executar(self):
+        while not self._parar.is_set():
+            dao = RecomendacaoDAO()
+            try:
+                dao.recalcular_recomendacoes()
+                self.execucoes += 1
+                self.ultima_execucao = datetime.now()
+                self.ultimo_erro = None
+            except Exception as e:
+                # Mantém a tabela anterior e tenta de novo no próximo intervalo
+                self.ultimo_erro = str(e)
+            finally:
+                dao.close()
+            self._parar.wait(self.intervalo)
+
+    def estado(self) -> dict:
+        return {
+            "ativo": self.ativo,
+            "intervalo_segundos": self.intervalo,
+            "execucoes": self.execucoes,
+            "ultima_execucao": self.ultima_execucao,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+_atualizador: Optional[AtualizadorRecomendacoes] = None
+
+def iniciar_atualizacao_recomendacoes(intervalo: Optional[float] = None) -> AtualizadorRecomendacoes:
+    """Inicia (uma vez por processo) o recálculo periódico das recomendações"""
+    global _atualizador
+    if _atualizador is None:
+        _atualizador = AtualizadorRecomendacoes(RECOMENDACOES_INTERVALO if intervalo is None else intervalo)
+    _atualizador.iniciar()
+    return _atualizador
+
+def parar_atualizacao_recomendacoes():
+    """Para o recálculo periódico, esperando a execução em andamento terminar"""
+    if _atualizador is not None:
+        _atualizador.parar()
+
+def estado_atualizacao_recomendacoes() -> Optional[dict]:
+    return _atualizador.estado() if _atualizador is not None else None
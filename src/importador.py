@@ -0,0 +1,191 @@
+"""Importação em massa de carros, clientes e concessionárias a partir de arquivos CSV ou JSONL.
+
+Uso:
+    python importador.py carros carros.csv
+    python importador.py clientes clientes.jsonl --lote 5000
+    python importador.py concessionarias concessionarias.csv --checkpoint conc.checkpoint
+
+O arquivo é lido em streaming e gravado em lotes (UNWIND no Neo4j e insert_many
+não ordenado no MongoDB). Após cada lote gravado o progresso é salvo no arquivo
+de checkpoint; rodar o mesmo comando novamente continua de onde parou. Um lote
+interrompido no meio da gravação pode ser gravado de novo ao retomar.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from typing import Iterator, Optional, Tuple
+from config.config import IMPORTACAO_MAXIMO_ERROS, IMPORTACAO_TAMANHO_LOTE
+from daos.carro_dao import CarroDAO, Carro
+from daos.cliente_dao import ClienteDAO, Cliente
+from daos.concessionaria_dao import ConcessionariaDAO, Concessionaria
+
+def _obrigatorio(valor, campo: str) -> str:
+    if valor is None or not str(valor).strip():
+        raise ValueError(f"campo '{campo}' é obrigatório")
+    return str(valor).strip()
+
+def validar_carro(linha: dict) -> Carro:
+    carro = Carro.from_dict(linha)
+    carro.identificacao = None
+    carro.modelo = _obrigatorio(carro.modelo, "modelo")
+    carro.fabricante = _obrigatorio(carro.fabricante, "fabricante")
+    carro.crlv = _obrigatorio(carro.crlv, "crlv")
+    ano = _obrigatorio(carro.ano, "ano")
+    try:
+        carro.ano = int(ano)
+    except ValueError:
+        raise ValueError(f"ano inválido: {ano}")
+    return carro
+
+def validar_cliente(linha: dict) -> Cliente:
+    try:
+        cliente = Cliente.from_dict(linha)
+    except (TypeError, ValueError):
+        raise ValueError(f"data_nascimento inválida: {linha.get('data_nascimento')}. Use YYYY-MM-DD")
+    cliente.identificacao = None
+    cliente.cpf = _obrigatorio(cliente.cpf, "cpf")
+    cliente.nome = _obrigatorio(cliente.nome, "nome")
+    cliente.nacionalidade = _obrigatorio(cliente.nacionalidade, "nacionalidade")
+    if cliente.data_nascimento is None:
+        raise ValueError("campo 'data_nascimento' é obrigatório")
+    return cliente
+
+def validar_concessionaria(linha: dict) -> Concessionaria:
+    concessionaria = Concessionaria.from_dict(linha)
+    concessionaria.identificacao = None
+    concessionaria.nome = _obrigatorio(concessionaria.nome, "nome")
+    return concessionaria
+
+# entidade -> (DAO, validação da linha, método de criação em lote)
+ENTIDADES = {
+    "carros": (CarroDAO, validar_carro, "criar_carros_em_lote"),
+    "clientes": (ClienteDAO, validar_cliente, "criar_clientes_em_lote"),
+    "concessionarias": (ConcessionariaDAO, validar_concessionaria, "criar_concessionarias_em_lote"),
+}
+
+def ler_linhas(arquivo: str, formato: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Lê o arquivo linha a linha, retornando (número da linha, dados, erro de leitura)"""
+    with open(arquivo, encoding="utf-8", newline="") as f:
+        if formato == "csv":
+            for numero, linha in enumerate(csv.DictReader(f), start=1):
+                yield numero, linha, None
+        else:
+            for numero, texto in enumerate(f, start=1):
+                if not texto.strip():
+                    continue
+                try:
+                    dados = json.loads(texto)
+                except json.JSONDecodeError as e:
+                    yield numero, None, f"JSON inválido: {e.msg}"
+                    continue
+                if isinstance(dados, dict):
+                    yield numero, dados, None
+                else:
+                    yield numero, None, f"a linha precisa ser um objeto JSON, não {type(dados).__name__}"
+
+def _ler_checkpoint(caminho: str, arquivo: str, entidade: str) -> dict:
+    if os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("arquivo") == os.path.abspath(arquivo) and checkpoint.get("entidade") == entidade:
+            return checkpoint
+    return {"arquivo": os.path.abspath(arquivo), "entidade": entidade, "linhas_processadas": 0, "importados": 0, "rejeitados": 0}
+
+def _salvar_checkpoint(caminho: str, checkpoint: dict):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporario, caminho)
+
+def importar(entidade: str, arquivo: str, formato: Optional[str] = None, tamanho_lote: Optional[int] = None,
+             checkpoint: Optional[str] = None) -> dict:
+    """Importa o arquivo para a entidade informada e retorna o resumo da importação"""
+    dao_cls, validar, metodo = ENTIDADES[entidade]
+    formato = formato or ("csv" if arquivo.lower().endswith(".csv") else "jsonl")
+    tamanho_lote = tamanho_lote or IMPORTACAO_TAMANHO_LOTE
+    checkpoint = checkpoint or arquivo + ".checkpoint"
+    progresso = _ler_checkpoint(checkpoint, arquivo, entidade)
+    retomado_em = progresso["linhas_processadas"]
+    if retomado_em:
+        print(f"Retomando a partir da linha {retomado_em + 1}")
+
+    dao = dao_cls()
+    criar_em_lote = getattr(dao, metodo)
+    erros = []
+    erros_omitidos = 0
+    lote = []
+    inicio = time.perf_counter()
+
+    def gravar_lote(ultima_linha: int):
+        if lote:
+            criados = criar_em_lote(lote)
+            progresso["importados"] += len(criados)
+            progresso["rejeitados"] += len(lote) - len(criados)
+            lote.clear()
+        progresso["linhas_processadas"] = ultima_linha
+        _salvar_checkpoint(checkpoint, progresso)
+        decorrido = time.perf_counter() - inicio
+        taxa = (ultima_linha - retomado_em) / decorrido if decorrido else 0
+        print(f"{ultima_linha} linhas processadas | {progresso['importados']} importadas | "
+              f"{progresso['rejeitados']} rejeitadas | {taxa:.0f} linhas/s")
+
+    ultima_linha = retomado_em
+    try:
+        for numero, linha, erro in ler_linhas(arquivo, formato):
+            if numero <= retomado_em:
+                continue
+            ultima_linha = numero
+            if erro is None:
+                try:
+                    lote.append(validar(linha))
+                except ValueError as e:
+                    erro = str(e)
+            if erro is not None:
+                progresso["rejeitados"] += 1
+                if len(erros) < IMPORTACAO_MAXIMO_ERROS:
+                    erros.append(f"linha {numero}: {erro}")
+                else:
+                    erros_omitidos += 1
+            if len(lote) >= tamanho_lote:
+                gravar_lote(numero)
+        gravar_lote(ultima_linha)
+    finally:
+        dao.close()
+
+    os.remove(checkpoint)
+    decorrido = time.perf_counter() - inicio
+    processadas = ultima_linha - retomado_em
+    return {
+        "entidade": entidade,
+        "linhas_processadas": progresso["linhas_processadas"],
+        "importados": progresso["importados"],
+        "rejeitados": progresso["rejeitados"],
+        "erros": erros,
+        "erros_omitidos": erros_omitidos,
+        "segundos": decorrido,
+        "linhas_por_segundo": processadas / decorrido if decorrido else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa carros, clientes ou concessionárias a partir de CSV/JSONL")
+    parser.add_argument("entidade", choices=sorted(ENTIDADES))
+    parser.add_argument("arquivo")
+    parser.add_argument("--formato", choices=["csv", "jsonl"], help="padrão: pela extensão do arquivo")
+    parser.add_argument("--lote", type=int, help=f"linhas por lote (padrão: {IMPORTACAO_TAMANHO_LOTE})")
+    parser.add_argument("--checkpoint", help="arquivo de checkpoint (padrão: <arquivo>.checkpoint)")
+    args = parser.parse_args()
+
+    resumo = importar(args.entidade, args.arquivo, args.formato, args.lote, args.checkpoint)
+    for erro in resumo["erros"][:20]:
+        print(erro)
+    restantes = len(resumo["erros"]) - 20 + resumo["erros_omitidos"]
+    if restantes > 0:
+        print(f"... e mais {restantes} erro(s)")
+    print(f"\nImportação de {resumo['entidade']} concluída: {resumo['importados']} importados, "
+          f"{resumo['rejeitados']} rejeitados em {resumo['segundos']:.1f}s "
+          f"({resumo['linhas_por_segundo']:.0f} linhas/s)")
+
+if __name__ == "__main__":
+    main()
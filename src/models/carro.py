@@ -1,4 +1,9 @@
+from typing import Iterable, List
+
 class Carro:
+    # Sem __dict__ por instância: listagens grandes ocupam bem menos memória
+    __slots__ = ("identificacao", "modelo", "ano", "fabricante", "crlv")
+
     def __init__(self, identificacao: int = None, modelo: str = None, ano: int = None, 
                  fabricante: str = None, crlv: str = None):
         self.identificacao = identificacao  # Neo4j identificacao
@@ -24,4 +29,18 @@ class Carro:
             ano=data.get("ano"),
             fabricante=data.get("fabricante"),
             crlv=data.get("crlv")
-        ) 
\ No newline at end of file
+        )
+
+    @classmethod
+    def from_documentos(cls, documentos: Iterable[dict]) -> List["Carro"]:
+        """Converte documentos do MongoDB (lista ou cursor) em carros, sem passar por __init__"""
+        carros = []
+        for data in documentos:
+            carro = cls.__new__(cls)
+            carro.identificacao = data.get("identificacao")
+            carro.modelo = data.get("modelo")
+            carro.ano = data.get("ano")
+            carro.fabricante = data.get("fabricante")
+            carro.crlv = data.get("crlv")
+            carros.append(carro)
+        return carros
\ No newline at end of file
@@ -1,6 +1,13 @@
 from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List
+
+# Datas de nascimento se repetem muito; a mesma string devolve o mesmo datetime (imutável)
+_data_de_iso = lru_cache(maxsize=65536)(datetime.fromisoformat)
 
 class Cliente:
+    __slots__ = ("identificacao", "cpf", "nome", "nacionalidade", "data_nascimento")
+
     def __init__(self, identificacao: int = None, cpf: str = None, nome: str = None, 
                  nacionalidade: str = None, data_nascimento: datetime = None):
         self.identificacao = identificacao  # Neo4j identificacao
@@ -25,5 +32,20 @@ class Cliente:
             cpf=data.get("cpf"),
             nome=data.get("nome"),
             nacionalidade=data.get("nacionalidade"),
-            data_nascimento=datetime.fromisoformat(data["data_nascimento"]) if data.get("data_nascimento") else None
-        ) 
\ No newline at end of file
+            data_nascimento=_data_de_iso(data["data_nascimento"]) if data.get("data_nascimento") else None
+        )
+
+    @classmethod
+    def from_documentos(cls, documentos: Iterable[dict]) -> List["Cliente"]:
+        """Converte documentos do MongoDB (lista ou cursor) em clientes, sem passar por __init__"""
+        clientes = []
+        for data in documentos:
+            cliente = cls.__new__(cls)
+            cliente.identificacao = data.get("identificacao")
+            cliente.cpf = data.get("cpf")
+            cliente.nome = data.get("nome")
+            cliente.nacionalidade = data.get("nacionalidade")
+            data_nascimento = data.get("data_nascimento")
+            cliente.data_nascimento = _data_de_iso(data_nascimento) if data_nascimento else None
+            clientes.append(cliente)
+        return clientes
\ No newline at end of file
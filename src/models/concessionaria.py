@@ -1,4 +1,8 @@
+from typing import Iterable, List
+
 class Concessionaria:
+    __slots__ = ("identificacao", "nome")
+
     def __init__(self, identificacao: int = None, nome: str = None):
         self.identificacao = identificacao  # Neo4j identificacao
         self.nome = nome  # Will be stored in MongoDB
@@ -14,4 +18,15 @@ class Concessionaria:
         return cls(
             identificacao=data.get("identificacao"),
             nome=data.get("nome")
-        ) 
\ No newline at end of file
+        )
+
+    @classmethod
+    def from_documentos(cls, documentos: Iterable[dict]) -> List["Concessionaria"]:
+        """Converte documentos do MongoDB (lista ou cursor) em concessionárias, sem passar por __init__"""
+        concessionarias = []
+        for data in documentos:
+            concessionaria = cls.__new__(cls)
+            concessionaria.identificacao = data.get("identificacao")
+            concessionaria.nome = data.get("nome")
+            concessionarias.append(concessionaria)
+        return concessionarias
\ No newline at end of file
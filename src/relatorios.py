@@ -0,0 +1,225 @@
+"""Relatórios de estoque e clientes calculados nos bancos: agregações do MongoDB sobre
+a coleção estoques e agregações Cypher no Neo4j, juntadas pela identificacao da concessionária.
+
+Uso (a partir de src/):
+    python relatorios.py                          # todos os relatórios, em tabela
+    python relatorios.py fabricantes anos         # só os relatórios escolhidos
+    python relatorios.py --csv relatorios/        # também grava um CSV por relatório
+
+Relatórios:
+    concessionarias  carros no Neo4j e no estoque, ano médio/mínimo/máximo e clientes por concessionária
+    fabricantes      carros em estoque por concessionária e fabricante, com o ano médio
+    anos             carros em estoque por ano, com quantas concessionárias e fabricantes os têm
+"""
+import argparse
+import csv
+import os
+import time
+from typing import Callable, Dict, List, Optional
+from config.database import obter_database, liberar_database
+
+class Relatorio:
+    """Resultado de um relatório: linhas (dicts com as colunas) e tempo gasto em cada banco"""
+    def __init__(self, nome: str, titulo: str, colunas: List[str]):
+        self.nome = nome
+        self.titulo = titulo
+        self.colunas = colunas
+        self.linhas: List[dict] = []
+        self.tempos: Dict[str, float] = {}
+
+    def medir(self, banco: str, funcao: Callable):
+        """Executa funcao somando o tempo gasto ao banco informado"""
+        inicio = time.perf_counter()
+        try:
+            return funcao()
+        finally:
+            self.tempos[banco] = self.tempos.get(banco, 0.0) + time.perf_counter() - inicio
+
+    def to_dict(self) -> dict:
+        return {
+            "nome": self.nome,
+            "titulo": self.titulo,
+            "tempos_ms": {banco: segundos * 1000 for banco, segundos in self.tempos.items()},
+            "linhas": self.linhas,
+        }
+
+# ------------------------ CONSULTAS ------------------------
+
+def _nomes_concessionarias(mongo_db) -> Dict[str, str]:
+    cursor = mongo_db["concessionarias"].find({}, {"_id": 0, "identificacao": 1, "nome": 1})
+    return {documento["identificacao"]: documento.get("nome") for documento in cursor}
+
+def _contagens_neo4j(tx) -> List[dict]:
+    """Carros oferecidos e clientes cadastrados em cada concessionária"""
+    query = """
+    MATCH (c:Concessionaria)
+    OPTIONAL MATCH (c)-[:OFERECE]->(car:Carro)
+    WITH c, count(car) as carros
+    OPTIONAL MATCH (cli:Cliente)-[:CADASTRADO]->(c)
+    RETURN c.identificacao as identificacao, carros, count(cli) as clientes
+    """
+    return [record.data() for record in tx.run(query)]
+
+PIPELINE_ESTOQUE_POR_CONCESSIONARIA = [
+    {"$project": {
+        "_id": 0,
+        "identificacao": 1,
+        "carros": {"$size": "$carros"},
+        "ano_medio": {"$avg": "$carros.ano"},
+        "ano_min": {"$min": "$carros.ano"},
+        "ano_max": {"$max": "$carros.ano"},
+    }},
+]
+
+PIPELINE_ESTOQUE_POR_FABRICANTE = [
+    {"$unwind": "$carros"},
+    {"$group": {
+        "_id": {"concessionaria": "$identificacao", "fabricante": "$carros.fabricante"},
+        "quantidade": {"$sum": 1},
+        "ano_medio": {"$avg": "$carros.ano"},
+    }},
+    {"$project": {"_id": 0, "concessionaria": "$_id.concessionaria", "fabricante": "$_id.fabricante",
+                  "quantidade": 1, "ano_medio": 1}},
+    {"$sort": {"concessionaria": 1, "quantidade": -1, "fabricante": 1}},
+]
+
+PIPELINE_ESTOQUE_POR_ANO = [
+    {"$unwind": "$carros"},
+    {"$group": {
+        "_id": "$carros.ano",
+        "quantidade": {"$sum": 1},
+        "concessionarias": {"$addToSet": "$identificacao"},
+        "fabricantes": {"$addToSet": "$carros.fabricante"},
+    }},
+    {"$project": {"_id": 0, "ano": "$_id", "quantidade": 1,
+                  "concessionarias": {"$size": "$concessionarias"}, "fabricantes": {"$size": "$fabricantes"}}},
+    {"$sort": {"ano": 1}},
+]
+
+# ------------------------ RELATÓRIOS ------------------------
+
+def relatorio_concessionarias(database) -> Relatorio:
+    relatorio = Relatorio("concessionarias", "Resumo por concessionária",
+                          ["concessionaria", "nome", "carros", "carros_estoque", "ano_medio", "ano_min", "ano_max",
+                           "clientes", "divergente"])
+    with database.driver.session() as session:
+        contagens = relatorio.medir("neo4j", lambda: session.execute_read(_contagens_neo4j))
+    estoques = relatorio.medir("mongo", lambda: {
+        documento["identificacao"]: documento
+        for documento in database.mongo_db["estoques"].aggregate(PIPELINE_ESTOQUE_POR_CONCESSIONARIA)
+    })
+    nomes = relatorio.medir("mongo", lambda: _nomes_concessionarias(database.mongo_db))
+    for contagem in contagens:
+        estoque = estoques.get(contagem["identificacao"], {})
+        relatorio.linhas.append({
+            "concessionaria": contagem["identificacao"],
+            "nome": nomes.get(contagem["identificacao"]),
+            "carros": contagem["carros"],
+            "carros_estoque": estoque.get("carros"),
+            "ano_medio": estoque.get("ano_medio"),
+            "ano_min": estoque.get("ano_min"),
+            "ano_max": estoque.get("ano_max"),
+            "clientes": contagem["clientes"],
+            # Estoque materializado diferente do Neo4j (ou ausente): rode admin estoques
+            "divergente": contagem["carros"] != estoque.get("carros"),
+        })
+    relatorio.linhas.sort(key=lambda linha: (linha["nome"] or "", linha["concessionaria"]))
+    return relatorio
+
+def relatorio_fabricantes(database) -> Relatorio:
+    relatorio = Relatorio("fabricantes", "Carros em estoque por concessionária e fabricante",
+                          ["concessionaria", "nome", "fabricante", "quantidade", "ano_medio"])
+    linhas = relatorio.medir("mongo", lambda: list(database.mongo_db["estoques"].aggregate(PIPELINE_ESTOQUE_POR_FABRICANTE)))
+    nomes = relatorio.medir("mongo", lambda: _nomes_concessionarias(database.mongo_db))
+    for linha in linhas:
+        relatorio.linhas.append({
+            "concessionaria": linha["concessionaria"],
+            "nome": nomes.get(linha["concessionaria"]),
+            "fabricante": linha["fabricante"],
+            "quantidade": linha["quantidade"],
+            "ano_medio": linha["ano_medio"],
+        })
+    relatorio.linhas.sort(key=lambda linha: (linha["nome"] or "", linha["concessionaria"], -linha["quantidade"]))
+    return relatorio
+
+def relatorio_anos(database) -> Relatorio:
+    relatorio = Relatorio("anos", "Carros em estoque por ano", ["ano", "quantidade", "concessionarias", "fabricantes"])
+    relatorio.linhas = relatorio.medir("mongo", lambda: list(database.mongo_db["estoques"].aggregate(PIPELINE_ESTOQUE_POR_ANO)))
+    return relatorio
+
+RELATORIOS = {
+    "concessionarias": relatorio_concessionarias,
+    "fabricantes": relatorio_fabricantes,
+    "anos": relatorio_anos,
+}
+
+def gerar_relatorios(nomes: Optional[List[str]] = None) -> List[Relatorio]:
+    """Gera os relatórios escolhidos (todos, por padrão), com o tempo total de cada um em tempos["total"]"""
+    nomes = nomes or list(RELATORIOS)
+    desconhecidos = [nome for nome in nomes if nome not in RELATORIOS]
+    if desconhecidos:
+        raise ValueError(f"Relatório desconhecido: {', '.join(desconhecidos)}. Use {', '.join(RELATORIOS)}")
+    database = obter_database()
+    try:
+        relatorios = []
+        for nome in nomes:
+            inicio = time.perf_counter()
+            relatorio = RELATORIOS[nome](database)
+            relatorio.tempos["total"] = time.perf_counter() - inicio
+            relatorios.append(relatorio)
+        return relatorios
+    finally:
+        liberar_database()
+
+# ------------------------ SAÍDA ------------------------
+
+def _formatar(valor) -> str:
+    if valor is None:
+        return "-"
+    if isinstance(valor, bool):
+        return "sim" if valor else "não"
+    if isinstance(valor, float):
+        return f"{valor:.1f}"
+    return str(valor)
+
+def formatar_tabela(relatorio: Relatorio) -> str:
+    """Tabela em texto com o título e os tempos do relatório"""
+    celulas = [[_formatar(linha.get(coluna)) for coluna in relatorio.colunas] for linha in relatorio.linhas]
+    larguras = [max([len(coluna)] + [len(linha[i]) for linha in celulas]) for i, coluna in enumerate(relatorio.colunas)]
+    tempos = ", ".join(f"{banco} {segundos * 1000:.1f} ms" for banco, segundos in relatorio.tempos.items())
+    linhas = [f"{relatorio.titulo} ({tempos})",
+              "  ".join(coluna.ljust(largura) for coluna, largura in zip(relatorio.colunas, larguras)),
+              "  ".join("-" * largura for largura in larguras)]
+    linhas += ["  ".join(celula.ljust(largura) for celula, largura in zip(linha, larguras)) for linha in celulas]
+    if not celulas:
+        linhas.append("(sem dados)")
+    return "\n".join(linhas)
+
+def gravar_csv(relatorio: Relatorio, diretorio: str) -> str:
+    """Grava o relatório em DIRETORIO/<nome>.csv e retorna o caminho"""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"{relatorio.nome}.csv")
+    with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.DictWriter(arquivo, fieldnames=relatorio.colunas, extrasaction="ignore")
+        escritor.writeheader()
+        escritor.writerows(relatorio.linhas)
+    return caminho
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatórios de estoque e clientes")
+    parser.add_argument("relatorios", nargs="*", metavar="RELATORIO",
+                        help=f"um ou mais de: {', '.join(RELATORIOS)} (padrão: todos)")
+    parser.add_argument("--csv", metavar="DIRETORIO", help="grava também um CSV por relatório no diretório")
+    args = parser.parse_args()
+
+    try:
+        relatorios = gerar_relatorios(args.relatorios)
+    except ValueError as e:
+        parser.error(str(e))
+    for relatorio in relatorios:
+        print(formatar_tabela(relatorio) + "\n")
+        if args.csv:
+            print(f"CSV salvo em {gravar_csv(relatorio, args.csv)}\n")
+
+if __name__ == "__main__":
+    main()
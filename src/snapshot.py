@@ -0,0 +1,336 @@
+"""Snapshot de todos os dados: exportação para um arquivo e restauração em massa.
+
+Uso (a partir de src/):
+    python snapshot.py exportar dados.snap
+    python snapshot.py restaurar dados.snap --threads 8
+    python snapshot.py restaurar dados.snap --apagar     # substitui os dados existentes
+
+O arquivo é uma sequência de blocos comprimidos com zlib, cada um com até
+SNAPSHOT_TAMANHO_BLOCO itens em BSON (que preserva as datas): os nós :Carro,
+:Cliente e :Concessionaria com suas propriedades, os documentos das coleções
+do MongoDB e os relacionamentos OFERECE, POSSUI e CADASTRADO. Cada bloco é
+precedido do seu tipo e tamanho, então a restauração lê o arquivo em streaming
+e distribui os blocos entre threads: UNWIND no Neo4j e insert_many não
+ordenado no MongoDB. Os relacionamentos só começam depois de todos os nós.
+O último bloco traz as contagens; sem ele o arquivo é recusado antes de
+qualquer alteração nos bancos, e ao fim da restauração elas são comparadas com
+o que os bancos de fato gravaram (um relacionamento cujo nó não está no
+arquivo, por exemplo, não é criado).
+
+A exportação lê os bancos enquanto eles continuam no ar, então deve ser feita
+sem escritas em andamento para os dois bancos ficarem coerentes entre si.
+"""
+import argparse
+import struct
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+import bson
+from config.config import SNAPSHOT_TAMANHO_BLOCO, SNAPSHOT_THREADS
+from config.database import obter_database, liberar_database
+from config.escrita_adiada import escrita_imediata
+from config.migracoes import aplicar_migracoes
+from config.schema import criar_indices_mongo
+from daos.cache import limpar_caches
+
+ASSINATURA = b"CONCSNAP"
+VERSAO = 1
+NIVEL_COMPRESSAO = 6
+
+ROTULOS = ("Carro", "Cliente", "Concessionaria")
+# (rótulo de origem, tipo, rótulo de destino)
+RELACIONAMENTOS = (("Concessionaria", "OFERECE", "Carro"), ("Cliente", "POSSUI", "Carro"),
+                   ("Cliente", "CADASTRADO", "Concessionaria"))
+COLECOES = ("carros", "clientes", "concessionarias", "estoques", "recomendacoes")
+
+# Tipos de bloco
+CABECALHO, NOS, DOCUMENTOS, RELACOES, FIM = b"C", b"N", b"D", b"R", b"F"
+_CABECALHO_BLOCO = struct.Struct(">cI")
+
+class Vazao:
+    """Itens, bytes e tempo por tipo de item (nós, relacionamentos, documentos); o progresso é
+    impresso a cada BLOCOS_POR_PROGRESSO blocos"""
+    BLOCOS_POR_PROGRESSO = 20
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.itens: Dict[str, int] = {}
+        self.blocos = 0
+        self.bytes = 0
+
+    def somar(self, tipo: str, quantidade: int):
+        self.itens[tipo] = self.itens.get(tipo, 0) + quantidade
+        self.blocos += 1
+        if self.blocos % self.BLOCOS_POR_PROGRESSO == 0:
+            self.imprimir_progresso()
+
+    @property
+    def total(self) -> int:
+        return sum(self.itens.values())
+
+    def to_dict(self) -> dict:
+        segundos = time.perf_counter() - self.inicio
+        return {
+            "itens": dict(self.itens),
+            "total": self.total,
+            "bytes": self.bytes,
+            "segundos": segundos,
+            "itens_por_segundo": self.total / segundos if segundos else 0,
+            "mb_por_segundo": self.bytes / 1e6 / segundos if segundos else 0,
+        }
+
+    def imprimir_progresso(self):
+        decorrido = time.perf_counter() - self.inicio
+        taxa = self.total / decorrido if decorrido else 0
+        partes = " | ".join(f"{quantidade} {tipo}" for tipo, quantidade in self.itens.items())
+        print(f"{partes} | {self.bytes / 1e6:.1f} MB | {taxa:.0f} itens/s")
+
+# ------------------------ ARQUIVO ------------------------
+
+def _escrever_bloco(arquivo, tipo: bytes, comprimido: bytes) -> int:
+    arquivo.write(_CABECALHO_BLOCO.pack(tipo, len(comprimido)))
+    arquivo.write(comprimido)
+    return _CABECALHO_BLOCO.size + len(comprimido)
+
+def _comprimir(conteudo: dict) -> bytes:
+    return zlib.compress(bson.encode(conteudo), NIVEL_COMPRESSAO)
+
+def _descomprimir(comprimido: bytes) -> dict:
+    return bson.decode(zlib.decompress(comprimido))
+
+def _ler_blocos(caminho: str) -> Iterator[Tuple[bytes, bytes]]:
+    """Lê (tipo, bloco comprimido) em ordem, sem descomprimir"""
+    with open(caminho, "rb") as arquivo:
+        if arquivo.read(len(ASSINATURA)) != ASSINATURA:
+            raise ValueError(f"{caminho} não é um snapshot")
+        while True:
+            cabecalho = arquivo.read(_CABECALHO_BLOCO.size)
+            if not cabecalho:
+                return
+            if len(cabecalho) < _CABECALHO_BLOCO.size:
+                raise ValueError(f"{caminho} está truncado")
+            tipo, tamanho = _CABECALHO_BLOCO.unpack(cabecalho)
+            comprimido = arquivo.read(tamanho)
+            if len(comprimido) < tamanho:
+                raise ValueError(f"{caminho} está truncado")
+            yield tipo, comprimido
+
+def verificar_snapshot(caminho: str) -> Tuple[dict, dict]:
+    """Percorre os blocos e retorna o cabeçalho e as contagens do bloco final (ValueError se incompleto)"""
+    cabecalho, fim = None, None
+    for tipo, comprimido in _ler_blocos(caminho):
+        if tipo == CABECALHO:
+            cabecalho = _descomprimir(comprimido)
+        elif tipo == FIM:
+            fim = _descomprimir(comprimido)
+    if cabecalho is None or cabecalho.get("versao") != VERSAO:
+        raise ValueError(f"{caminho}: versão de snapshot não suportada")
+    if fim is None:
+        raise ValueError(f"{caminho} está incompleto: a exportação não terminou")
+    return cabecalho, fim["contagens"]
+
+# ------------------------ EXPORTAÇÃO ------------------------
+
+def _em_blocos(itens: Iterator, tamanho_bloco: int) -> Iterator[list]:
+    bloco = []
+    for item in itens:
+        bloco.append(item)
+        if len(bloco) >= tamanho_bloco:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+def _ler_nos(driver, rotulo: str) -> Iterator[dict]:
+    with driver.session() as session:
+        for registro in session.run(f"MATCH (n:{rotulo}) RETURN properties(n) as propriedades"):
+            yield registro["propriedades"]
+
+def _ler_relacionamentos(driver, origem: str, tipo: str, destino: str) -> Iterator[dict]:
+    query = f"MATCH (a:{origem})-[:{tipo}]->(b:{destino}) RETURN a.identificacao as origem, b.identificacao as destino"
+    with driver.session() as session:
+        for registro in session.run(query):
+            yield {"origem": registro["origem"], "destino": registro["destino"]}
+
+def _conteudos(database, tamanho_bloco: int) -> Iterator[Tuple[bytes, str, dict]]:
+    """(tipo do bloco, tipo dos itens, conteúdo) na ordem do arquivo: nós, documentos e relacionamentos"""
+    for rotulo in ROTULOS:
+        for bloco in _em_blocos(_ler_nos(database.driver, rotulo), tamanho_bloco):
+            yield NOS, "nos", {"rotulo": rotulo, "itens": bloco}
+    for nome in COLECOES:
+        cursor = database.mongo_db[nome].find({}, {"_id": 0}).batch_size(tamanho_bloco)
+        for bloco in _em_blocos(cursor, tamanho_bloco):
+            yield DOCUMENTOS, "documentos", {"colecao": nome, "itens": bloco}
+    for origem, tipo, destino in RELACIONAMENTOS:
+        for bloco in _em_blocos(_ler_relacionamentos(database.driver, origem, tipo, destino), tamanho_bloco):
+            yield RELACOES, "relacionamentos", {"origem": origem, "tipo": tipo, "destino": destino, "itens": bloco}
+
+def exportar(caminho: str, tamanho_bloco: Optional[int] = None, threads: Optional[int] = None) -> dict:
+    """Grava o snapshot dos dois bancos em caminho e retorna a vazão. A leitura dos bancos segue na thread
+    principal enquanto os blocos anteriores são comprimidos em paralelo"""
+    tamanho_bloco = tamanho_bloco or SNAPSHOT_TAMANHO_BLOCO
+    threads = threads or SNAPSHOT_THREADS
+    database = obter_database()
+    vazao = Vazao()
+    contagens: Dict[str, int] = {}
+    try:
+        with open(caminho, "wb") as arquivo, ThreadPoolExecutor(threads) as executor:
+            arquivo.write(ASSINATURA)
+            vazao.bytes += len(ASSINATURA)
+            vazao.bytes += _escrever_bloco(arquivo, CABECALHO, _comprimir(
+                {"versao": VERSAO, "gerado_em": datetime.now(), "tamanho_bloco": tamanho_bloco}))
+            # Blocos em compressão, gravados na ordem em que foram lidos
+            em_andamento = []
+            for tipo_bloco, tipo_itens, conteudo in _conteudos(database, tamanho_bloco):
+                chave = conteudo.get("rotulo") or conteudo.get("colecao") or conteudo.get("tipo")
+                contagens[chave] = contagens.get(chave, 0) + len(conteudo["itens"])
+                em_andamento.append((tipo_bloco, tipo_itens, len(conteudo["itens"]), executor.submit(_comprimir, conteudo)))
+                while len(em_andamento) > threads * 2:
+                    _gravar_proximo(arquivo, em_andamento, vazao)
+            while em_andamento:
+                _gravar_proximo(arquivo, em_andamento, vazao)
+            vazao.bytes += _escrever_bloco(arquivo, FIM, _comprimir({"contagens": contagens}))
+    finally:
+        liberar_database()
+    return dict(vazao.to_dict(), contagens=contagens)
+
+def _gravar_proximo(arquivo, em_andamento: list, vazao: Vazao):
+    tipo_bloco, tipo_itens, quantidade, futuro = em_andamento.pop(0)
+    vazao.bytes += _escrever_bloco(arquivo, tipo_bloco, futuro.result())
+    vazao.somar(tipo_itens, quantidade)
+
+# ------------------------ RESTAURAÇÃO ------------------------
+
+def _criar_nos(tx, rotulo: str, nos: list) -> int:
+    result = tx.run(f"UNWIND $nos AS no CREATE (n:{rotulo}) SET n = no", nos=nos)
+    return result.consume().counters.nodes_created
+
+def _criar_relacionamentos(tx, origem: str, tipo: str, destino: str, relacoes: list) -> int:
+    """Os relacionamentos cujas pontas não existem não são criados; retorna quantos foram"""
+    query = f"""
+    UNWIND $relacoes AS r
+    MATCH (a:{origem} {{identificacao: r.origem}})
+    MATCH (b:{destino} {{identificacao: r.destino}})
+    CREATE (a)-[:{tipo}]->(b)
+    """
+    result = tx.run(query, relacoes=relacoes)
+    return result.consume().counters.relationships_created
+
+def _carregar_bloco(database, tipo_bloco: bytes, comprimido: bytes) -> Tuple[str, str, int]:
+    """Descomprime um bloco e grava seus itens; retorna (tipo dos itens, chave das contagens, quantos
+    os bancos gravaram)"""
+    conteudo = _descomprimir(comprimido)
+    itens = conteudo["itens"]
+    if tipo_bloco == NOS:
+        # Rótulos e tipos vêm do arquivo e entram no texto da consulta: só os conhecidos são aceitos
+        if conteudo["rotulo"] not in ROTULOS:
+            raise ValueError(f"rótulo desconhecido no snapshot: {conteudo['rotulo']}")
+        with database.driver.session() as session:
+            criados = session.execute_write(_criar_nos, conteudo["rotulo"], itens)
+        return "nos", conteudo["rotulo"], criados
+    if tipo_bloco == RELACOES:
+        relacionamento = (conteudo["origem"], conteudo["tipo"], conteudo["destino"])
+        if relacionamento not in RELACIONAMENTOS:
+            raise ValueError(f"relacionamento desconhecido no snapshot: {relacionamento}")
+        with database.driver.session() as session:
+            criados = session.execute_write(_criar_relacionamentos, *relacionamento, itens)
+        return "relacionamentos", conteudo["tipo"], criados
+    if conteudo["colecao"] not in COLECOES:
+        raise ValueError(f"coleção desconhecida no snapshot: {conteudo['colecao']}")
+    resultado = escrita_imediata(database.mongo_db[conteudo["colecao"]]).insert_many(itens, ordered=False)
+    return "documentos", conteudo["colecao"], len(resultado.inserted_ids)
+
+def _tem_dados(database) -> bool:
+    with database.driver.session() as session:
+        if session.run("MATCH (n) WHERE NOT n:Migracao RETURN count(n) as nos").single()["nos"]:
+            return True
+    return any(database.mongo_db[nome].count_documents({}, limit=1) for nome in COLECOES)
+
+def restaurar(caminho: str, threads: Optional[int] = None, apagar: bool = False) -> dict:
+    """Carrega o snapshot em bancos vazios (ou apagados antes, com apagar=True) e retorna a vazão, as
+    contagens gravadas, as esperadas (do bloco final) e as diferenças entre elas ({} se bateram).
+    Os índices do MongoDB são criados depois da carga, que fica mais rápida sem eles"""
+    threads = threads or SNAPSHOT_THREADS
+    _, esperadas = verificar_snapshot(caminho)
+    contagens = {chave: 0 for chave in esperadas}
+    database = obter_database()
+    try:
+        if apagar:
+            database.drop_all()
+        elif _tem_dados(database):
+            raise ValueError("Os bancos já têm dados. Use apagar=True (--apagar) para substituí-los.")
+        limpar_caches()
+        # As constraints de identificacao servem de índice para os MATCH dos relacionamentos
+        aplicar_migracoes(database.driver)
+        vazao = Vazao()
+        with ThreadPoolExecutor(threads) as executor:
+            pendentes, nos = set(), set()
+
+            def concluir(futuros):
+                for futuro in futuros:
+                    pendentes.discard(futuro)
+                    nos.discard(futuro)
+                    tipo_itens, chave, gravados = futuro.result()
+                    contagens[chave] = contagens.get(chave, 0) + gravados
+                    vazao.somar(tipo_itens, gravados)
+
+            for tipo_bloco, comprimido in _ler_blocos(caminho):
+                vazao.bytes += _CABECALHO_BLOCO.size + len(comprimido)
+                if tipo_bloco not in (NOS, DOCUMENTOS, RELACOES):
+                    continue
+                if tipo_bloco == RELACOES and nos:
+                    # Todos os nós precisam existir antes do primeiro relacionamento
+                    concluir(wait(nos).done)
+                futuro = executor.submit(_carregar_bloco, database, tipo_bloco, comprimido)
+                pendentes.add(futuro)
+                if tipo_bloco == NOS:
+                    nos.add(futuro)
+                if len(pendentes) >= threads * 2:
+                    concluir(wait(pendentes, return_when=FIRST_COMPLETED).done)
+            concluir(wait(pendentes).done)
+        criar_indices_mongo(database.mongo_db)
+        diferencas = {chave: {"esperadas": esperadas.get(chave, 0), "gravadas": quantidade}
+                      for chave, quantidade in contagens.items() if quantidade != esperadas.get(chave, 0)}
+        return dict(vazao.to_dict(), contagens=contagens, esperadas=esperadas, diferencas=diferencas)
+    finally:
+        liberar_database()
+
+# ------------------------------------------------
+
+def _imprimir_resumo(acao: str, resumo: dict):
+    itens = ", ".join(f"{quantidade} {tipo}" for tipo, quantidade in resumo["itens"].items())
+    print(f"\n{acao} concluída: {itens} em {resumo['segundos']:.1f}s "
+          f"({resumo['itens_por_segundo']:.0f} itens/s, {resumo['bytes'] / 1e6:.1f} MB, {resumo['mb_por_segundo']:.1f} MB/s)")
+    for nome, quantidade in resumo["contagens"].items():
+        print(f"  {nome}: {quantidade}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta ou restaura um snapshot do Neo4j e do MongoDB")
+    acoes = parser.add_subparsers(dest="acao", required=True)
+    sub = acoes.add_parser("exportar")
+    sub.add_argument("arquivo")
+    sub.add_argument("--bloco", type=int, help=f"itens por bloco (padrão: {SNAPSHOT_TAMANHO_BLOCO})")
+    sub.add_argument("--threads", type=int, help=f"threads de compressão (padrão: {SNAPSHOT_THREADS})")
+    sub = acoes.add_parser("restaurar")
+    sub.add_argument("arquivo")
+    sub.add_argument("--threads", type=int, help=f"blocos gravados em paralelo (padrão: {SNAPSHOT_THREADS})")
+    sub.add_argument("--apagar", action="store_true", help="apaga os dados existentes antes de restaurar")
+    args = parser.parse_args()
+
+    try:
+        if args.acao == "exportar":
+            _imprimir_resumo("Exportação", exportar(args.arquivo, args.bloco, args.threads))
+        else:
+            resumo = restaurar(args.arquivo, args.threads, args.apagar)
+            _imprimir_resumo("Restauração", resumo)
+            if resumo["diferencas"]:
+                faltas = ", ".join(f"{chave}: {valores['gravadas']} de {valores['esperadas']}"
+                                   for chave, valores in resumo["diferencas"].items())
+                parser.exit(1, f"Erro: a restauração não gravou tudo o que o snapshot tem ({faltas})\n")
+    except ValueError as e:
+        parser.exit(1, f"Erro: {e}\n")
+
+if __name__ == "__main__":
+    main()
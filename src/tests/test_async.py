@@ -0,0 +1,44 @@
+"""DAOs assíncronos sobre os bancos em memória (python -m pytest, a partir de src/)"""
+import asyncio
+from benchmark.memoria import AsyncDatabaseMemoria
+from daos.async_carro_dao import AsyncCarroDAO
+from daos.async_cliente_dao import AsyncClienteDAO
+from daos.async_concessionaria_dao import AsyncConcessionariaDAO
+from models.carro import Carro
+from models.cliente import Cliente
+from models.concessionaria import Concessionaria
+
+def _executar(corrotina):
+    return asyncio.run(corrotina)
+
+def test_carros_em_lote_e_paginas():
+    async def cenario():
+        dao = AsyncCarroDAO(AsyncDatabaseMemoria())
+        criados = await dao.criar_carros_em_lote([Carro(modelo=f"Modelo {n}", ano=2000 + n, fabricante="Fiat", crlv=f"F-{n}")
+                                                  for n in range(5)])
+        paginas = [pagina async for pagina, _ in dao.iterar_paginas_carros(tamanho_pagina=2)]
+        carros = [carro async for carro in dao.iterar_carros(tamanho_pagina=2)]
+        return criados, paginas, carros, await dao.sincronizar_propriedades()
+    criados, paginas, carros, sincronizados = _executar(cenario())
+    assert [len(pagina) for pagina in paginas] == [2, 2, 1]
+    assert sorted(carro.identificacao for carro in carros) == sorted(criados)
+    assert sincronizados == 5
+
+def test_estoque_compra_e_situacoes():
+    async def cenario():
+        database = AsyncDatabaseMemoria()
+        concessionarias = AsyncConcessionariaDAO(database)
+        clientes = AsyncClienteDAO(database)
+        carros = AsyncCarroDAO(database)
+        loja = await concessionarias.criar_concessionaria(Concessionaria(nome="Loja"), 3)
+        cliente, = await clientes.criar_clientes_em_lote([Cliente(cpf="123", nome="Ana")])
+        await clientes.cadastrar_cliente_concessionaria(cliente, loja)
+        estoque = await concessionarias.buscar_estoque(loja)
+        await clientes.comprar_carro(cliente, loja, estoque["carros"][0].identificacao)
+        await database.mongo_db["estoques"].delete_many({})
+        return (await concessionarias.buscar_estoque(loja), await clientes.buscar_clientes_com_carros(),
+                await carros.reconstruir_situacoes())
+    estoque, clientes, situacoes = _executar(cenario())
+    assert estoque["total"] == 2
+    assert [len(carros) for _, carros in clientes] == [1]
+    assert situacoes == 3
@@ -0,0 +1,76 @@
+"""Cache de leitura dos DAOs sobre os bancos em memória (python -m pytest, a partir de src/)"""
+import pytest
+from benchmark.memoria import DatabaseMemoria
+from config.database import definir_database
+from daos.cache import CacheLRU, habilitar_cache, limpar_caches, obter_cache
+from daos.carro_dao import CarroDAO
+from daos.cliente_dao import ClienteDAO, ResultadoCompra
+from daos.concessionaria_dao import ConcessionariaDAO
+from models.carro import Carro
+from models.cliente import Cliente
+from models.concessionaria import Concessionaria
+
+@pytest.fixture
+def banco():
+    database = DatabaseMemoria()
+    definir_database(database)
+    limpar_caches()
+    habilitar_cache()
+    yield database
+    habilitar_cache(False)
+
+@pytest.fixture
+def carro_dao(banco):
+    dao = CarroDAO()
+    yield dao
+    dao.close()
+
+def _carro(carro_dao) -> str:
+    identificacao, = carro_dao.criar_carros_em_lote([Carro(modelo="Uno", ano=2010, fabricante="Fiat", crlv="C1")])
+    return identificacao
+
+def test_leitura_repetida_vem_do_cache(banco, carro_dao):
+    identificacao = _carro(carro_dao)
+    carro_dao.buscar_carro(identificacao)
+    chamadas = banco.contador.mongo_chamadas
+    assert carro_dao.buscar_carro(identificacao).modelo == "Uno"
+    assert banco.contador.mongo_chamadas == chamadas
+    assert obter_cache("carros").acertos == 1
+
+def test_atualizar_e_remover_invalidam(carro_dao):
+    identificacao = _carro(carro_dao)
+    carro = carro_dao.buscar_carro(identificacao)
+    carro.modelo = "Palio"
+    assert carro_dao.atualizar_carro(identificacao, carro)
+    assert carro_dao.buscar_carro(identificacao).modelo == "Palio"
+    assert carro_dao.remover_carro(identificacao)
+    assert carro_dao.buscar_carro(identificacao) is None
+
+def test_vinculos_e_compra_invalidam_concessionaria_do_carro(carro_dao):
+    concessionarias, clientes = ConcessionariaDAO(), ClienteDAO()
+    loja = concessionarias.criar_concessionaria(Concessionaria(nome="Loja"), 1)
+    carro = concessionarias.buscar_carros_da_concessionaria(loja)[0]
+    assert carro_dao.buscar_concessionaria_do_carro(carro) == loja
+    assert concessionarias.desvincular_carro_da_concessionaria(loja, carro)
+    assert carro_dao.buscar_concessionaria_do_carro(carro) is None
+    assert concessionarias.vincular_carro_a_concessionaria(loja, carro)
+    assert carro_dao.buscar_concessionaria_do_carro(carro) == loja
+    cliente, = clientes.criar_clientes_em_lote([Cliente(cpf="111", nome="Ana")])
+    clientes.cadastrar_cliente_concessionaria(cliente, loja)
+    assert clientes.comprar_carro(cliente, loja, carro) == ResultadoCompra.SUCESSO
+    assert carro_dao.buscar_concessionaria_do_carro(carro) is None
+    concessionarias.close()
+    clientes.close()
+
+def test_lru_e_expiracao():
+    cache = CacheLRU(tamanho_maximo=2, ttl=60)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    cache.obter_ou_carregar("a", lambda: None)
+    cache.guardar("c", 3)
+    # "b" era o menos usado
+    assert cache.obter_ou_carregar("b", lambda: "carregado") == "carregado"
+    assert cache.despejos >= 1
+    expirado = CacheLRU(tamanho_maximo=2, ttl=0)
+    expirado.guardar("a", 1)
+    assert expirado.obter_ou_carregar("a", lambda: "carregado") == "carregado"
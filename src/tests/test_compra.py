@@ -0,0 +1,54 @@
+"""Compra de carros sobre os bancos em memória (python -m pytest, a partir de src/)"""
+import threading
+import pytest
+from benchmark.memoria import DatabaseMemoria
+from config.database import definir_database
+from daos.cliente_dao import ClienteDAO, ResultadoCompra
+from daos.concessionaria_dao import ConcessionariaDAO
+from models.cliente import Cliente
+from models.concessionaria import Concessionaria
+
+@pytest.fixture
+def loja():
+    """Concessionária com um carro e dois clientes cadastrados nela"""
+    definir_database(DatabaseMemoria())
+    concessionarias, clientes = ConcessionariaDAO(), ClienteDAO()
+    concessionaria = concessionarias.criar_concessionaria(Concessionaria(nome="Loja"), 1)
+    compradores = clientes.criar_clientes_em_lote([Cliente(cpf="111", nome="Ana"), Cliente(cpf="222", nome="Bia")])
+    for cliente in compradores:
+        clientes.cadastrar_cliente_concessionaria(cliente, concessionaria)
+    carro = concessionarias.buscar_carros_da_concessionaria(concessionaria)[0]
+    yield clientes, concessionarias, concessionaria, compradores, carro
+    clientes.close()
+    concessionarias.close()
+
+def test_compra_e_carro_indisponivel(loja):
+    clientes, concessionarias, concessionaria, (ana, bia), carro = loja
+    assert clientes.comprar_carro(ana, concessionaria, carro) == ResultadoCompra.SUCESSO
+    assert clientes.comprar_carro(bia, concessionaria, carro) == ResultadoCompra.INDISPONIVEL
+    assert concessionarias.buscar_carros_da_concessionaria(concessionaria) == []
+    assert concessionarias.buscar_estoque(concessionaria)["total"] == 0
+
+def test_cliente_nao_cadastrado(loja):
+    clientes, _, concessionaria, _, carro = loja
+    outro, = clientes.criar_clientes_em_lote([Cliente(cpf="333", nome="Caio")])
+    assert clientes.comprar_carro(outro, concessionaria, carro) == ResultadoCompra.NAO_CADASTRADO
+    assert clientes.comprar_carro(outro, concessionaria, "inexistente") == ResultadoCompra.NAO_ENCONTRADO
+
+def test_compras_simultaneas_do_mesmo_carro(loja):
+    clientes, _, concessionaria, compradores, carro = loja
+    largada = threading.Barrier(len(compradores))
+    resultados = []
+
+    def comprar(cliente):
+        largada.wait()
+        resultados.append(clientes.comprar_carro(cliente, concessionaria, carro))
+
+    threads = [threading.Thread(target=comprar, args=(cliente,)) for cliente in compradores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(resultado.value for resultado in resultados) == ["indisponivel", "sucesso"]
+    donos = [cliente for cliente in compradores if carro in clientes.buscar_carros_do_cliente(cliente)]
+    assert len(donos) == 1
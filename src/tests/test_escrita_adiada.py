@@ -0,0 +1,67 @@
+"""Escrita adiada no MongoDB sobre os bancos em memória (python -m pytest, a partir de src/)"""
+import pytest
+from pymongo.errors import BulkWriteError
+import config.config as config
+from benchmark.memoria import DatabaseMemoria
+from config.database import definir_database
+from config.escrita_adiada import habilitar_escrita_adiada
+from daos.carro_dao import CarroDAO
+
+@pytest.fixture
+def banco():
+    database = DatabaseMemoria()
+    definir_database(database)
+    habilitar_escrita_adiada()
+    yield database
+    habilitar_escrita_adiada(False)
+
+def _gravados(banco, nome: str):
+    """Identificacoes já gravadas na coleção em memória, sem passar pela fila"""
+    return sorted(documento["identificacao"] for documento in banco.mongo_client[nome].documentos.values())
+
+def test_escritas_ficam_na_fila(banco):
+    colecao = banco.mongo_db["carros"]
+    colecao.insert_one({"identificacao": "a", "modelo": "Uno"})
+    colecao.update_one({"identificacao": "a"}, {"$set": {"modelo": "Palio"}})
+    assert colecao.pendentes == 2
+    assert _gravados(banco, "carros") == []
+
+def test_leitura_ve_entidade_na_fila(banco):
+    colecao = banco.mongo_db["carros"]
+    colecao.insert_one({"identificacao": "a", "modelo": "Uno"})
+    # Leitura de outra identificacao vai direto ao banco, sem gravar a fila
+    assert colecao.find_one({"identificacao": "b"}) is None
+    assert colecao.pendentes == 1
+    assert colecao.find_one({"identificacao": "a"})["modelo"] == "Uno"
+    assert colecao.pendentes == 0
+
+def test_descarga_pelo_tamanho_do_lote(banco, monkeypatch):
+    monkeypatch.setattr(config, "ESCRITA_ADIADA_TAMANHO_LOTE", 3)
+    colecao = banco.mongo_db["carros"]
+    for identificacao in ("a", "b"):
+        colecao.insert_one({"identificacao": identificacao})
+    assert _gravados(banco, "carros") == []
+    colecao.insert_one({"identificacao": "c"})
+    assert _gravados(banco, "carros") == ["a", "b", "c"]
+    assert colecao.pendentes == 0 and colecao.descargas == 1
+
+def test_descarga_no_close(banco):
+    dao = CarroDAO()
+    dao.mongo_collection.insert_one({"identificacao": "a"})
+    assert _gravados(banco, "carros") == []
+    dao.close()
+    assert _gravados(banco, "carros") == ["a"]
+
+def test_falha_parcial_devolve_as_seguintes(banco):
+    banco.mongo_client["carros"].create_index("identificacao", unique=True)
+    banco.mongo_client["carros"].insert_one({"identificacao": "x"})
+    colecao = banco.mongo_db["carros"]
+    for identificacao in ("a", "x", "b"):
+        colecao.insert_one({"identificacao": identificacao})
+    with pytest.raises(BulkWriteError):
+        colecao.descarregar()
+    # A anterior à recusada foi gravada, a recusada foi descartada e a seguinte voltou para a fila
+    assert _gravados(banco, "carros") == ["a", "x"]
+    assert colecao.pendentes == 1
+    assert colecao.descarregar() == 1
+    assert _gravados(banco, "carros") == ["a", "b", "x"]
@@ -0,0 +1,33 @@
+"""Pesquisa de carros por prefixo sobre os bancos em memória (python -m pytest, a partir de src/)"""
+import pytest
+from benchmark.memoria import DatabaseMemoria
+from config.database import definir_database
+from daos.carro_dao import CarroDAO
+from models.carro import Carro
+
+@pytest.fixture
+def carro_dao():
+    definir_database(DatabaseMemoria())
+    dao = CarroDAO()
+    dao.criar_carros_em_lote([
+        Carro(modelo="Lutz Sport", ano=2020, fabricante="Ford", crlv="A1"),
+        Carro(modelo="lutz", ano=2021, fabricante="Ford", crlv="A2"),
+        Carro(modelo="Série 9 GT", ano=2019, fabricante="Fiat", crlv="A3"),
+        Carro(modelo="Série 9", ano=2018, fabricante="Fiat", crlv="A4"),
+        Carro(modelo="Lutzomobil", ano=2022, fabricante="Ford", crlv="A5"),
+        Carro(modelo="Luv", ano=2017, fabricante="Ford", crlv="A6"),
+    ])
+    yield dao
+    dao.close()
+
+def _modelos(carros):
+    return sorted(carro.modelo for carro in carros)
+
+def test_prefixo_terminado_em_z(carro_dao):
+    assert _modelos(carro_dao.pesquisar_carros(modelo="LUTZ")) == ["Lutz Sport", "Lutzomobil", "lutz"]
+
+def test_prefixo_terminado_em_9(carro_dao):
+    assert _modelos(carro_dao.pesquisar_carros(modelo="série 9")) == ["Série 9", "Série 9 GT"]
+
+def test_prefixo_exato(carro_dao):
+    assert _modelos(carro_dao.pesquisar_carros(modelo="lutz", exato=True)) == ["lutz"]
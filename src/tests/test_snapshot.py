@@ -0,0 +1,52 @@
+"""Exportação e restauração de snapshot sobre os bancos em memória (python -m pytest, a partir de src/)"""
+import pytest
+from benchmark.memoria import DatabaseMemoria
+from config.database import definir_database
+from daos.cliente_dao import ClienteDAO
+from daos.concessionaria_dao import ConcessionariaDAO
+from models.cliente import Cliente
+from models.concessionaria import Concessionaria
+import snapshot
+
+def _contagens(database) -> dict:
+    """Nós por rótulo, relacionamentos por tipo e documentos por coleção"""
+    grafo = database.driver._obter().grafo
+    contagens = {rotulo: len(grafo.nos[rotulo]) for rotulo in snapshot.ROTULOS}
+    for _, tipo, _ in snapshot.RELACIONAMENTOS:
+        contagens[tipo] = sum(len(destinos) for (tipo_relacionamento, _), destinos in grafo.saindo.items()
+                              if tipo_relacionamento == tipo)
+    for nome in snapshot.COLECOES:
+        contagens[nome] = len(database.mongo_client[nome].documentos)
+    return contagens
+
+@pytest.fixture
+def exportado(tmp_path):
+    """Snapshot de duas concessionárias com clientes cadastrados e uma compra, e as contagens de origem"""
+    database = DatabaseMemoria()
+    definir_database(database)
+    concessionarias, clientes = ConcessionariaDAO(), ClienteDAO()
+    lojas = [concessionarias.criar_concessionaria(Concessionaria(nome=nome), 3) for nome in ("Loja A", "Loja B")]
+    compradores = clientes.criar_clientes_em_lote([Cliente(cpf=f"{numero:011d}", nome=f"Cliente {numero}") for numero in range(4)])
+    for cliente in compradores:
+        clientes.cadastrar_cliente_concessionaria(cliente, lojas[0])
+    clientes.comprar_carro(compradores[0], lojas[0], concessionarias.buscar_carros_da_concessionaria(lojas[0])[0])
+    concessionarias.close()
+    clientes.close()
+    caminho = str(tmp_path / "dados.snap")
+    # Blocos pequenos para o arquivo ter vários blocos de cada tipo
+    resumo = snapshot.exportar(caminho, tamanho_bloco=2, threads=2)
+    return caminho, resumo, _contagens(database)
+
+def test_exportar_e_restaurar(exportado):
+    caminho, resumo, origem = exportado
+    assert resumo["contagens"] == {chave: quantidade for chave, quantidade in origem.items() if quantidade}
+    destino = DatabaseMemoria()
+    definir_database(destino)
+    restaurado = snapshot.restaurar(caminho, threads=2)
+    assert restaurado["diferencas"] == {}
+    assert _contagens(destino) == origem
+
+def test_restaurar_recusa_bancos_com_dados(exportado):
+    caminho, _, _ = exportado
+    with pytest.raises(ValueError):
+        snapshot.restaurar(caminho)